@@ -31,8 +31,8 @@ target_metadata = db.Model.metadata
 
 load_dotenv(dotenv_path='dev.env')
 
-# Get database URI from environment variable
-sqlalchemy_url = os.getenv('DATABASE_URI')
+# Get database URI from environment variable, unless the caller set sqlalchemy.url, e.g. to migrate a benchmark database
+sqlalchemy_url = config.get_main_option('sqlalchemy.url') or os.getenv('DATABASE_URI')
 
 
 def run_migrations_offline() -> None:
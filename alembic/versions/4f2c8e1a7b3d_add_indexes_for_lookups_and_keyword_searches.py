@@ -0,0 +1,39 @@
+"""Add indexes for lookups and keyword searches
+
+Revision ID: 4f2c8e1a7b3d
+Revises: 6b5b1775d900
+Create Date: 2026-10-19 10:12:31.402117
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '4f2c8e1a7b3d'
+down_revision: Union[str, None] = '6b5b1775d900'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Trigram indexes make ilike '%keyword%' searches use an index
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    op.create_index('ix_testrecords_test_name_test_type', 'testrecords', ['test_name', 'test_type'], unique=False)
+    op.create_index('ix_testrecords_cell_name', 'testrecords', ['cell_name'], unique=False)
+    op.create_index('ix_testrecords_test_name_trgm', 'testrecords', ['test_name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'test_name': 'gin_trgm_ops'})
+    op.create_index('ix_cells_project_name', 'cells', ['project_name'], unique=False)
+    op.create_index('ix_cells_cell_name_trgm', 'cells', ['cell_name'], unique=False,
+                    postgresql_using='gin', postgresql_ops={'cell_name': 'gin_trgm_ops'})
+
+
+def downgrade() -> None:
+    # The pg_trgm extension is left installed, other databases on the server may use it
+    op.drop_index('ix_cells_cell_name_trgm', table_name='cells')
+    op.drop_index('ix_cells_project_name', table_name='cells')
+    op.drop_index('ix_testrecords_test_name_trgm', table_name='testrecords')
+    op.drop_index('ix_testrecords_cell_name', table_name='testrecords')
+    op.drop_index('ix_testrecords_test_name_test_type', table_name='testrecords')
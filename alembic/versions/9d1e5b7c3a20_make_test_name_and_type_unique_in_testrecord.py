@@ -0,0 +1,49 @@
+"""Make test name and type unique in testrecord
+
+The upgrade aborts if any test name and type is shared by several test records, listing the duplicates.
+Resolve them first, e.g. delete the outdated test records with TestRecordService.delete_test_record, 
+which also deletes their blobs. Deleted test records cannot be restored by the downgrade.
+
+Revision ID: 9d1e5b7c3a20
+Revises: 4f2c8e1a7b3d
+Create Date: 2026-10-19 14:37:05.118240
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '9d1e5b7c3a20'
+down_revision: Union[str, None] = '4f2c8e1a7b3d'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Duplicates listed in the error of the upgrade
+MAX_LISTED_DUPLICATES = 50
+
+
+def upgrade() -> None:
+    # INSERT ... ON CONFLICT needs a unique index, duplicated test records are not deleted here as that loses data
+    duplicates = op.get_bind().execute(sa.text(
+        'SELECT test_name, test_type, COUNT(*) FROM testrecords '
+        'GROUP BY test_name, test_type HAVING COUNT(*) > 1 ORDER BY test_name, test_type'
+    )).fetchall()
+    if duplicates:
+        listed = '\n'.join(f'  ({test_name}, {test_type}): {count} test records' 
+                           for test_name, test_type, count in duplicates[:MAX_LISTED_DUPLICATES])
+        more = f'\n  ... and {len(duplicates) - MAX_LISTED_DUPLICATES} more' if len(duplicates) > MAX_LISTED_DUPLICATES else ''
+        raise RuntimeError(
+            f'Cannot make (test_name, test_type) unique in testrecords, {len(duplicates)} pairs have several test records:\n'
+            f'{listed}{more}\nDelete the outdated test records of each pair, then run the upgrade again.'
+        )
+    op.drop_index('ix_testrecords_test_name_test_type', table_name='testrecords')
+    op.create_index('ix_testrecords_test_name_test_type', 'testrecords', ['test_name', 'test_type'], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index('ix_testrecords_test_name_test_type', table_name='testrecords')
+    op.create_index('ix_testrecords_test_name_test_type', 'testrecords', ['test_name', 'test_type'], unique=False)
@@ -1,4 +1,5 @@
 from .projects import projects_bp
 from .cells import cells_bp
 from .trs import trs_bp
-from .tasks import tasks_bp
\ No newline at end of file
+from .tasks import tasks_bp
+from .metrics import metrics_bp
\ No newline at end of file
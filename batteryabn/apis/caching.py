@@ -0,0 +1,40 @@
+from datetime import datetime
+from flask import Response, request, make_response
+from batteryabn import Constants as Const
+
+
+def is_not_modified(etag: str, last_modified: datetime = None) -> bool:
+    """
+    Check if the client already has this version of the resource.
+    If-None-Match takes precedence over If-Modified-Since.
+    """
+    if etag is None:
+        return False
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if last_modified is not None and request.if_modified_since is not None:
+        # HTTP dates have a resolution of one second
+        return last_modified.replace(microsecond=0) <= request.if_modified_since
+    return False
+
+def not_modified(etag: str, last_modified: datetime = None) -> Response:
+    """
+    Build an empty 304 response for a version the client already has.
+    """
+    return with_cache_headers(Response(status=304), etag, last_modified)
+
+def with_cache_headers(response, etag: str, last_modified: datetime = None, max_age: int = Const.CACHE_MAX_AGE) -> Response:
+    """
+    Add ETag, Last-Modified and Cache-Control headers to a response.
+    Responses without a version are returned unchanged.
+    """
+    response = make_response(response)
+    if etag is None:
+        return response
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    response.cache_control.private = True
+    response.cache_control.max_age = max_age
+    response.cache_control.must_revalidate = True
+    return response
@@ -1,6 +1,8 @@
-from flask import Blueprint, jsonify, send_file
+from flask import Blueprint, jsonify, send_file, request
 from flask_injector import inject
+from batteryabn import Constants as Const
 from batteryabn.services import CellService
+from .caching import is_not_modified, not_modified, with_cache_headers
 
 cells_bp = Blueprint('cells', __name__)
 
@@ -40,7 +42,10 @@ def get_cell_images(cell_name: str, number: int, cell_service: CellService):
     if not image_paths or number < 0 or number >= len(image_paths):
         return jsonify({"error": "Images not found"}), 404
     images = image_paths[number]
-    return send_file(images, mimetype='image/png')
+    etag, last_modified = cell_service.get_processed_version(cell_name)
+    if is_not_modified(etag, last_modified):
+        return not_modified(etag, last_modified)
+    return with_cache_headers(send_file(images, mimetype='image/png', etag=False, conditional=False), etag, last_modified)
 
 @inject
 @cells_bp.route('/<cell_name>/htmls/<int:number>', methods=['GET'])    
@@ -52,7 +57,10 @@ def get_cell_htmls(cell_name: str, number: int, cell_service: CellService):
     if not html_paths or number < 0 or number >= len(html_paths):
         return jsonify({"error": "Html files not found"}), 404
     html = html_paths[number]
-    return send_file(html, mimetype='text/html')
+    etag, last_modified = cell_service.get_processed_version(cell_name)
+    if is_not_modified(etag, last_modified):
+        return not_modified(etag, last_modified)
+    return with_cache_headers(send_file(html, mimetype='text/html', etag=False, conditional=False), etag, last_modified)
 
 @inject
 @cells_bp.route('/search/<keyword>', methods=['GET'])
@@ -82,26 +90,26 @@ def get_latest_info(cell_name: str, cell_service: CellService):
     """
     Get the latest info for a cell.
     """
+    # Only a cell that exists can be not modified, a processed cell always has its info
+    if not cell_service.find_cell_by_name(cell_name):
+        return jsonify({"error": "Cell not found"}), 404
+    etag, last_modified = cell_service.get_processed_version(cell_name)
+    if is_not_modified(etag, last_modified):
+        return not_modified(etag, last_modified)
     rpt_info = cell_service.get_latest_cell_info(cell_name)
     if rpt_info is None:
         return jsonify({"error": "Rpt info not found"}), 404
-    return jsonify(rpt_info)
-
+    return with_cache_headers(jsonify(rpt_info), etag, last_modified)
 
-# TODO: Currently, the size of the binary data is too large to be returned as a response.
-#       In the future, could use timescaledb to store the test data and return the data in chunks(separate by time).
 
-# @inject
-# @cells_bp.route('/<cell_name>/data/cell_data', methods=['GET'])
-# def get_cell_data(cell_name: str, cell_service: CellService):
-#     """
-#     Get cell data by its name.
-#     """
-#     cell_data = cell_service.get_data(cell_name, 'cell_data')
-#     if cell_data is None:
-#         return jsonify({"error": "Cell data not found"}), 404
-#     cell_data = cell_data.to_json(orient='records')
-#     return jsonify(cell_data)
+@inject
+@cells_bp.route('/<cell_name>/data/cell_data', methods=['GET'])
+def get_cell_data(cell_name: str, cell_service: CellService):
+    """
+    Get cell data of a cell summarized into time buckets.
+    Query parameters: start, end (Unix timestamps in seconds) and level (0 is the coarsest).
+    """
+    return get_data_tiles(cell_name, 'cell_data', cell_service)
 
 # @inject
 # @cells_bp.route('/<cell_name>/data/cell_cycle_metrics', methods=['GET'])
@@ -115,15 +123,35 @@ def get_latest_info(cell_name: str, cell_service: CellService):
 #     cell_cycle_metrics = cell_cycle_metrics.to_json(orient='records')
 #     return jsonify(cell_cycle_metrics)
 
-# @inject
-# @cells_bp.route('/<cell_name>/data/cell_data_vdf', methods=['GET'])
-# def get_cell_data_vdf(cell_name: str, cell_service: CellService):
-#     """
-#     Get cell data VDF by its name.
-#     """
-#     cell_data_vdf = cell_service.get_data(cell_name, 'cell_data_vdf')
-#     if cell_data_vdf is None:
-#         return jsonify({"error": "Cell data VDF not found"}), 404
-#     cell_data_vdf = cell_data_vdf.to_json(orient='records')
-#     return jsonify(cell_data_vdf)
-    
\ No newline at end of file
+@inject
+@cells_bp.route('/<cell_name>/data/cell_data_vdf', methods=['GET'])
+def get_cell_data_vdf(cell_name: str, cell_service: CellService):
+    """
+    Get cell data VDF of a cell summarized into time buckets.
+    Query parameters: start, end (Unix timestamps in seconds) and level (0 is the coarsest).
+    """
+    return get_data_tiles(cell_name, 'cell_data_vdf', cell_service)
+
+
+def get_data_tiles(cell_name: str, data_name: str, cell_service: CellService):
+    """
+    Read the time range and level from the request and get the summarized data.
+    """
+    start = request.args.get('start', type=int)
+    end = request.args.get('end', type=int)
+    level = request.args.get('level', type=int)
+    if level is not None and not 0 <= level < len(Const.PYRAMID_BUCKETS):
+        return jsonify({"error": f"Level must be between 0 and {len(Const.PYRAMID_BUCKETS) - 1}"}), 400
+    if start is not None and end is not None and start > end:
+        return jsonify({"error": "Start must not be after end"}), 400
+    # Only a cell that exists can be not modified, a processed cell always has its data
+    if not cell_service.find_cell_by_name(cell_name):
+        return jsonify({"error": "Cell not found"}), 404
+
+    etag, last_modified = cell_service.get_processed_version(cell_name)
+    if is_not_modified(etag, last_modified):
+        return not_modified(etag, last_modified)
+    tiles = cell_service.get_data_tiles(cell_name, data_name, start, end, level)
+    if tiles is None:
+        return jsonify({"error": "Cell data not found"}), 404
+    return with_cache_headers(jsonify(tiles), etag, last_modified)
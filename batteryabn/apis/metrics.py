@@ -0,0 +1,44 @@
+import time
+from flask import Blueprint, Response, g, request
+from redis.exceptions import RedisError
+from batteryabn import logger
+from batteryabn.extensions import rq
+from batteryabn.tasks import get_queue_lengths
+from batteryabn.utils.metrics import metrics, observe_request_duration
+
+metrics_bp = Blueprint('metrics', __name__)
+
+
+@metrics_bp.before_app_request
+def start_request_timer():
+    """
+    Start timing a request of any blueprint.
+    """
+    g.request_start = time.perf_counter()
+
+@metrics_bp.after_app_request
+def observe_request(response):
+    """
+    Observe the latency of a request by its route, so requests for different cells share a series.
+    Streamed responses are observed when the response starts.
+    """
+    start = g.pop('request_start', None)
+    if start is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        observe_request_duration(time.perf_counter() - start, route=route, method=request.method, status=response.status_code)
+    return response
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_metrics():
+    """
+    Get the metrics of the API and the workers in the Prometheus text format.
+    """
+    try:
+        connection = rq.connection
+        gauges = [('batteryabn_queue_jobs', 'Jobs in the task queues by queue and status', get_queue_lengths())]
+        body = metrics.render(connection, gauges)
+    except RedisError as e:
+        # The metrics of the API are still served without Redis
+        logger.warning(f'Failed to read metrics from Redis. Error: {e}')
+        body = metrics.render()
+    return Response(body, mimetype='text/plain; version=0.0.4')
@@ -1,6 +1,6 @@
 from flask import Blueprint, jsonify
 from flask_injector import inject
-from batteryabn.services import ProjectService
+from batteryabn.services import ProjectService, CellService
 
 projects_bp = Blueprint('projects', __name__)
 
@@ -37,4 +37,15 @@ def get_unlisted_projects(project_service: ProjectService):
     for project in projects_name_in_filesystem:
         if project not in projects_name:
             unlisted_projects.append(project)
-    return jsonify(unlisted_projects)
\ No newline at end of file
+    return jsonify(unlisted_projects)
+
+@inject
+@projects_bp.route('/<project_name>/summary', methods=['GET'])
+def get_project_summary(project_name: str, cell_service: CellService):
+    """
+    Get the latest test and cycle metric summaries of all cells in a project.
+    """
+    summary = cell_service.get_project_summary(project_name)
+    if summary is None:
+        return jsonify({"error": "The project does not exist or has no cells."}), 404
+    return jsonify(summary)
\ No newline at end of file
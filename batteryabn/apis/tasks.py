@@ -1,9 +1,12 @@
 import os
-from flask import Blueprint, jsonify
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flask_injector import inject
 from batteryabn.services import CellService
-from batteryabn.tasks import process_cell_task, update_trs_task, clear_failed, clear_finished, clear_all, get_tasks_status
+from batteryabn.tasks import (process_cell_task, update_trs_task, update_project_task, enqueue_unique, enqueue_pipeline,
+                              UPDATE_TASK_NAMES, get_queue_name, clear_failed, clear_finished, clear_all, get_tasks_status, get_task_status, 
+                              stream_task_status)
 from batteryabn import Constants as Const 
+from batteryabn.utils import read_spans, summarize_spans, summarize_memory
 
 tasks_bp = Blueprint('tasks', __name__)
 
@@ -13,17 +16,21 @@ def update_trs(cell_name: str, cell_service: CellService):
     """
     Update test records for a cell by its name.
     """
+    priority = request.args.get('priority', 'interactive')
+    if priority not in Const.TASK_PRIORITIES:
+        return jsonify({"error": f"Priority must be one of {Const.TASK_PRIORITIES}"}), 400
     cell = cell_service.find_cell_by_name(cell_name)
     if not cell:
         return jsonify({"error": "Cell not found"}), 404
     project_name = cell.project_name
-    data_directory = Const.DATA_DIRECTORY.format(project_name, cell_name)
+    data_directory = Const.DATA_DIRECTORY.format(project_name=project_name, cell_name=cell_name)
     # Check if the path is correct
     if not os.path.exists(data_directory):
         return jsonify({"error": "Data directory not found"}), 404
     
-    update_trs_task.queue(data_directory, cell_name, False, description=f"Update {cell_name}")
-    return jsonify({"message": "Test records update task enqueued."})
+    job = enqueue_unique(update_trs_task, 'update_trs', cell_name, data_directory, cell_name, False, description=f"Update {cell_name}", 
+                         priority=priority)
+    return jsonify({"message": "Test records update task enqueued.", "id": job.id})
 
 @inject 
 @tasks_bp.route('/trs/reset/<cell_name>', methods=['POST'])
@@ -31,17 +38,21 @@ def reset_trs(cell_name: str, cell_service: CellService):
     """
     Reset test records for a cell by its name.
     """
+    priority = request.args.get('priority', 'interactive')
+    if priority not in Const.TASK_PRIORITIES:
+        return jsonify({"error": f"Priority must be one of {Const.TASK_PRIORITIES}"}), 400
     cell = cell_service.find_cell_by_name(cell_name)
     if not cell:
         return jsonify({"error": "Cell not found"}), 404
     project_name = cell.project_name
-    data_directory = Const.DATA_DIRECTORY.format(project_name, cell_name)
+    data_directory = Const.DATA_DIRECTORY.format(project_name=project_name, cell_name=cell_name)
     # Check if the path is correct
     if not os.path.exists(data_directory):
         return jsonify({"error": "Data directory not found"}), 404
     
-    update_trs_task.queue(data_directory, cell_name, True, description=f"Reset {cell_name}")
-    return jsonify({"message": "Test records update task enqueued."})
+    job = enqueue_unique(update_trs_task, 'reset_trs', cell_name, data_directory, cell_name, True, description=f"Reset {cell_name}", 
+                         priority=priority)
+    return jsonify({"message": "Test records update task enqueued.", "id": job.id})
 
 @inject
 @tasks_bp.route('/cell/create/<cell_name>', methods=['POST'])
@@ -49,28 +60,37 @@ def create_cell(cell_name: str):
     """
     Create a cell by its name.
     """
+    priority = request.args.get('priority', 'interactive')
+    if priority not in Const.TASK_PRIORITIES:
+        return jsonify({"error": f"Priority must be one of {Const.TASK_PRIORITIES}"}), 400
     project_name = cell_name.split('_')[0]
-    data_directory = Const.DATA_DIRECTORY.format(project_name, cell_name)
+    data_directory = Const.DATA_DIRECTORY.format(project_name=project_name, cell_name=cell_name)
     # Check if the path is correct
     if not os.path.exists(data_directory):
         return jsonify({"error": "Cell does not have data here"}), 404
 
-    update_trs_task.queue(data_directory, cell_name, True, description=f"Create {cell_name}")
-    return jsonify({"message": "Test records update task enqueued."})
+    job = enqueue_unique(update_trs_task, 'reset_trs', cell_name, data_directory, cell_name, True, description=f"Create {cell_name}", 
+                         priority=priority)
+    return jsonify({"message": "Test records update task enqueued.", "id": job.id})
     
 @inject
 @tasks_bp.route('/project/update/<project_name>', methods=['POST'])
 def update_project(project_name: str):
     """
-    Create a project by its name.
+    Update the test records of all cells in a project, with one task per cell.
     """
+    priority = request.args.get('priority', 'bulk')
+    if priority not in Const.TASK_PRIORITIES:
+        return jsonify({"error": f"Priority must be one of {Const.TASK_PRIORITIES}"}), 400
     data_directory = Const.DATA_DIRECTORY.format(project_name=project_name, cell_name="")
     # Check if the path is correct
     if not os.path.exists(data_directory):
         return jsonify({"error": "Project does not have data here"}), 404
 
-    update_trs_task.queue(data_directory, project_name, False, description=f"Update Project: {project_name}")
-    return jsonify({"message": "Test records update task enqueued."})
+    process = request.args.get('process', 'false').lower() == 'true'
+    job = update_project_task.queue(project_name, False, process, priority, description=f"Update Project: {project_name}", 
+                                    queue=get_queue_name('update_project', priority))
+    return jsonify({"message": "Project update task enqueued.", "id": job.id})
 
 
 @inject
@@ -79,21 +99,79 @@ def process_cell(cell_name: str, cell_service: CellService):
     """
     Process a cell by its name.
     """
+    priority = request.args.get('priority', 'interactive')
+    if priority not in Const.TASK_PRIORITIES:
+        return jsonify({"error": f"Priority must be one of {Const.TASK_PRIORITIES}"}), 400
     cell = cell_service.find_cell_by_name(cell_name)
     if not cell:
         return jsonify({"error": "Cell not found"}), 404
-    process_cell_task.queue(cell_name, description=f"Process {cell_name}")
-    return jsonify({"message": "Cell processing task enqueued."})
+    job = enqueue_unique(process_cell_task, 'process_cell', cell_name, cell_name, description=f"Process {cell_name}", 
+                         after_tasks=UPDATE_TASK_NAMES, priority=priority)
+    return jsonify({"message": "Cell processing task enqueued.", "id": job.id})
+
+@inject
+@tasks_bp.route('/cell/pipeline/<cell_name>', methods=['POST'])
+def update_and_process_cell(cell_name: str, cell_service: CellService):
+    """
+    Update test records for a cell by its name, then process the cell if any test records changed.
+    """
+    priority = request.args.get('priority', 'interactive')
+    if priority not in Const.TASK_PRIORITIES:
+        return jsonify({"error": f"Priority must be one of {Const.TASK_PRIORITIES}"}), 400
+    cell = cell_service.find_cell_by_name(cell_name)
+    if not cell:
+        return jsonify({"error": "Cell not found"}), 404
+    data_directory = Const.DATA_DIRECTORY.format(project_name=cell.project_name, cell_name=cell_name)
+    # Check if the path is correct
+    if not os.path.exists(data_directory):
+        return jsonify({"error": "Data directory not found"}), 404
+
+    job = enqueue_pipeline(data_directory, cell_name, priority=priority)
+    return jsonify({"message": "Cell pipeline task enqueued.", "id": job.id})
 
 @inject
 @tasks_bp.route('/status', methods=['GET'])
 def get_all_tasks_status():
     """
-    Get the status of all tasks.
+    Get a page of the status of all tasks.
     """
-    result = get_tasks_status()
+    page = request.args.get('page', 1, type=int)
+    per_page = request.args.get('per_page', Const.TASK_STATUS_PAGE_SIZE, type=int)
+    if page < 1 or per_page < 1:
+        return jsonify({"error": "Page and per_page must be positive"}), 400
+    result = get_tasks_status(page, per_page)
     return jsonify(result), 200
 
+@tasks_bp.route('/status/<job_id>', methods=['GET'])
+def get_single_task_status(job_id: str):
+    """
+    Get the status of a task, with the aggregate status of its child tasks.
+    """
+    result = get_task_status(job_id)
+    if result is None:
+        return jsonify({"error": "Task not found"}), 404
+    return jsonify(result), 200
+
+@tasks_bp.route('/status/<job_id>/stream', methods=['GET'])
+def stream_single_task_status(job_id: str):
+    """
+    Stream the status and progress of a task as server-sent events until it ends.
+    """
+    if get_task_status(job_id) is None:
+        return jsonify({"error": "Task not found"}), 404
+    response = Response(stream_with_context(stream_task_status(job_id)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+
+@tasks_bp.route('/timings', methods=['GET'])
+def get_timings():
+    """
+    Summarize the timed stages of tasks, and their memory if profiled, optionally of a single cell or job.
+    """
+    spans = read_spans(cell_name=request.args.get('cell_name'), job_id=request.args.get('job_id'))
+    return jsonify({"spans": len(spans), "stages": summarize_spans(spans), "memory": summarize_memory(spans)}), 200
+
 
 @tasks_bp.route('/clear', methods=['POST'])
 def clear_all_tasks():
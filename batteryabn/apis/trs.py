@@ -1,6 +1,9 @@
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, Response, jsonify, request, stream_with_context
 from flask_injector import inject
+from batteryabn import Constants as Const
+from batteryabn.utils import Utils
 from batteryabn.services import TestRecordService
+from .caching import is_not_modified, not_modified, with_cache_headers
 
 trs_bp = Blueprint('tests', __name__)
 
@@ -18,16 +21,19 @@ def get_trs_by_cell_name(cell_name: str, test_record_service: TestRecordService)
 
 @inject
 @trs_bp.route('/<tr_name>', methods=['GET'])
-def get_tr_by_name(test_name: str, test_record_service: TestRecordService):
+def get_tr_by_name(tr_name: str, test_record_service: TestRecordService):
     """
     Get a specific test record by its name.
     """
     # Get test type from parameters
     test_type = request.args.get('test_type')
-    test_record = test_record_service.find_test_record_by_name(test_name, test_type)
+    test_record = test_record_service.find_test_record_by_name(tr_name, test_type)
     if not test_record:
         return jsonify({"error": "Test record not found"}), 404
-    return jsonify(test_record.to_dict())
+    etag = test_record.get_version()
+    if is_not_modified(etag):
+        return not_modified(etag)
+    return with_cache_headers(jsonify(test_record.to_dict()), etag)
 
 @inject
 @trs_bp.route('/search/<keyword>', methods=['GET'])
@@ -42,29 +48,48 @@ def search_trs(keyword: str, test_record_service: TestRecordService):
 
 @inject
 @trs_bp.route('/<tr_name>/metadata', methods=['GET'])
-def get_tr_metadata(test_name: str, test_record_service: TestRecordService):
+def get_tr_metadata(tr_name: str, test_record_service: TestRecordService):
     """
     Get the metadata of a specific test record by its name.
     """
     test_type = request.args.get('test_type')
-    test_record = test_record_service.find_test_record_by_name(test_name, test_type)
+    test_record = test_record_service.find_test_record_by_name(tr_name, test_type)
     if not test_record:
         return jsonify({"error": "Test record not found"}), 404
-    return jsonify(test_record.get_test_metadata())
+    etag = test_record.get_version()
+    if is_not_modified(etag):
+        return not_modified(etag)
+    return with_cache_headers(jsonify(test_record.get_test_metadata()), etag)
 
 @inject
 @trs_bp.route('/<tr_name>/data', methods=['GET'])
-def get_tr_data(test_name: str, test_record_service: TestRecordService):
+def get_tr_data(tr_name: str, test_record_service: TestRecordService):
     """
-    Get the data of a specific test record by its name.
+    Stream the data of a specific test record by its name.
+    Query parameters: test_type, format ('ndjson' or 'csv'), columns (comma separated),
+    start and stop (row range).
     """
     test_type = request.args.get('test_type')
-    test_record = test_record_service.find_test_record_by_name(test_name, test_type)
+    fmt = request.args.get('format', Const.NDJSON)
+    columns = request.args.get('columns')
+    columns = [column.strip() for column in columns.split(',')] if columns else None
+    start = request.args.get('start', type=int)
+    stop = request.args.get('stop', type=int)
+    if fmt not in Const.STREAM_MIMETYPES:
+        return jsonify({"error": f"Unsupported format: {fmt}"}), 400
+
+    test_record = test_record_service.find_test_record_by_name(tr_name, test_type)
     if not test_record:
         return jsonify({"error": "Test record not found"}), 404
-    data = test_record.get_test_data()
-    data = data.to_json(orient='records')
-    return jsonify(data)
-    
-
+    etag = test_record.get_version()
+    if is_not_modified(etag):
+        return not_modified(etag)
 
+    try:
+        data = test_record_service.get_test_data(test_record, columns, start, stop)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    if data is None:
+        return jsonify({"error": "Test data not found"}), 404
+    response = Response(stream_with_context(Utils.iter_df_chunks(data, fmt)), mimetype=Const.STREAM_MIMETYPES[fmt])
+    return with_cache_headers(response, etag)
@@ -6,9 +6,11 @@ from flask_cors import CORS
 from injector import singleton, Binder
 from batteryabn.repositories import ProjectRepository, CellRepository, TestRecordRepository, FileSystemRepository
 from batteryabn.services import ProjectService, CellService, TestRecordService
-from batteryabn.utils import Parser, Formatter, Processor, Viewer
+from batteryabn.utils import Parser, Formatter, Processor, Viewer, BlobStore, configure_blob_store, get_blob_store_type
 from batteryabn.extensions import db, rq
-from batteryabn.apis import projects_bp, cells_bp, trs_bp, tasks_bp
+from batteryabn.apis import projects_bp, cells_bp, trs_bp, tasks_bp, metrics_bp
+from batteryabn.workers import workers_command
+from batteryabn import Constants as Const
 
 def create_app():
     app = Flask(__name__)
@@ -19,6 +21,10 @@ def create_app():
     app.config['SQLALCHEMY_DATABASE_URI'] = os.getenv('DATABASE_URI')
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     app.config['RQ_REDIS_URL'] = os.getenv('REDIS_URL')
+    app.config['BLOB_DIRECTORY'] = os.getenv('BLOB_DIRECTORY', Const.BLOB_DIRECTORY)
+    app.config['BLOB_STORE'] = os.getenv('BLOB_STORE', Const.BLOB_STORE)
+    # `flask rq worker` without queues works on all queues, in priority order
+    app.config['RQ_QUEUES'] = Const.TASK_QUEUES
     app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
         'pool_pre_ping': True,
         'pool_size': 10,
@@ -27,12 +33,18 @@ def create_app():
     }
     db.init_app(app)
     rq.init_app(app)
+    # One blob store for the injected services, the tasks and the repositories loading the blobs
+    blob_store = configure_blob_store(get_blob_store_type(app.config['BLOB_STORE'])(app.config['BLOB_DIRECTORY']))
 
     # Register Blueprints
     app.register_blueprint(projects_bp, url_prefix='/api/projects')
     app.register_blueprint(cells_bp, url_prefix='/api/cells')
     app.register_blueprint(trs_bp, url_prefix='/api/trs')
     app.register_blueprint(tasks_bp, url_prefix='/api/tasks')
+    app.register_blueprint(metrics_bp)
+
+    # Worker pool with per-queue concurrency: `flask workers`
+    app.cli.add_command(workers_command)
 
     # Dependency Injection setup
     def configure(binder: Binder):
@@ -40,6 +52,7 @@ def create_app():
         binder.bind(CellRepository, to=CellRepository, scope=singleton)
         binder.bind(TestRecordRepository, to=TestRecordRepository, scope=singleton)
         binder.bind(FileSystemRepository, to=FileSystemRepository, scope=singleton)
+        binder.bind(BlobStore, to=blob_store, scope=singleton)
         binder.bind(ProjectService, to=ProjectService)
         binder.bind(CellService, to=CellService)
         binder.bind(TestRecordService, to=TestRecordService)
@@ -10,6 +10,9 @@ class Constants:
     PROJECT_PREFIX = 'PROJ_'
     DATA_FOLDER = 'Cycler_Data_By_Cell'
     DATA_DIRECTORY = '/home/me-bcl/Lab_share_Volt/PROJ_{project_name}/Cycler_Data_By_Cell/{cell_name}'
+    BLOB_DIRECTORY = '/home/me-bcl/Lab_share_Volt/Blobs' # Content addressed storage of test data
+    BLOB_STORE = 'local' # Scheme of the blob store new test data is written to, 'local' or 'bucket' for the object storage stand-in
+    CELLPY_SCRATCH_DIRECTORY = None # Local directory to copy Arbin res files to before reading, by default they are read in place
         
 #------------------------------------Strings:------------------------------------------#
     ARBIN = 'Arbin'
@@ -33,6 +36,7 @@ class Constants:
     TOTAL_TIME = 'total time'
     CONTACT_RESISTANCE = 'contact resistance(mω)'
     
+    APPENDABLE_TEST_TYPES = [NEWARE, VDF] # Test types of growing files, whose new rows are appended as chunks
     FILE_TYPE_2_TEST_TYPE = {'res': ARBIN, 'mpr': BIOLOGIC, 'xlsx': NEWARE, 'csv': VDF}
 
     ARBIN_NAME_KEYS = [
@@ -184,6 +188,29 @@ class Constants:
     CCM_COLUMNS_ADDITIONAL_ESOH = [ESOH_C, ESOH_CN, ESOH_X0, ESOH_X100, ESOH_CP, ESOH_Y0, 
                                    ESOH_Y100, RMSE_V, RMSE_DVDQ, P1_ERR, P2_ERR, P12_ERR]
 
+    #----------------------------------Pyramid---------------------------------#
+    # Multi-resolution summaries of cell data, level 0 is the coarsest
+    PYRAMID = 'pyramid'
+    PYRAMID_BUCKETS = [86400, 21600, 3600, 600, 60] # Bucket width in seconds for each level
+    PYRAMID_STATS = ['min', 'max', 'mean']
+    PYRAMID_MAX_POINTS = 5000 # Max buckets returned in a single response
+    PYRAMID_COLUMNS = [CURRENT, VOLTAGE, AHT, TEMPERATURE]
+    PYRAMID_COLUMNS_VDF = [EXPANSION, EXPANSION_UM, EXPANSION_REF, TEMPERATURE]
+
+    #----------------------------------Stream----------------------------------#
+    NDJSON = 'ndjson'
+    CSV = 'csv'
+    STREAM_MIMETYPES = {NDJSON: 'application/x-ndjson', CSV: 'text/csv'}
+    STREAM_CHUNK_ROWS = 10000 # Rows serialized per chunk of a streamed response
+
+    #----------------------------------Cache-----------------------------------#
+    PROCESSED_VERSION_FILE = 'processed.version' # Touched after a cell is processed
+    CACHE_MAX_AGE = 60 # Seconds a client may reuse a response before revalidating it
+
+    #----------------------------------Database--------------------------------#
+    BLOB_GROUP = 'blobs' # Deferred group of the large binary columns, only loaded on access or on request
+    BLOB_CHUNK_SIZE = 1024 * 1024 # Bytes read at a time when streaming a blob
+
     #-------------------RENAME_DICT-------------------#
 
     ARBIN_RENAME_DICT = {'step_time': TIME,
@@ -235,6 +262,31 @@ class Constants:
     QMAX = 3.8
     I_C20 = 0.177
 
+    INGEST_BATCH_SIZE = 20 # Test records written and committed together when ingesting files
+    TASK_MAX_RETRIES = 2 # Retries of a failed cell job enqueued by a project task
+    TASK_LOCK_TIMEOUT = 10 # Seconds a lock is held to check and enqueue a cell task
+    TASK_WAITING_STATUSES = ['queued', 'deferred', 'scheduled'] # Job statuses a new request for the same task coalesces into
+    TASK_FAILED_STATUSES = ['failed', 'stopped', 'canceled'] # Job statuses that leave the jobs depending on the job deferred
+    TASK_QUEUES = ['interactive', 'esoh', 'bulk'] # Task queues in the order workers take jobs from them
+    TASK_PRIORITIES = ['interactive', 'bulk'] # Priorities a request can pick, each is also the queue of its tasks
+    TASK_ROUTES = {'process_cell': 'esoh'} # Tasks with their own queue whatever the priority, interactive jobs go to its front
+    TASK_QUEUE_WORKERS = {'interactive': 2, 'esoh': 1, 'bulk': 2} # Worker processes per queue started by `flask workers`
+    TASK_STATUS_PAGE_SIZE = 50 # Jobs per status in a page of the task status
+    TASK_STATUS_CACHE_TTL = 2 # Seconds a snapshot of the task status is served to polls before it is read again
+    TASK_MAX_ENDED_JOBS = 200 # Finished and failed jobs kept per queue each, older jobs are deleted
+    PROGRESS_INTERVAL = 1 # Minimum seconds between saves of the progress of a job
+    PROGRESS_STREAM_INTERVAL = 1 # Seconds between reads of a job by the progress stream
+    TIMING_FILE = 'logs/timings.jsonl' # JSON lines of the timed stages, written when timing is enabled with TIMING=true
+    TIMING_FILE_MAX_BYTES = 10 * 1024 * 1024 # Size the timing file is rotated at, to TIMING_FILE.1, so reading it stays bounded
+    MEMORY_REPORT_STAGES = 20 # Stages in the memory report logged by a profiled task, with MEMORY_PROFILE=true
+    METRICS_KEY = 'batteryabn:metrics' # Redis hash the workers add their metrics to
+    METRICS_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30] # Upper bounds of histograms in seconds
+    METRICS_TASK_BUCKETS = [1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600] # Upper bounds of the task duration histogram in seconds
+    VDF_TAIL_BLOCK_SIZE = 64 * 1024 # Bytes read at a time when searching the end of the last complete Vdf row
+    # Column types of Vdf csv files by unit, test time stays float64 to keep sub-second resolution over months of testing
+    VDF_UNIT_DTYPES = {'second': 'float64', 'epoch': 'int64', 'amp': 'float32', 'volt': 'float32', 
+                       'celsius': 'float32', 'percent': 'float32'}
+
     #------------------------Project Setting---------------------------#
     # TODO: These values should be placed in a configuration yaml or json file
     GMJULY2022_PULSE_CURRENTS = [3.0, 1.5, -3.0, -1.5, -0.5]
@@ -1,3 +1,9 @@
+from sqlalchemy import DDL, event
+from ..extensions import db
 from .testrecord import TestRecord
 from .cell import Cell
-from .project import Project
\ No newline at end of file
+from .project import Project
+
+# The trigram indexes of the keyword searches need the pg_trgm extension before any table is created
+event.listen(db.Model.metadata, 'before_create', 
+             DDL('CREATE EXTENSION IF NOT EXISTS pg_trgm').execute_if(dialect='postgresql'))
@@ -1,3 +1,6 @@
+from sqlalchemy import Index
+from sqlalchemy.orm import deferred
+from batteryabn import Constants as Const
 from batteryabn.utils import Utils
 from ..extensions import db
 
@@ -7,6 +10,12 @@ class Cell(db.Model):
     """
 
     __tablename__ = 'cells'
+    __table_args__ = (
+        Index('ix_cells_project_name', 'project_name'),
+        # Trigram index for ilike keyword searches, requires the pg_trgm extension
+        Index('ix_cells_cell_name_trgm', 'cell_name', 
+              postgresql_using='gin', postgresql_ops={'cell_name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     cell_name = db.Column(db.String, unique=True)
@@ -15,15 +24,15 @@ class Cell(db.Model):
     project_name = db.Column(db.String, db.ForeignKey('projects.project_name'))
     project = db.relationship("Project", back_populates="cells")
 
-    # Binary data fields
-    cell_data = db.Column(db.LargeBinary, nullable=True)
-    cell_cycle_metrics = db.Column(db.LargeBinary, nullable=True)
-    cell_data_vdf = db.Column(db.LargeBinary, nullable=True)
+    # Binary data fields, not loaded until accessed
+    cell_data = deferred(db.Column(db.LargeBinary, nullable=True), group=Const.BLOB_GROUP)
+    cell_cycle_metrics = deferred(db.Column(db.LargeBinary, nullable=True), group=Const.BLOB_GROUP)
+    cell_data_vdf = deferred(db.Column(db.LargeBinary, nullable=True), group=Const.BLOB_GROUP)
 
     # Images for the processed data
-    image_cell = db.Column(db.LargeBinary, nullable=True)
-    image_ccm = db.Column(db.LargeBinary, nullable=True)
-    image_ccm_aht = db.Column(db.LargeBinary, nullable=True)
+    image_cell = deferred(db.Column(db.LargeBinary, nullable=True), group=Const.BLOB_GROUP)
+    image_ccm = deferred(db.Column(db.LargeBinary, nullable=True), group=Const.BLOB_GROUP)
+    image_ccm_aht = deferred(db.Column(db.LargeBinary, nullable=True), group=Const.BLOB_GROUP)
 
 
     def load_cell_data(self):
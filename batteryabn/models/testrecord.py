@@ -1,4 +1,5 @@
-import pandas as pd
+from sqlalchemy import Index
+from sqlalchemy.orm import deferred
 from batteryabn import Constants
 from batteryabn.utils import Utils
 from ..extensions import db
@@ -18,19 +19,35 @@ class TestRecord(db.Model):
     test_type : str
         Type of the battery test, e.g. 'Arbin', 'BioLogic', 'Neware', 'Vdf'
     test_data : pickle
-        Pickled test dataframe
+        Pickled test dataframe, only for test records saved before test data moved to the blob store
+    test_data_uri : str
+        URI of the pickled test dataframe in the blob store, the first chunk if the test data is chunked
+    test_data_chunks : list
+        Chunks of the test data in the blob store, each with its URI, number of rows and tail
     test_metadata : pickle
         Pickled test metadata dictionary
     """
     __tablename__ = 'testrecords'
+    __table_args__ = (
+        # Unique, so test records can be upserted with INSERT ... ON CONFLICT
+        Index('ix_testrecords_test_name_test_type', 'test_name', 'test_type', unique=True),
+        Index('ix_testrecords_cell_name', 'cell_name'),
+        # Trigram index for ilike keyword searches, requires the pg_trgm extension
+        Index('ix_testrecords_test_name_trgm', 'test_name', 
+              postgresql_using='gin', postgresql_ops={'test_name': 'gin_trgm_ops'}),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     test_name = db.Column(db.String)
     test_type = db.Column(db.String)
     cell_name = db.Column(db.String, db.ForeignKey('cells.cell_name'))
     # Store test data as pickled object
-    test_data = db.Column(db.LargeBinary) 
-    test_metadata = db.Column(db.LargeBinary)
+    # Large binary fields are not loaded until accessed, so listing test records stays cheap
+    test_data = deferred(db.Column(db.LargeBinary), group=Constants.BLOB_GROUP)
+    test_metadata = deferred(db.Column(db.LargeBinary), group=Constants.BLOB_GROUP)
+    test_data_uri = db.Column(db.String, nullable=True)
+    # Append-only chunks of growing test files, [{'uri', 'rows', 'last_timestamp', 'last_current', 'last_aht'}]
+    test_data_chunks = db.Column(db.JSON, nullable=True)
     start_time = db.Column(db.BIGINT, nullable=True)  # Unix timestamp
     last_update_time = db.Column(db.BIGINT)  # Unix timestamp
     size = db.Column(db.Integer, nullable=True)  # Size of the test data in bytes
@@ -38,16 +55,41 @@ class TestRecord(db.Model):
     cell = db.relationship("Cell", back_populates="test_records")
 
 
-    def get_test_data(self) -> pd.DataFrame:
+    def get_blob_uris(self) -> list[str]:
         """
-        Get test data as dataframe.
+        Get the URIs of the blobs of the test data.
 
         Returns
         -------
-        pd.DataFrame
-            Test data
+        list[str]
+            The URIs of the chunks, or of the whole test data if it is not chunked
         """
-        return Utils.gzip_pickle_load(self.test_data)
+        uris = [chunk['uri'] for chunk in self.test_data_chunks or []]
+        if self.test_data_uri and self.test_data_uri not in uris:
+            uris.append(self.test_data_uri)
+        return uris
+
+    def get_tail(self) -> dict:
+        """
+        Get the tail of the test data, to append the rows added to a growing test file.
+
+        Returns
+        -------
+        dict
+            The tail of the last chunk, None if the test data is not chunked
+        """
+        return self.test_data_chunks[-1] if self.test_data_chunks else None
+
+    def has_test_data(self) -> bool:
+        """
+        Check if the test record has test data, in the blob store or in the database row.
+
+        Returns
+        -------
+        bool
+            True if the test record has test data, False otherwise
+        """
+        return self.test_data_uri is not None or self.test_data is not None
     
     def get_test_metadata(self) -> dict:
         """
@@ -60,6 +102,17 @@ class TestRecord(db.Model):
         """
         return Utils.gzip_pickle_load(self.test_metadata)
     
+    def get_version(self) -> str:
+        """
+        Get the version of the test record, which changes whenever its data is updated.
+
+        Returns
+        -------
+        str
+            Test record version
+        """
+        return f'{self.id}-{self.size}-{self.last_update_time}'
+    
     def get_cycle_type(self) -> str:
         """
         Get the cycle type of the test. i.e. 'CYC', 'RPT', 'Test11', 'EIS', 'CAL', '_F' 
@@ -1,4 +1,5 @@
 from .cell_repository import CellRepository, create_cell_repository
 from .testrecord_repository import TestRecordRepository, create_test_record_repository
 from .project_repository import ProjectRepository, create_project_repository
-from .filesystem_repository import FileSystemRepository, create_filesystem_repository
\ No newline at end of file
+from .filesystem_repository import FileSystemRepository, create_filesystem_repository
+from .test_data_repository import TestDataRepository, create_test_data_repository
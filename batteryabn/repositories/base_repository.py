@@ -1,3 +1,4 @@
+from sqlalchemy.dialects import postgresql, sqlite
 from batteryabn.extensions import db
 
 
@@ -24,4 +25,10 @@ class BaseRepository:
 
     def rollback(self):
         """Rollback the current transaction."""
-        self.session.rollback()
\ No newline at end of file
+        self.session.rollback()
+
+    def insert(self, model):
+        """Create an INSERT statement for a model, supporting ON CONFLICT clauses of the session's database."""
+        if self.session.get_bind().dialect.name == 'sqlite':
+            return sqlite.insert(model)
+        return postgresql.insert(model)
@@ -1,4 +1,6 @@
-from batteryabn.models import Cell
+from sqlalchemy import func, and_
+from batteryabn import Constants as Const
+from batteryabn.models import Cell, TestRecord
 from .base_repository import BaseRepository
 
 def create_cell_repository(session=None):
@@ -55,4 +57,68 @@ class CellRepository(BaseRepository):
         list
             A list of Cell objects that match the keyword
         """
-        return self.session.query(Cell).filter(Cell.cell_name.ilike(f'%{keyword}%')).all()
\ No newline at end of file
+        return self.session.query(Cell).filter(Cell.cell_name.ilike(f'%{keyword}%')).all()
+    
+    def upsert(self, rows: list[dict]):
+        """
+        This method inserts Cells, or updates the project of the existing Cells with the same name.
+        The project of an existing cell is kept if the new project name is None.
+
+        Parameters
+        ----------
+        rows : list[dict]
+            The cells to insert, each with cell_name and project_name
+        """
+        if not rows:
+            return
+        statement = self.insert(Cell)
+        statement = statement.on_conflict_do_update(
+            index_elements=['cell_name'],
+            set_={'project_name': func.coalesce(statement.excluded.project_name, Cell.project_name)})
+        self.session.execute(statement, rows)
+
+    def summarize_by_project(self, project_name: str):
+        """
+        This method summarizes the test records of every Cell in a Project in a single query.
+        Only the metadata columns are read, the test data is never loaded.
+
+        Parameters
+        ----------
+        project_name : str
+            The name of the project to summarize cells for
+
+        Returns
+        -------
+        list
+            One row per cell with cell_name, test_count, start_time, last_update_time,
+            latest_test_name and latest_test_type
+        """
+        project_name = project_name.upper()
+        # Test record statistics of each cell
+        stats = (self.session.query(TestRecord.cell_name,
+                                    func.count(TestRecord.id).label('test_count'),
+                                    func.min(TestRecord.start_time).label('start_time'),
+                                    func.max(TestRecord.last_update_time).label('last_update_time'))
+                 .join(Cell, Cell.cell_name == TestRecord.cell_name)
+                 .filter(Cell.project_name == project_name)
+                 .group_by(TestRecord.cell_name)
+                 .subquery())
+        # Latest cycler test record of each cell, the same rule as CellService.get_latest_test_record
+        ranked = (self.session.query(TestRecord.cell_name, TestRecord.test_name, TestRecord.test_type,
+                                     func.row_number().over(partition_by=TestRecord.cell_name,
+                                                            order_by=TestRecord.last_update_time.desc().nullslast()).label('rank'))
+                  .join(Cell, Cell.cell_name == TestRecord.cell_name)
+                  .filter(Cell.project_name == project_name, TestRecord.test_type != Const.VDF)
+                  .subquery())
+
+        return (self.session.query(Cell.cell_name,
+                                   func.coalesce(stats.c.test_count, 0).label('test_count'),
+                                   stats.c.start_time,
+                                   stats.c.last_update_time,
+                                   ranked.c.test_name.label('latest_test_name'),
+                                   ranked.c.test_type.label('latest_test_type'))
+                .outerjoin(stats, stats.c.cell_name == Cell.cell_name)
+                .outerjoin(ranked, and_(ranked.c.cell_name == Cell.cell_name, ranked.c.rank == 1))
+                .filter(Cell.project_name == project_name)
+                .order_by(Cell.cell_name)
+                .all())
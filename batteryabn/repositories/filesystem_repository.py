@@ -1,8 +1,10 @@
 import os
+import time
 import pickle
 import gzip
 import pandas as pd
 import matplotlib.pyplot as plt
+from datetime import datetime, timezone
 from batteryabn import logger, Constants as Const
 
 def create_filesystem_repository():
@@ -141,7 +143,115 @@ class FileSystemRepository:
 
         logger.info(f'Loaded data from local file: {file_path}')
         return data
-    
+
+    def save_pyramid(self, project: str, cell_name: str, data_name: str, pyramid: dict):
+        """
+        Save each level of a data pyramid to its own local pkl.gz file,
+        so a query only has to load the level it needs.
+
+        Parameters
+        ----------
+        project : str
+            The name of the project
+        cell_name : str
+            The name of the cell
+        data_name : str
+            The name of the summarized data, e.g. 'cell_data'
+        pyramid : dict
+            Keys are levels and values are the summarized dataframes
+        """
+        for level, tile in pyramid.items():
+            self.save_to_local_pklgz(project, cell_name, self.get_pyramid_name(data_name, level), tile)
+
+    def load_pyramid_level(self, project: str, cell_name: str, data_name: str, level: int) -> pd.DataFrame:
+        """
+        Load a single level of a data pyramid.
+
+        Parameters
+        ----------
+        project : str
+            The name of the project
+        cell_name : str
+            The name of the cell
+        data_name : str
+            The name of the summarized data, e.g. 'cell_data'
+        level : int
+            The level to load
+
+        Returns
+        -------
+        pd.DataFrame
+            The summarized data of the level
+        """
+        return self.load_from_local_pklgz(project, cell_name, self.get_pyramid_name(data_name, level))
+
+    def get_pyramid_name(self, data_name: str, level: int):
+        """
+        Get the file data name for a level of a data pyramid.
+
+        Parameters
+        ----------
+        data_name : str
+            The name of the summarized data
+        level : int
+            The level of the pyramid
+
+        Returns
+        -------
+        str
+            The data name of the level
+        """
+        return f'{data_name}_{Const.PYRAMID}_{level}'
+
+    def save_processed_version(self, project: str, cell_name: str):
+        """
+        Mark the processed data of a cell as a new version. 
+        It should be called after all processed files of the cell are saved.
+
+        Parameters
+        ----------
+        project : str
+            The name of the project
+        cell_name : str
+            The name of the cell
+        """
+        cell_dir = self.get_cell_dir(project, cell_name)
+        if not os.path.exists(cell_dir):
+            os.makedirs(cell_dir)
+
+        file_path = os.path.join(cell_dir, Const.PROCESSED_VERSION_FILE)
+        with open(file_path, 'w') as f:
+            f.write(str(time.time_ns()))
+
+        logger.info(f'Saved processed version to local file: {file_path}')
+
+    def get_processed_version(self, project: str, cell_name: str):
+        """
+        Get the version of the processed data of a cell.
+        Cells processed before versions were saved fall back to the cell data file.
+
+        Parameters
+        ----------
+        project : str
+            The name of the project
+        cell_name : str
+            The name of the cell
+
+        Returns
+        -------
+        str
+            The version of the processed data, None if the cell has not been processed
+        datetime
+            The time the processed data was saved, None if the cell has not been processed
+        """
+        cell_dir = self.get_cell_dir(project, cell_name)
+        for file_name in [Const.PROCESSED_VERSION_FILE, 'cell_data.pkl.gz']:
+            file_path = os.path.join(cell_dir, file_name)
+            if os.path.exists(file_path):
+                mtime_ns = os.stat(file_path).st_mtime_ns
+                return str(mtime_ns), datetime.fromtimestamp(mtime_ns / 1e9, tz=timezone.utc)
+        return None, None
+
     def get_cell_dir(self, project: str, cell_name: str):
         """
         Get the directory for a cell.
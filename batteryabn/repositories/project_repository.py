@@ -34,4 +34,18 @@ class ProjectRepository(BaseRepository):
         List[Project]
             A list of all Project objects in the database
         """
-        return self.session.query(Project).all()
\ No newline at end of file
+        return self.session.query(Project).all()
+    
+    def upsert(self, project_names: list[str]):
+        """
+        This method inserts the Projects that do not exist yet.
+
+        Parameters
+        ----------
+        project_names : list[str]
+            The names of the projects to insert
+        """
+        if not project_names:
+            return
+        statement = self.insert(Project).on_conflict_do_nothing(index_elements=['project_name'])
+        self.session.execute(statement, [{'project_name': project_name} for project_name in project_names])
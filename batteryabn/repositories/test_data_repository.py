@@ -0,0 +1,54 @@
+import pandas as pd
+from batteryabn.utils import Utils, BlobStore, create_blob_store
+
+def create_test_data_repository(blob_store: BlobStore = None):
+    return TestDataRepository(blob_store)
+
+class TestDataRepository:
+    """
+    The TestDataRepository class loads the test data of test records from the blob store.
+    Test records only keep the URIs of their test data, so they are loaded either from TestRecord objects
+    or from rows of their columns, i.e. in bulk reads that do not load TestRecord objects.
+    """
+    def __init__(self, blob_store: BlobStore = None):
+        self.blob_store = blob_store if blob_store is not None else create_blob_store()
+
+    def load(self, test_record) -> pd.DataFrame:
+        """
+        Load the test data of a test record as dataframe.
+
+        Parameters
+        ----------
+        test_record : TestRecord or Row
+            The test record, or a row with its test_data_chunks, test_data_uri and test_data columns
+
+        Returns
+        -------
+        pd.DataFrame
+            Test data, the chunks concatenated if the test data is chunked
+        """
+        if test_record.test_data_chunks:
+            chunks = [self.load_blob(chunk['uri']) for chunk in test_record.test_data_chunks]
+            return chunks[0] if len(chunks) == 1 else pd.concat(chunks)
+        if test_record.test_data_uri:
+            return self.load_blob(test_record.test_data_uri)
+        # Test records saved before the blob store keep their test data in the database row
+        return Utils.gzip_pickle_load(test_record.test_data)
+
+    def load_blob(self, uri: str) -> pd.DataFrame:
+        """
+        Stream a pickled dataframe from the blob store.
+
+        Parameters
+        ----------
+        uri : str
+            The URI of the blob, read from the store of its scheme
+
+        Returns
+        -------
+        pd.DataFrame
+            The dataframe saved in the blob
+        """
+        blob_store = self.blob_store if uri.startswith(f'{self.blob_store.scheme}://') else create_blob_store(uri)
+        with blob_store.open(uri) as file:
+            return Utils.gzip_pickle_load_from(file)
@@ -1,3 +1,6 @@
+from sqlalchemy import String, cast, func, or_
+from sqlalchemy.orm import undefer_group
+from batteryabn import Constants as Const
 from batteryabn.models import TestRecord
 from .base_repository import BaseRepository
 
@@ -7,13 +10,67 @@ def create_test_record_repository(session=None):
 class TestRecordRepository(BaseRepository):
     """
     The TestRecordRepository class provides an interface for saving and querying TestRecord objects.
+    Queries only load the metadata columns, unless load_data is set. 
+    The deferred test data and metadata blobs are otherwise loaded when first accessed.
     """
 
-    def find_by_name(self, test_name: str, test_type: str):
-        return self.session.query(TestRecord).filter_by(test_name=test_name, test_type=test_type).first()
+    def find_by_name(self, test_name: str, test_type: str, load_data: bool = False):
+        return self.query(load_data).filter_by(test_name=test_name, test_type=test_type).first()
     
-    def find_by_cell_name(self, cell_name: str):
-        return self.session.query(TestRecord).filter_by(cell_name=cell_name.upper()).all()
+    def find_by_cell_name(self, cell_name: str, load_data: bool = False):
+        return self.query(load_data).filter_by(cell_name=cell_name.upper()).all()
     
-    def find_by_keyword(self, keyword: str):
-        return self.session.query(TestRecord).filter(TestRecord.test_name.ilike(f'%{keyword}%')).all()
\ No newline at end of file
+    def find_by_keyword(self, keyword: str, load_data: bool = False):
+        return self.query(load_data).filter(TestRecord.test_name.ilike(f'%{keyword}%')).all()
+
+    def find_versions_by_names(self, test_names: list[str]):
+        """Get the name, type, size, last update time and chunks of the test records with the given names."""
+        return self.session.query(TestRecord.test_name, TestRecord.test_type, TestRecord.size, TestRecord.last_update_time, 
+                                  TestRecord.test_data_chunks)\
+            .filter(TestRecord.test_name.in_(test_names)).all()
+
+    def find_test_data_by_cell_name(self, cell_name: str):
+        """
+        Get the name, type and test data columns of the test records of a cell, for bulk reads of their test data.
+        Only the columns are selected, so no TestRecord objects are loaded, and the test data row is only set for 
+        test records saved before the blob store.
+        """
+        return self.session.query(TestRecord.test_name, TestRecord.test_type, TestRecord.test_data_uri, 
+                                  TestRecord.test_data_chunks, TestRecord.test_data)\
+            .filter(TestRecord.cell_name == cell_name.upper()).order_by(TestRecord.start_time, TestRecord.test_name).all()
+
+    def find_unreferenced_uris(self, uris: list[str]):
+        """Get the blob URIs that no test record references as its test data or one of its chunks, i.e. to delete their blobs."""
+        uris = set(uris)
+        if not uris:
+            return []
+        # Chunks are JSON, so they are matched as text, content hashes do not occur in other URIs
+        chunks = cast(TestRecord.test_data_chunks, String)
+        rows = self.session.query(TestRecord.test_data_uri, TestRecord.test_data_chunks)\
+            .filter(or_(TestRecord.test_data_uri.in_(uris), *[chunks.contains(uri) for uri in uris])).all()
+        referenced = {uri for test_data_uri, test_data_chunks in rows 
+                      for uri in [test_data_uri] + [chunk['uri'] for chunk in test_data_chunks or []]}
+        return sorted(uris - referenced)
+
+    def upsert(self, rows: list[dict]):
+        """
+        Insert test records, or update the existing test records with the same name and type.
+        A start time of None keeps the stored start time, i.e. when chunks are appended to the test data.
+        """
+        if not rows:
+            return
+        statement = self.insert(TestRecord)
+        keys = ['test_name', 'test_type']
+        set_ = {column: statement.excluded[column] for column in rows[0] if column not in keys}
+        if 'start_time' in set_:
+            set_['start_time'] = func.coalesce(statement.excluded.start_time, TestRecord.start_time)
+        statement = statement.on_conflict_do_update(index_elements=keys, set_=set_)
+        self.session.execute(statement, rows)
+
+    def query(self, load_data: bool = False):
+        """Query test records, loading the blobs eagerly if load_data is set."""
+        query = self.session.query(TestRecord)
+        if load_data:
+            # Load the blobs in the same query instead of one query per test record
+            query = query.options(undefer_group(Const.BLOB_GROUP))
+        return query
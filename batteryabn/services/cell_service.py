@@ -3,14 +3,16 @@ from batteryabn import logger, Constants as Const
 from batteryabn.models import Cell, Project
 from batteryabn.repositories import CellRepository, TestRecordRepository, ProjectRepository, FileSystemRepository
 from batteryabn.repositories import create_cell_repository, create_test_record_repository, create_project_repository, create_filesystem_repository
-from batteryabn.utils import Processor, Viewer, Utils
+from batteryabn.repositories import create_test_data_repository
+from batteryabn.utils import Processor, Viewer, Utils, BlobStore, timed, create_blob_store
 
 def create_cell_service(session=None):
     cell_repository = create_cell_repository(session)
     test_record_repository = create_test_record_repository(session)
     project_repository = create_project_repository(session)
     filesystem_repository = create_filesystem_repository()
-    return CellService(cell_repository, test_record_repository, project_repository, filesystem_repository)
+    blob_store = create_blob_store()
+    return CellService(cell_repository, test_record_repository, project_repository, filesystem_repository, blob_store)
 
 class CellService:
     """
@@ -18,11 +20,13 @@ class CellService:
     """
     @inject
     def __init__(self, cell_repository: CellRepository, test_record_repository: TestRecordRepository, 
-                 project_repository: ProjectRepository, filesystem_repository: FileSystemRepository):
+                 project_repository: ProjectRepository, filesystem_repository: FileSystemRepository, blob_store: BlobStore = None):
         self.cell_repository = cell_repository
         self.test_record_repository = test_record_repository
         self.project_repository = project_repository
         self.filesystem_repository = filesystem_repository
+        self.blob_store = blob_store if blob_store is not None else create_blob_store()
+        self.test_data_repository = create_test_data_repository(self.blob_store)
 
 
     def create_cell(self, cell_name: str):
@@ -71,52 +75,63 @@ class CellService:
         test_type : str, optional
             The type of test to process, by default None
         """
-        cell = self.find_cell_by_name(cell_name)
-        project = cell.project
+        with timed('process_cell', cell_name=cell_name):
+            cell = self.find_cell_by_name(cell_name)
+            project = cell.project
 
-        if not cell:
-            logger.error(f'Cell not found: {cell_name}')
-            return
+            if not cell:
+                logger.error(f'Cell not found: {cell_name}')
+                return
         
-        cycler_trs, vdf_trs = self.get_cycler_vdf_trs(cell, test_type)        
-        # Process cell data
-        processor.process(cycler_trs, vdf_trs, cell.project)
-        if processor.cell_data.empty:
-            logger.error(f'No data found for cell: {cell_name}')
-            return
-        # Genrate images for processed data
-        img_cell, img_ccm, img_ccm_aht, img_cell_html, img_ccm_html, img_ccm_aht_html = viewer.plot(processor.cell_data, processor.cell_cycle_metrics, processor.cell_data_vdf, cell_name)
-
-        # # Update cell data
-        # cell.cell_data = Utils.gzip_pikle_dump(processor.cell_data)
-        # cell.cell_cycle_metrics = Utils.gzip_pikle_dump(processor.cell_cycle_metrics)
-        # cell.cell_data_vdf = Utils.gzip_pikle_dump(processor.cell_data_vdf)
-
-        # cell.image_cell = Utils.image_to_binary(img_cell)
-        # cell.image_ccm = Utils.image_to_binary(img_ccm)
-        # cell.image_ccm_aht = Utils.image_to_binary(img_ccm_aht)
-
-        # Save cell data
-        # try:
-        #     self.cell_repository.commit()
-        #     logger.info(f'Processed and saved data for cell: {cell_name}')
-        # except Exception as e:
-        #     self.cell_repository.rollback()
-        #     logger.error(f'Failed to save processed data for cell: {cell_name}. Error: {e}')
-        #     raise e
+            with timed('get_cycler_vdf_trs'):
+                cycler_trs, vdf_trs = self.get_cycler_vdf_trs(cell, test_type)        
+            # Process cell data
+            with timed('process'):
+                processed = processor.process(cycler_trs, vdf_trs, cell.project, self.test_data_repository.load)
+            # Nothing is saved if processing stopped early, so the data of the last processing is kept as it is
+            if not processed or processor.cell_data.empty:
+                logger.error(f'No data found for cell: {cell_name}')
+                return
+            # Genrate images for processed data
+            with timed('plot'):
+                img_cell, img_ccm, img_ccm_aht, img_cell_html, img_ccm_html, img_ccm_aht_html = viewer.plot(processor.cell_data, processor.cell_cycle_metrics, processor.cell_data_vdf, cell_name)
+
+            # # Update cell data
+            # cell.cell_data = Utils.gzip_pikle_dump(processor.cell_data)
+            # cell.cell_cycle_metrics = Utils.gzip_pikle_dump(processor.cell_cycle_metrics)
+            # cell.cell_data_vdf = Utils.gzip_pikle_dump(processor.cell_data_vdf)
+
+            # cell.image_cell = Utils.image_to_binary(img_cell)
+            # cell.image_ccm = Utils.image_to_binary(img_ccm)
+            # cell.image_ccm_aht = Utils.image_to_binary(img_ccm_aht)
+
+            # Save cell data
+            # try:
+            #     self.cell_repository.commit()
+            #     logger.info(f'Processed and saved data for cell: {cell_name}')
+            # except Exception as e:
+            #     self.cell_repository.rollback()
+            #     logger.error(f'Failed to save processed data for cell: {cell_name}. Error: {e}')
+            #     raise e
         
-        # Save data to local file
-        self.filesystem_repository.save_df_to_csv(project.project_name, cell.cell_name, 'cell_cycle_metrics', processor.cell_cycle_metrics)
-        self.filesystem_repository.save_to_local_pklgz(project.project_name, cell.cell_name, 'cell_data', processor.cell_data)
-        self.filesystem_repository.save_to_local_pklgz(project.project_name, cell.cell_name, 'cell_cycle_metrics', processor.cell_cycle_metrics)
-        self.filesystem_repository.save_to_local_pklgz(project.project_name, cell.cell_name, 'cell_data_vdf', processor.cell_data_vdf)
-        self.filesystem_repository.save_to_local_pklgz(project.project_name, cell.cell_name, 'cell_data_rpt', processor.cell_data_rpt)
-        self.filesystem_repository.save_plt_to_png(project.project_name, cell.cell_name, 'cell', img_cell)
-        self.filesystem_repository.save_plt_to_png(project.project_name, cell.cell_name, 'ccm', img_ccm)
-        self.filesystem_repository.save_plt_to_png(project.project_name, cell.cell_name, 'ccm_aht', img_ccm_aht)    
-        self.filesystem_repository.save_html(project.project_name, cell.cell_name, 'cell', img_cell_html)
-        self.filesystem_repository.save_html(project.project_name, cell.cell_name, 'ccm', img_ccm_html)
-        self.filesystem_repository.save_html(project.project_name, cell.cell_name, 'ccm_aht', img_ccm_aht_html)
+            # Save data to local file
+            with timed('save'):
+                self.filesystem_repository.save_df_to_csv(project.project_name, cell.cell_name, 'cell_cycle_metrics', processor.cell_cycle_metrics)
+                self.filesystem_repository.save_to_local_pklgz(project.project_name, cell.cell_name, 'cell_data', processor.cell_data)
+                self.filesystem_repository.save_to_local_pklgz(project.project_name, cell.cell_name, 'cell_cycle_metrics', processor.cell_cycle_metrics)
+                self.filesystem_repository.save_to_local_pklgz(project.project_name, cell.cell_name, 'cell_data_vdf', processor.cell_data_vdf)
+                self.filesystem_repository.save_to_local_pklgz(project.project_name, cell.cell_name, 'cell_data_rpt', processor.cell_data_rpt)
+                self.filesystem_repository.save_pyramid(project.project_name, cell.cell_name, 'cell_data', processor.cell_data_pyramid)
+                self.filesystem_repository.save_pyramid(project.project_name, cell.cell_name, 'cell_data_vdf', processor.cell_data_vdf_pyramid)
+                self.filesystem_repository.save_to_local_pklgz(project.project_name, cell.cell_name, 'cell_summary', 
+                                                               self.summarize_cell_info(processor.cell_data_rpt, processor.cell_cycle_metrics))
+                self.filesystem_repository.save_plt_to_png(project.project_name, cell.cell_name, 'cell', img_cell)
+                self.filesystem_repository.save_plt_to_png(project.project_name, cell.cell_name, 'ccm', img_ccm)
+                self.filesystem_repository.save_plt_to_png(project.project_name, cell.cell_name, 'ccm_aht', img_ccm_aht)    
+                self.filesystem_repository.save_html(project.project_name, cell.cell_name, 'cell', img_cell_html)
+                self.filesystem_repository.save_html(project.project_name, cell.cell_name, 'ccm', img_ccm_html)
+                self.filesystem_repository.save_html(project.project_name, cell.cell_name, 'ccm_aht', img_ccm_aht_html)
+                self.filesystem_repository.save_processed_version(project.project_name, cell.cell_name)
 
     def process_cells_for_project(self, project_name: str, processor: Processor, viewer: Viewer):
         """
@@ -227,6 +242,95 @@ class CellService:
             return None
         return cell_data
 
+    def get_data_tiles(self, cell_name: str, data_name: str, start: int = None, end: int = None, level: int = None):
+        """
+        Get the summarized data of a cell in a time range from the data pyramid.
+        If no level is given, the finest level that fits in Const.PYRAMID_MAX_POINTS buckets is used.
+
+        Parameters
+        ----------
+        cell_name : str
+            The unique name of the cell.
+        data_name : str
+            The name of the summarized data, 'cell_data' or 'cell_data_vdf'
+        start : int, optional
+            Start of the time range as Unix timestamp in seconds, by default the start of the data
+        end : int, optional
+            End of the time range as Unix timestamp in seconds, by default the end of the data
+        level : int, optional
+            The pyramid level, 0 is the coarsest, by default None
+
+        Returns
+        -------
+        dict
+            The level, the bucket width in seconds, whether the result was truncated and the bucket records
+        """
+        cell = self.find_cell_by_name(cell_name)
+        if not cell:
+            logger.error(f'Cell not found: {cell_name}')
+            return None
+
+        project = cell.project
+        try:
+            if level is None:
+                level = self.choose_pyramid_level(project.project_name, cell.cell_name, data_name, start, end)
+            tile = self.filesystem_repository.load_pyramid_level(project.project_name, cell.cell_name, data_name, level)
+        except Exception as e:
+            logger.error(f'Failed to load {data_name} pyramid for cell: {cell_name}. Error: {e}')
+            return None
+
+        # Bucket starts are in milliseconds, keep the bucket that contains the start
+        bucket_ms = Const.PYRAMID_BUCKETS[level] * 1000
+        lo = 0 if start is None else tile.index.searchsorted(start * 1000 // bucket_ms * bucket_ms, side='left')
+        hi = len(tile) if end is None else tile.index.searchsorted(end * 1000, side='right')
+        truncated = hi - lo > Const.PYRAMID_MAX_POINTS
+        if truncated:
+            hi = lo + Const.PYRAMID_MAX_POINTS
+            logger.info(f'Truncated {data_name} tiles for cell: {cell_name} to {Const.PYRAMID_MAX_POINTS} buckets')
+
+        tile = tile.iloc[lo:hi].reset_index()
+        tile = tile.astype(object).where(tile.notna(), None)
+        return {
+            'level': level,
+            'bucket_seconds': Const.PYRAMID_BUCKETS[level],
+            'truncated': bool(truncated),
+            'data': tile.to_dict(orient='records'),
+        }
+
+    def choose_pyramid_level(self, project_name: str, cell_name: str, data_name: str, start: int = None, end: int = None):
+        """
+        Choose the finest pyramid level whose number of buckets in the time range fits in a response.
+
+        Parameters
+        ----------
+        project_name : str
+            The name of the project
+        cell_name : str
+            The unique name of the cell.
+        data_name : str
+            The name of the summarized data
+        start : int, optional
+            Start of the time range as Unix timestamp in seconds
+        end : int, optional
+            End of the time range as Unix timestamp in seconds
+
+        Returns
+        -------
+        int
+            The pyramid level
+        """
+        if start is None or end is None:
+            # The coarsest level is small, use it to find the extent of the data
+            coarsest = self.filesystem_repository.load_pyramid_level(project_name, cell_name, data_name, 0)
+            if coarsest.empty:
+                return 0
+            start = coarsest.index[0] // 1000 if start is None else start
+            end = coarsest.index[-1] // 1000 + Const.PYRAMID_BUCKETS[0] if end is None else end
+
+        span = max(end - start, 0)
+        levels = [level for level, bucket in enumerate(Const.PYRAMID_BUCKETS) if span / bucket <= Const.PYRAMID_MAX_POINTS]
+        return max(levels, default=0)
+
     def load_cell_images(self, cell_name: str):
         """
         Load cell images from the database.
@@ -334,7 +438,7 @@ class CellService:
         dict
             Vdf test records
         """
-        trs = self.test_record_repository.find_by_cell_name(cell.cell_name)
+        trs = self.test_record_repository.find_by_cell_name(cell.cell_name, load_data=True)
         cycler_trs, vdf_trs = {}, {}
         for tr in trs:
             if tr.last_update_time is None:
@@ -398,7 +502,8 @@ class CellService:
     
     def delete_cell(self, cell_name: str):
         """
-        This method deletes a Cell and all associated TestRecords from the database.
+        This method deletes a Cell and all associated TestRecords from the database, 
+        and the blobs of their test data no other test record references.
 
         Parameters
         ----------
@@ -413,9 +518,12 @@ class CellService:
 
         # Delete associated test records
         trs = self.test_record_repository.find_by_cell_name(cell_name)
+        uris = [uri for tr in trs for uri in tr.get_blob_uris()]
         for tr in trs:
             self.test_record_repository.delete(tr)
         self.test_record_repository.commit()
+        if uris:
+            self.blob_store.delete_many(self.test_record_repository.find_unreferenced_uris(uris))
         logger.info(f'Deleted test records for cell: {cell_name}')
         
         self.cell_repository.delete(cell)
@@ -445,6 +553,27 @@ class CellService:
         project = cell.project
         return self.filesystem_repository.get_cell_imgs_paths(project.project_name, cell_name)
     
+    def get_processed_version(self, cell_name: str):
+        """
+        Get the version of the processed data of a cell, used to validate cached responses.
+
+        Parameters
+        ----------
+        cell_name : str
+            The name of the cell
+
+        Returns
+        -------
+        str
+            The version of the processed data, None if the cell is not found or not processed
+        datetime
+            The time the processed data was saved, None if the cell is not found or not processed
+        """
+        cell = self.find_cell_by_name(cell_name)
+        if not cell or not cell.project:
+            return None, None
+        return self.filesystem_repository.get_processed_version(cell.project.project_name, cell.cell_name)
+
     def get_cell_htmls_paths(self, cell_name:str):
         """
         Get paths to cell images for a cell.
@@ -507,17 +636,85 @@ class CellService:
         cell_data_rpt = self.get_data(cell_name, 'cell_data_rpt')
         if cell_data_rpt is None:
             return None
+        ccm = self.get_data(cell_name, 'cell_cycle_metrics')
+        return self.summarize_cell_info(cell_data_rpt, ccm)
+
+    def summarize_cell_info(self, cell_data_rpt, ccm):
+        """
+        Summarize the latest report and cycle metrics of processed cell data.
+
+        Parameters
+        ----------
+        cell_data_rpt : pd.DataFrame
+            The processed report data
+        ccm : pd.DataFrame
+            The processed cell cycle metrics, could be None
+
+        Returns
+        -------
+        dict
+            The latest report info, None if there is no report data
+        """
+        if cell_data_rpt is None or cell_data_rpt.empty:
+            return None
         # Get the last row of the data
         rpt_last_row = cell_data_rpt.iloc[-1]
         tr_name = rpt_last_row[Const.TEST_NAME]
         data_last_row = rpt_last_row[Const.DATA].iloc[-1]
 
-        ccm = self.get_data(cell_name, 'cell_cycle_metrics')
-        if ccm is None:
+        if ccm is None or ccm.empty:
             return {"latest_test_name": tr_name, "timestamp": data_last_row[Const.TIMESTAMP], "capacity": data_last_row[Const.AHT]}
         
         # Get the last row of the cell cycle metrics
         ccm_last_row = ccm.iloc[-1]
 
         return {"latest_test_name": tr_name, "timestamp": data_last_row[Const.TIMESTAMP], "capacity": data_last_row[Const.AHT],
-                "protocol": ccm_last_row[Const.PROTOCOL], "cycle_type": ccm_last_row[Const.CYCLE_TYPE]}
\ No newline at end of file
+                "protocol": ccm_last_row[Const.PROTOCOL], "cycle_type": ccm_last_row[Const.CYCLE_TYPE]}
+
+    def get_project_summary(self, project_name: str):
+        """
+        Get the latest test and cycle metric summaries of every cell in a project.
+        Test record statistics are aggregated by the database in a single query, 
+        and cycle metric summaries are read from the small summaries saved when each cell is processed.
+
+        Parameters
+        ----------
+        project_name : str
+            The name of the project
+
+        Returns
+        -------
+        List[dict]
+            The summary of each cell in the project, None if the project has no cells
+        """
+        rows = self.cell_repository.summarize_by_project(project_name)
+        if not rows:
+            return None
+
+        summaries = []
+        for row in rows:
+            summary = dict(row._mapping)
+            summary['info'] = self.load_cell_summary(project_name.upper(), row.cell_name)
+            summaries.append(summary)
+        return summaries
+
+    def load_cell_summary(self, project_name: str, cell_name: str):
+        """
+        Load the summary saved when a cell was processed.
+
+        Parameters
+        ----------
+        project_name : str
+            The name of the project
+        cell_name : str
+            The name of the cell
+
+        Returns
+        -------
+        dict
+            The latest report info, None if the cell has not been processed
+        """
+        try:
+            return self.filesystem_repository.load_from_local_pklgz(project_name, cell_name, 'cell_summary')
+        except FileNotFoundError:
+            return None
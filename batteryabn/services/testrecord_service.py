@@ -1,26 +1,30 @@
 from flask_injector import inject
 from batteryabn import logger, Constants as Const
 from batteryabn.models import TestRecord, Cell, Project
-from batteryabn.utils import Parser, Formatter, Utils
+from batteryabn.utils import Parser, Formatter, Utils, BlobStore, Progress, timed, create_blob_store
 from batteryabn.repositories import CellRepository, TestRecordRepository, ProjectRepository
-from batteryabn.repositories import create_cell_repository, create_test_record_repository, create_project_repository
+from batteryabn.repositories import create_cell_repository, create_test_record_repository, create_project_repository, create_test_data_repository
 
 
 def create_test_record_service(session=None):
     cell_repository = create_cell_repository(session)
     test_record_repository = create_test_record_repository(session)
     project_repository = create_project_repository(session)
-    return TestRecordService(cell_repository, test_record_repository, project_repository)
+    blob_store = create_blob_store()
+    return TestRecordService(cell_repository, test_record_repository, project_repository, blob_store)
 
 class TestRecordService:
     """
     The TestRecordService class provides an interface for saving TestRecord objects.
     """
     @inject
-    def __init__(self, cell_repository: CellRepository, test_record_repository: TestRecordRepository, project_repository: ProjectRepository):
+    def __init__(self, cell_repository: CellRepository, test_record_repository: TestRecordRepository, project_repository: ProjectRepository,
+                 blob_store: BlobStore = None):
         self.cell_repository = cell_repository
         self.test_record_repository = test_record_repository
         self.project_repository = project_repository
+        self.blob_store = blob_store if blob_store is not None else create_blob_store()
+        self.test_data_repository = create_test_data_repository(self.blob_store)
 
     def create_and_save_tr(self, path: str, parser: Parser, formatter: Formatter, reset: bool = False):
         """
@@ -39,25 +43,38 @@ class TestRecordService:
             If True, the test record will be created even if it already exists, by default False
         """
         logger.info(f'Creating new test record from file: {path}')
-        parser.parse(path)
-
-        test_name = parser.test_name
-        test_type = parser.test_type
+        test_name, test_type, test_size = parser.identify(path)
         test_record = self.test_record_repository.find_by_name(test_name, test_type)
 
         # Check if the test record exists and size is up-to-date
         if not reset and test_record:
             size_is_valid = (
                 test_record.size is not None and
-                parser.test_size is not None and
-                test_record.size >= parser.test_size
+                test_size is not None and
+                test_record.size >= test_size
             )
             if size_is_valid:
                 logger.info(f'Test record already exists and size is up-to-date: {test_name}')
                 return
 
+        # Only parse and format the new rows of a growing test file stored in chunks
+        tail = None
+        if not reset and test_record and test_type in Const.APPENDABLE_TEST_TYPES:
+            tail = test_record.get_tail()
+        parser.parse(path, offset=tail.get('offset') if tail else None)
+
         # Process the data (formatter needs to run before checking time)
-        formatter.format_data(parser.raw_test_data, parser.raw_metadata, parser.test_type)
+        formatter.format_data(parser.raw_test_data, parser.raw_metadata, parser.test_type, after=tail)
+        if tail is not None and formatter.test_data.empty:
+            logger.info(f'No new rows in test file: {test_name}')
+            test_record.size = parser.test_size
+            try:
+                self.test_record_repository.commit()
+            except Exception as e:
+                self.test_record_repository.rollback()
+                logger.error(f'Failed to save test record: {test_name}. Error: {e}')
+                raise e
+            return
 
         # Check if the test record's last update time is up-to-date
         if not reset and test_record:
@@ -82,11 +99,20 @@ class TestRecordService:
             test_record = TestRecord(test_name=test_name, test_type=test_type)
             self.test_record_repository.add(test_record)
 
+        # Blobs of the stored test data that the new test data replaces instead of appending to
+        stored_uris = test_record.get_blob_uris() if not tail else []
+
         # Load data from parser and formatter
         test_record.size = parser.test_size
         test_record.cell_name = formatter.cell_name
-        test_record.test_data = Utils.gzip_pikle_dump(formatter.test_data)
+        test_record.test_data_chunks = self.save_test_data_chunk(formatter, test_record.test_data_chunks if tail else None, 
+                                                                 parser.data_end_offset)
+        test_record.test_data_uri = test_record.test_data_chunks[0]['uri']
+        test_record.test_data = None
         test_record.test_metadata = Utils.gzip_pikle_dump(formatter.metadata)
+        # Appended chunks start later than the test, so the start time of the first chunk is kept
+        if not tail or test_record.start_time is None:
+            test_record.start_time = formatter.start_time
         test_record.last_update_time = formatter.last_update_time
         test_record.cell = cell
         logger.info(f'Saving test record: {test_name}')
@@ -109,9 +135,11 @@ class TestRecordService:
             self.test_record_repository.rollback()
             logger.error(f'Failed to save test record: {test_name}. Error: {e}')
             raise e
+        self.delete_blobs(stored_uris)
 
     def create_and_save_trs(self, path: str, key_word: str, parser: Parser, formatter: Formatter, 
-                            file_extensions: list[str] = Const.FILE_TYPE_2_TEST_TYPE.keys(), reset: bool = False):
+                            file_extensions: list[str] = Const.FILE_TYPE_2_TEST_TYPE.keys(), reset: bool = False,
+                            batch_size: int = Const.INGEST_BATCH_SIZE):
         """
         Create and save TestRecords from a list of files.
 
@@ -129,16 +157,228 @@ class TestRecordService:
             List of file extensions to search for, by default ['.xlsx', '.csv', '.mpr']
         reset : bool, optional
             If True, the test record will be created even if it already exists, by default False        
+        batch_size : int, optional
+            Number of test records saved in one transaction, by default Const.INGEST_BATCH_SIZE
+
+        Returns
+        -------
+        int
+            The number of test records whose test data changed
+        """
+
+        with timed('create_and_save_trs', key_word=key_word):
+            files = Utils.search_files(path, key_word, file_extensions)
+            saved = self.save_trs_in_batches(files, parser, formatter, reset, batch_size)
+        logger.info(f'Finished creating and saving test records from files in {path}')
+        return saved
+
+    def save_trs_in_batches(self, files: list[str], parser: Parser, formatter: Formatter, reset: bool = False, 
+                            batch_size: int = Const.INGEST_BATCH_SIZE):
+        """
+        Create or update TestRecords from files in batches.
+        The existing test records of all files are fetched in a single query, so up-to-date files are skipped
+        without being parsed. Each batch is written with INSERT ... ON CONFLICT and committed once.
+
+        Parameters
+        ----------
+        files : list[str]
+            Paths to battery test data files
+        parser : Parser
+            Parser object to parse test data
+        formatter : Formatter
+            Formatter object to format test data
+        reset : bool, optional
+            If True, the test records will be saved even if they already exist, by default False
+        batch_size : int, optional
+            Number of test records saved in one transaction, by default Const.INGEST_BATCH_SIZE
+
+        Returns
+        -------
+        int
+            The number of test records whose test data changed
+        """
+        identities = {}
+        for file in files:
+            try:
+                identities[file] = parser.identify(file)
+            except Exception as e:
+                logger.error(f'Failed to create and save test record from file: {file}. Error: {e}')
+
+        # The stored chunks are also needed on reset, to delete the blobs the new test data replaces
+        versions = {}
+        if identities:
+            test_names = list({test_name for test_name, _, _ in identities.values()})
+            for test_name, test_type, size, last_update_time, chunks in self.test_record_repository.find_versions_by_names(test_names):
+                versions[(test_name, test_type)] = (size, last_update_time, chunks)
+
+        # Check if the test record exists and size is up-to-date
+        pending_files = []
+        for file, (test_name, test_type, test_size) in identities.items():
+            size, _, _ = versions.get((test_name, test_type), (None, None, None))
+            if not reset and size is not None and test_size is not None and size >= test_size:
+                logger.info(f'Test record already exists and size is up-to-date: {test_name}')
+                continue
+            pending_files.append(file)
+
+        progress = Progress('ingest', total=len(files))
+        progress.update(len(files) - len(pending_files), saved=0)
+        saved = 0
+        for i in range(0, len(pending_files), batch_size):
+            saved += self.save_tr_batch(pending_files[i:i + batch_size], parser, formatter, versions, progress, reset)
+            progress.update(progress.done, saved=saved)
+        logger.info(f'Saved {saved} changed test records of {len(files)} files')
+        return saved
+
+    def save_tr_batch(self, files: list[str], parser: Parser, formatter: Formatter, versions: dict, progress: Progress = None,
+                      reset: bool = False):
         """
+        Parse and format a batch of files, then upsert their TestRecords, Cells and Projects in one transaction.
+        A growing file without new rows only updates the size of its test record, and is not counted as changed.
+        Blobs of stored test data replaced by the new test data are deleted once no test record references them.
+
+        Parameters
+        ----------
+        files : list[str]
+            Paths to battery test data files
+        parser : Parser
+            Parser object to parse test data
+        formatter : Formatter
+            Formatter object to format test data
+        versions : dict
+            The size, last update time and chunks of the existing test records, keyed by test name and test type
+        progress : Progress, optional
+            Progress of the ingest, advanced by each file of the batch
+        reset : bool, optional
+            If True, the stored test data is replaced even if it is up-to-date, by default False
 
-        files = Utils.search_files(path, key_word, file_extensions)
+        Returns
+        -------
+        int
+            The number of test records whose test data changed
+        """
+        test_records, cells, projects, changed = {}, {}, set(), set()
+        superseded_uris = []
         for file in files:
+            if progress:
+                progress.advance()
             try:
-                self.create_and_save_tr(file, parser, formatter, reset)
+                test_name, test_type, _ = parser.identify(file)
+                _, last_update_time, chunks = versions.get((test_name, test_type), (None, None, None))
+                stored_uris = [chunk['uri'] for chunk in chunks or []]
+                if reset:
+                    last_update_time, chunks = None, None
+                # Only parse and format the new rows of a growing test file stored in chunks
+                tail = chunks[-1] if chunks and test_type in Const.APPENDABLE_TEST_TYPES else None
+                with timed('parse', test_type=test_type):
+                    parser.parse(file, offset=tail.get('offset') if tail else None)
+                with timed('format', test_type=test_type):
+                    formatter.format_data(parser.raw_test_data, parser.raw_metadata, parser.test_type, after=tail)
             except Exception as e:
                 logger.error(f'Failed to create and save test record from file: {file}. Error: {e}')
                 continue
-        logger.info(f'Finished creating and saving test records from files in {path}')
+
+            # Appended chunks start later than the test, the stored start time is kept by the upsert
+            start_time = formatter.start_time if tail is None else None
+            if tail is not None and formatter.test_data.empty:
+                # Keep the stored chunks, only the size of the file changed
+                logger.info(f'No new rows in test file: {test_name}')
+            elif last_update_time is not None and formatter.last_update_time is not None and last_update_time >= formatter.last_update_time:
+                # Check if the test record's last update time is up-to-date
+                logger.info(f'Test record already exists and is up-to-date: {test_name}')
+                continue
+            else:
+                with timed('save_test_data', test_type=test_type):
+                    chunks = self.save_test_data_chunk(formatter, chunks if tail else None, parser.data_end_offset)
+                last_update_time = formatter.last_update_time
+                changed.add((test_name, test_type))
+                superseded_uris += [uri for uri in stored_uris if uri not in {chunk['uri'] for chunk in chunks}]
+
+            project_name = formatter.metadata.get('Project Name')
+            if project_name:
+                projects.add(project_name)
+            cells[formatter.cell_name] = project_name or cells.get(formatter.cell_name)
+            test_records[(test_name, test_type)] = {
+                'test_name': test_name,
+                'test_type': test_type,
+                'cell_name': formatter.cell_name,
+                'size': parser.test_size,
+                'test_data_uri': chunks[0]['uri'],
+                'test_data_chunks': chunks,
+                'test_data': None,
+                'test_metadata': Utils.gzip_pikle_dump(formatter.metadata),
+                'start_time': start_time,
+                'last_update_time': last_update_time,
+            }
+
+        if not test_records:
+            return 0
+        try:
+            # Projects and cells first, test records reference them by name
+            with timed('upsert'):
+                self.project_repository.upsert(sorted(projects))
+                self.cell_repository.upsert([{'cell_name': cell_name, 'project_name': project_name} for cell_name, project_name in cells.items()])
+                self.test_record_repository.upsert(list(test_records.values()))
+                self.test_record_repository.commit()
+            logger.info(f'Saved {len(test_records)} test records to database, {len(changed)} with changed test data')
+        except Exception as e:
+            self.test_record_repository.rollback()
+            logger.error(f'Failed to save test records: {[name for name, _ in test_records]}. Error: {e}')
+            return 0
+        self.delete_blobs(superseded_uris)
+        return len(changed)
+
+    def save_test_data(self, test_data):
+        """
+        Stream test data into the blob store.
+
+        Parameters
+        ----------
+        test_data : pd.DataFrame
+            The formatted test data
+
+        Returns
+        -------
+        str
+            The URI of the test data in the blob store
+        """
+        return self.blob_store.write(lambda file: Utils.gzip_pickle_dump_to(test_data, file))
+
+    def save_test_data_chunk(self, formatter: Formatter, chunks: list[dict] = None, offset: int = None):
+        """
+        Save the formatted test data as a chunk in the blob store, with the tail needed to append the next chunk.
+
+        Parameters
+        ----------
+        formatter : Formatter
+            Formatter object with the formatted test data
+        chunks : list[dict], optional
+            The stored chunks to append to, by default the chunk replaces all stored chunks
+        offset : int, optional
+            Byte offset in the test file after the rows of the chunk, to parse only the rows after it next time
+
+        Returns
+        -------
+        list[dict]
+            The chunks of the test data
+        """
+        chunk = {'uri': self.save_test_data(formatter.test_data), 'rows': len(formatter.test_data)}
+        chunk.update(formatter.get_tail() or {})
+        if offset is not None:
+            chunk['offset'] = offset
+        return (chunks or []) + [chunk]
+
+    def delete_blobs(self, uris: list[str]):
+        """
+        Delete the blobs of deleted or replaced test data, unless other test records still reference them.
+        Blobs are content addressed, so test records with the same content share a blob.
+
+        Parameters
+        ----------
+        uris : list[str]
+            The URIs of the blobs
+        """
+        if uris:
+            self.blob_store.delete_many(self.test_record_repository.find_unreferenced_uris(uris))
 
     def find_test_record_by_name(self, test_name: str, test_type: str):
         """
@@ -157,7 +397,44 @@ class TestRecordService:
             The TestRecord object with the specified name
         """
         return self.test_record_repository.find_by_name(test_name, test_type)
-    
+
+    def get_test_data(self, test_record: TestRecord, columns: list[str] = None, start: int = None, stop: int = None):
+        """
+        This method gets the test data of a TestRecord, limited to the selected columns and rows.
+
+        Parameters
+        ----------
+        test_record : TestRecord
+            The test record to get the data from
+        columns : list[str], optional
+            The columns to select, by default all columns
+        start : int, optional
+            The first row to select, by default the first row
+        stop : int, optional
+            The row to stop before, by default the last row
+
+        Returns
+        -------
+        pd.DataFrame
+            The selected test data, None if the test record has no data
+
+        Raises
+        ------
+        ValueError
+            If a selected column does not exist in the test data
+        """
+        if not test_record.has_test_data():
+            logger.info(f'Test data not found: {test_record.test_name}')
+            return None
+
+        data = self.test_data_repository.load(test_record)
+        if columns:
+            missing_columns = [column for column in columns if column not in data.columns]
+            if missing_columns:
+                raise ValueError(f'Columns not found in test data: {missing_columns}')
+            data = data[columns]
+        return data.iloc[start:stop]
+
     def find_test_records_by_cell_name(self, cell_name: str):
         """
         This method finds all TestRecords associated with a Cell.
@@ -173,6 +450,28 @@ class TestRecordService:
             A list of TestRecord objects associated with the specified cell
         """
         return self.test_record_repository.find_by_cell_name(cell_name)
+
+    def iter_test_data_by_cell_name(self, cell_name: str):
+        """
+        This method reads the test data of all TestRecords of a Cell in bulk.
+        The test data columns are queried at once without loading TestRecord objects, 
+        and the test data is streamed from the blob store one test record at a time.
+
+        Parameters
+        ----------
+        cell_name : str
+            The name of the cell
+
+        Yields
+        ------
+        tuple[str, str, pd.DataFrame]
+            The name, type and test data of each test record with test data
+        """
+        for row in self.test_record_repository.find_test_data_by_cell_name(cell_name):
+            if row.test_data_uri is None and row.test_data is None:
+                logger.info(f'Test data not found: {row.test_name}')
+                continue
+            yield row.test_name, row.test_type, self.test_data_repository.load(row)
     
     def find_test_records_by_keyword(self, keyword: str):
         """
@@ -193,7 +492,7 @@ class TestRecordService:
 
     def delete_test_record(self, test_name: str, test_type: str):
         """
-        This method deletes a TestRecord from the database.
+        This method deletes a TestRecord from the database, and the blobs of its test data no other test record references.
 
         Parameters
         ----------
@@ -204,15 +503,17 @@ class TestRecordService:
         """
         test_record = self.test_record_repository.find_by_name(test_name, test_type)
         if test_record:
+            uris = test_record.get_blob_uris()
             self.test_record_repository.delete(test_record)
             self.test_record_repository.commit()
+            self.delete_blobs(uris)
             logger.info(f'Deleted test record: {test_name}')
         else:
             logger.info(f'Test record not found: {test_name}')
 
     def delete_test_records_by_cell_name(self, cell_name: str):
         """
-        This method deletes all TestRecords associated with a Cell.
+        This method deletes all TestRecords associated with a Cell, and the blobs of their test data no other test record references.
 
         Parameters
         ----------
@@ -220,7 +521,9 @@ class TestRecordService:
             The name of the cell
         """
         test_records = self.test_record_repository.find_by_cell_name(cell_name)
+        uris = [uri for test_record in test_records for uri in test_record.get_blob_uris()]
         for test_record in test_records:
             self.test_record_repository.delete(test_record)
         self.test_record_repository.commit()
+        self.delete_blobs(uris)
         logger.info(f'Deleted test records associated with cell: {cell_name}')
\ No newline at end of file
@@ -1,9 +1,34 @@
+import os
+import json
+import time
+from collections import Counter
+from contextlib import contextmanager
 from flask import current_app
 from sqlalchemy.orm import sessionmaker
-from rq.job import Job
+from rq import Retry, get_current_job
+from rq.job import Job, JobStatus, Dependency
+from rq.exceptions import NoSuchJobError
+from . import logger, Constants as Const
 from .extensions import db, rq
 from .services import create_cell_service, create_test_record_service
-from .utils import create_processor, create_viewer, create_parser, create_formatter
+from .utils import create_processor, create_viewer, create_parser, create_formatter, timed
+from .utils.metrics import metrics, observe_task_duration, format_labels
+
+
+@contextmanager
+def track_task(task_name: str):
+    """
+    Observe the duration of a task in the metrics, then add the metrics of the job to Redis, 
+    as the worker runs each job in a process that exits when the job ends.
+    """
+    try:
+        with metrics.timer(observe_task_duration, task=task_name):
+            yield
+    finally:
+        try:
+            metrics.flush(rq.connection)
+        except Exception as e:
+            logger.warning(f'Failed to flush metrics of task {task_name}. Error: {e}')
 
 
 @rq.job(timeout=60 * 60)
@@ -11,7 +36,7 @@ def process_cell_task(cell_name: str):
     """
     Function called by the task queue to process a cell by its name.
     """
-    with current_app.app_context():
+    with current_app.app_context(), track_task('process_cell'), timed('process_cell_task', cell_name=cell_name):
         engine = db.get_engine()
         Session = sessionmaker(bind=engine)
         with Session() as session:
@@ -30,8 +55,11 @@ def process_cell_task(cell_name: str):
 def update_trs_task(data_directory: str, key_word: str, reset: bool):
     """
     Function called by the task queue to update test records for a cell by its name.
+    If processing the cell was requested in the meta of the job, see request_processing, 
+    the cell is processed after the update when the test data of any test records changed.
+    Returns the number of test records whose test data changed.
     """
-    with current_app.app_context():
+    with current_app.app_context(), track_task('update_trs'), timed('update_trs_task', cell_name=key_word):
         engine = db.get_engine()
         Session = sessionmaker(bind=engine)
         with Session() as session:
@@ -39,74 +67,430 @@ def update_trs_task(data_directory: str, key_word: str, reset: bool):
                 test_record_service = create_test_record_service(session=session)
                 parser = create_parser()
                 formatter = create_formatter()
-                test_record_service.create_and_save_trs(data_directory, key_word, parser, formatter, reset=reset)
+                saved = test_record_service.create_and_save_trs(data_directory, key_word, parser, formatter, reset=reset)
                 session.commit()
             except Exception as e:
                 session.rollback()
                 raise e
-    return
+        process_if_changed(key_word, saved)
+    return saved
+
+def process_if_changed(cell_name: str, saved: int):
+    """
+    Enqueue processing a cell at the end of the update job of its test records, 
+    if processing was requested and the test data of any test records changed.
+    The job id of the processing is added to the meta of the update job.
+    """
+    job = get_current_job()
+    if job is None:
+        return
+    # Requests coalesced into the job while it waited may have asked for processing
+    priority = job.get_meta().get('process')
+    if priority is None:
+        return
+    if not saved:
+        logger.info(f'No test records of {cell_name} changed, skip processing')
+        return
+    # The processing job depends on this update job, so it starts once the update ends
+    process_job = enqueue_unique(process_cell_task, 'process_cell', cell_name, cell_name, description=f"Process {cell_name}", 
+                                 after_tasks=UPDATE_TASK_NAMES, priority=priority)
+    job.meta['process_id'] = process_job.id
+    job.save_meta()
+
+# Task names of the updates of test records, which processing a cell waits for
+UPDATE_TASK_NAMES = ['update_trs', 'reset_trs']
+
+def get_queue_name(task_name: str, priority: str = 'interactive') -> str:
+    """
+    Get the queue of a task: its own queue if it is routed to one in Const.TASK_ROUTES, 
+    e.g. the eSOH heavy processing of cells, otherwise the queue of the priority.
+    """
+    if priority not in Const.TASK_PRIORITIES:
+        raise ValueError(f'Priority {priority} is not one of {Const.TASK_PRIORITIES}')
+    return Const.TASK_ROUTES.get(task_name, priority)
+
+def get_queues():
+    """
+    Get all task queues, in the order workers take jobs from them.
+    """
+    return [rq.get_queue(name) for name in Const.TASK_QUEUES]
+
+def get_job_ids(task_name: str, cell_name: str):
+    """
+    Get the job ids of a task for a cell: the id of the first job and of the follow-up job queued behind it.
+    """
+    job_id = f'{task_name}:{cell_name}'
+    return [job_id, f'{job_id}:rerun']
+
+def enqueue_unique(task, task_name: str, cell_name: str, *args, description: str = None, meta: dict = None, 
+                   retry: Retry = None, after_tasks: list[str] = None, priority: str = 'interactive') -> Job:
+    """
+    Enqueue a task for a cell, unless the same task is already waiting for the cell.
+    Requests are coalesced: a queued job serves all requests until it starts, 
+    and a running job gets at most one follow-up job, which starts after it ends.
+    A new job also starts after the jobs of after_tasks that are waiting or running for the cell.
+    An interactive request moves a job queued in another queue, e.g. by a project update, to its own queue.
+
+    Parameters
+    ----------
+    task : function
+        The task function decorated by rq.job
+    task_name : str
+        The name of the task in the job ids, e.g. 'process_cell'
+    cell_name : str
+        The name of the cell
+    *args
+        The arguments of the task
+    description : str, optional
+        Description of the job
+    meta : dict, optional
+        Meta data of the job
+    retry : rq.Retry, optional
+        Retries of the job if it fails
+    after_tasks : list[str], optional
+        The names of other tasks for the cell to run after, e.g. to process a cell after its test records are updated
+    priority : str, optional
+        The priority of the request, one of Const.TASK_PRIORITIES, by default 'interactive'
+
+    Returns
+    -------
+    rq.job.Job
+        The new job, or the waiting job the request was coalesced into
+    """
+    queue = rq.get_queue(get_queue_name(task_name, priority))
+    at_front = priority == 'interactive' and queue.name != priority
+    job_ids = get_job_ids(task_name, cell_name)
+    with queue.connection.lock(f'lock:{job_ids[0]}', timeout=Const.TASK_LOCK_TIMEOUT):
+        jobs = Job.fetch_many(job_ids, connection=queue.connection)
+        statuses = [job.get_status(refresh=False) if job else None for job in jobs]
+        # A job waiting for a failed job never runs, so a new request replaces it
+        for index, (job, status) in enumerate(zip(jobs, statuses)):
+            if status == JobStatus.DEFERRED and get_blocking_job_ids(job, queue.connection):
+                logger.info(f'Job {job.id} is blocked by a failed job, replaced by the new request')
+                job.delete()
+                jobs[index] = statuses[index] = None
+
+        waiting = [job for job, status in zip(jobs, statuses) if status in Const.TASK_WAITING_STATUSES]
+        if waiting:
+            job = waiting[0]
+            logger.info(f'Task {job_ids[0]} is already waiting, coalesced into job {job.id}')
+            # Only move the job if it is still in its queue, a worker may have just taken it
+            if (priority == 'interactive' and job.get_status(refresh=False) == JobStatus.QUEUED 
+                    and (job.origin != queue.name or at_front) and rq.get_queue(job.origin).remove(job)):
+                logger.info(f'Moved job {job.id} from queue {job.origin} to queue {queue.name}')
+                queue.enqueue_job(job, at_front=at_front)
+            return job
+
+        running = [job for job, status in zip(jobs, statuses) if status == JobStatus.STARTED]
+        free = [(job_id, job) for job_id, job, status in zip(job_ids, jobs, statuses) if status != JobStatus.STARTED]
+        if not free:
+            return running[0]
+        job_id, ended_job = free[0]
+        if ended_job:
+            ended_job.delete()
+
+        # Wait for the other tasks of the cell
+        after_job_ids = [after_job_id for after_task_name in after_tasks or [] 
+                         for after_job_id in get_job_ids(after_task_name, cell_name)]
+        for after_job in Job.fetch_many(after_job_ids, connection=queue.connection) if after_job_ids else []:
+            if after_job and after_job.get_status(refresh=False) in Const.TASK_WAITING_STATUSES + [JobStatus.STARTED]:
+                running.append(after_job)
+
+        return queue.enqueue_call(
+            task,
+            args=args,
+            timeout=task.helper.timeout,
+            description=description,
+            job_id=job_id,
+            meta=meta,
+            # Failures are not allowed, so a job after a failed job stays deferred, see get_blocking_job_ids
+            depends_on=Dependency(jobs=[job.id for job in running]) if running else None,
+            retry=retry,
+            at_front=at_front,
+        )
+
+
+def get_blocking_job_ids(job: Job, connection) -> list[str]:
+    """
+    Get the ids of the jobs a deferred job waits for that failed, or were deleted, so the job never runs.
+    E.g. processing a cell waits for the update of its test records, and stays deferred if the update failed.
+    """
+    dependency_ids = job.dependency_ids
+    if not dependency_ids:
+        return []
+    dependencies = Job.fetch_many(dependency_ids, connection=connection)
+    return [dependency_id for dependency_id, dependency in zip(dependency_ids, dependencies) 
+            if dependency is None or dependency.get_status(refresh=False) in Const.TASK_FAILED_STATUSES]
+
+
+def request_processing(update_job: Job, priority: str = 'interactive'):
+    """
+    Request processing a cell after an update of its test records, if the test data of any test records changed.
+    The update job enqueues the processing when it ends, with the highest priority requested.
+
+    Parameters
+    ----------
+    update_job : rq.job.Job
+        The job updating the test records of the cell
+    priority : str, optional
+        The priority of the processing, one of Const.TASK_PRIORITIES, by default 'interactive'
+    """
+    requested = update_job.meta.get('process')
+    if requested is None or Const.TASK_PRIORITIES.index(priority) < Const.TASK_PRIORITIES.index(requested):
+        update_job.meta['process'] = priority
+        update_job.save_meta()
 
+def enqueue_pipeline(data_directory: str, cell_name: str, reset: bool = False, priority: str = 'interactive'):
+    """
+    Enqueue updating the test records of a cell, then processing it if any test records changed.
+
+    Parameters
+    ----------
+    data_directory : str
+        The directory of the test data of the cell
+    cell_name : str
+        The name of the cell
+    reset : bool, optional
+        If True, all test records are saved again, by default False
+    priority : str, optional
+        The priority of the tasks, one of Const.TASK_PRIORITIES, by default 'interactive'
+
+    Returns
+    -------
+    rq.job.Job
+        The job updating the test records, which enqueues the processing when it ends
+    """
+    update_job = enqueue_unique(update_trs_task, 'reset_trs' if reset else 'update_trs', cell_name, 
+                                data_directory, cell_name, reset, description=f"Update {cell_name}", priority=priority)
+    request_processing(update_job, priority)
+    return update_job
+
+
+@rq.job(timeout=10 * 60)
+def update_project_task(project_name: str, reset: bool, process: bool = False, priority: str = 'bulk'):
+    """
+    Function called by the task queue to update test records for all cells of a project.
+    One update_trs_task is enqueued per cell, so the cells are shared by the workers, 
+    and a failed cell is retried on its own instead of failing the whole project.
+    If process is True, each cell is processed after its update if any of its test records changed.
+    The cell tasks are enqueued with the priority, by default 'bulk', so they do not hold up interactive requests.
+    """
+    with track_task('update_project'):
+        project_directory = Const.DATA_DIRECTORY.format(project_name=project_name, cell_name='')
+        cell_names = sorted(entry for entry in os.listdir(project_directory) 
+                            if os.path.isdir(os.path.join(project_directory, entry)))
+
+        job = get_current_job()
+        child_ids = []
+        for cell_name in cell_names:
+            child = enqueue_unique(
+                update_trs_task, 'reset_trs' if reset else 'update_trs', cell_name, 
+                os.path.join(project_directory, cell_name), cell_name, reset,
+                description=f"Update {cell_name}",
+                meta={'parent_id': job.id if job else None},
+                retry=Retry(max=Const.TASK_MAX_RETRIES),
+                priority=priority,
+            )
+            child_ids.append(child.id)
+            if process:
+                request_processing(child, priority)
 
-def get_tasks_status():
-    queue = rq.get_queue()
-    started_registry = queue.started_job_registry
-    finished_registry = queue.finished_job_registry
-    failed_registry = queue.failed_job_registry
-    def fetch_job_details(job_id):
-        job = queue.fetch_job(job_id)
-        if job is None:
-            return {"id": job_id, "status": "unknown"}
-        return {
-            "id": job.id,
-            "status": job.get_status(),
-            "enqueued_at": job.enqueued_at.strftime('%Y-%m-%d %H:%M:%S') if job.enqueued_at else None,
-            "started_at": job.started_at.strftime('%Y-%m-%d %H:%M:%S') if job.started_at else None,
-            "ended_at": job.ended_at.strftime('%Y-%m-%d %H:%M:%S') if job.ended_at else None,
-            "description": job.description,
+        if job:
+            job.meta['child_ids'] = child_ids
+            job.save_meta()
+        return child_ids
+
+
+def get_queue_lengths() -> dict:
+    """
+    Get the number of jobs of each queue in each status, keyed by their metric labels.
+    """
+    lengths = {}
+    for queue in get_queues():
+        registries = {
+            JobStatus.QUEUED: queue,
+            JobStatus.STARTED: queue.started_job_registry,
+            JobStatus.DEFERRED: queue.deferred_job_registry,
+            JobStatus.SCHEDULED: queue.scheduled_job_registry,
+            JobStatus.FINISHED: queue.finished_job_registry,
+            JobStatus.FAILED: queue.failed_job_registry,
         }
+        for status, registry in registries.items():
+            lengths[format_labels({'queue': queue.name, 'status': status.value})] = registry.count
+    return lengths
+
+def get_job_details(job: Job):
+    """
+    Get the details of a job to show in the task status, 
+    with the id of the processing job an update job enqueued, if any,
+    and the failed jobs a deferred job waits for, if any, as it will not run.
+    """
+    details = {
+        "id": job.id,
+        "status": job.get_status(refresh=False),
+        "queue": job.origin,
+        "enqueued_at": job.enqueued_at.strftime('%Y-%m-%d %H:%M:%S') if job.enqueued_at else None,
+        "started_at": job.started_at.strftime('%Y-%m-%d %H:%M:%S') if job.started_at else None,
+        "ended_at": job.ended_at.strftime('%Y-%m-%d %H:%M:%S') if job.ended_at else None,
+        "description": job.description,
+        "progress": job.meta.get('progress'),
+    }
+    if job.meta.get('process_id'):
+        details["process_id"] = job.meta['process_id']
+    if details["status"] == JobStatus.DEFERRED:
+        blocking_ids = get_blocking_job_ids(job, rq.connection)
+        if blocking_ids:
+            details["blocked_by"] = blocking_ids
+    return details
+
+def get_task_status(job_id: str):
+    """
+    Get the status of a task. A task that enqueued child jobs, like update_project_task, 
+    also gets the number of child jobs in each status and their aggregate status: 
+    'finished' once all children finished, 'failed' once all children ended and any of them failed, 
+    'started' otherwise.
+    Jobs are fetched by their id, as Queue.fetch_job only finds jobs of its own queue.
+    """
+    try:
+        job = Job.fetch(job_id, connection=rq.connection)
+    except NoSuchJobError:
+        return None
+    details = get_job_details(job)
+
+    child_ids = job.meta.get('child_ids')
+    if child_ids is None:
+        return details
+    children = Job.fetch_many(child_ids, connection=rq.connection)
+    counts = Counter(child.get_status(refresh=False).value if child else 'unknown' for child in children)
+    if job.get_status(refresh=False) != JobStatus.FINISHED:
+        status = job.get_status(refresh=False).value
+    elif counts[JobStatus.FINISHED.value] == len(child_ids):
+        status = JobStatus.FINISHED.value
+    elif counts[JobStatus.FINISHED.value] + counts[JobStatus.FAILED.value] + counts['unknown'] == len(child_ids):
+        status = JobStatus.FAILED.value
+    else:
+        status = JobStatus.STARTED.value
+    details['children'] = {"total": len(child_ids), "counts": dict(counts), "status": status}
+    return details
+
+def stream_task_status(job_id: str):
+    """
+    Stream the status of a task as server-sent events, one event each time the status or the progress changes, 
+    until the task ends or is blocked by a failed job. A task with child jobs ends when the aggregate status of its children ends.
+    """
+    last_data = None
+    while True:
+        details = get_task_status(job_id)
+        if details is None:
+            yield f'event: error\ndata: {json.dumps({"error": "Task not found"})}\n\n'
+            return
+        data = json.dumps(details, default=str)
+        if data != last_data:
+            yield f'data: {data}\n\n'
+            last_data = data
+        else:
+            # Comments keep the connection open, and find clients that went away
+            yield ': keep-alive\n\n'
+        status = details.get('children', {}).get('status', details['status'])
+        # A job blocked by a failed job will not run either
+        if status in [JobStatus.FINISHED, JobStatus.FAILED, JobStatus.STOPPED, JobStatus.CANCELED] or details.get('blocked_by'):
+            return
+        time.sleep(Const.PROGRESS_STREAM_INTERVAL)
+
+# Snapshots of the task status by page, with the time they expire
+_status_cache = {}
+
+def prune_jobs(queue):
+    """
+    Delete the oldest finished and failed jobs of a queue, keeping Const.TASK_MAX_ENDED_JOBS of each.
+    """
+    for registry in [queue.finished_job_registry, queue.failed_job_registry]:
+        excess = registry.count - Const.TASK_MAX_ENDED_JOBS
+        if excess <= 0:
+            continue
+        # Registries are sorted by expiry, the oldest jobs come first
+        job_ids = registry.get_job_ids(0, excess - 1, cleanup=False)
+        with queue.connection.pipeline() as pipeline:
+            for job in Job.fetch_many(job_ids, connection=queue.connection):
+                if job:
+                    job.delete(pipeline=pipeline, remove_from_queue=False)
+            pipeline.zrem(registry.key, *job_ids)
+            pipeline.execute()
+        logger.info(f'Pruned {len(job_ids)} jobs from {registry.key}')
+
+def get_tasks_status(page: int = 1, per_page: int = Const.TASK_STATUS_PAGE_SIZE):
+    """
+    Get a page of the jobs of all queues in each status, with the total number of jobs in each status.
+    Started, finished and failed jobs are listed newest first. 
+    The jobs of a page are fetched in one round trip, and the snapshot is cached for Const.TASK_STATUS_CACHE_TTL seconds, 
+    so frequent polls do not read every job each time. Old ended jobs are pruned when a snapshot is read.
+    """
+    now = time.monotonic()
+    key = (page, per_page)
+    cached = _status_cache.get(key)
+    if cached and cached[0] > now:
+        return cached[1]
+    for expired_key in [cached_key for cached_key, (expires_at, _) in _status_cache.items() if expires_at <= now]:
+        del _status_cache[expired_key]
+
+    queues = get_queues()
+    job_ids = {"queued": [], "started": [], "finished": [], "failed": []}
+    for queue in queues:
+        prune_jobs(queue)
+        job_ids["queued"] += queue.get_job_ids()
+        job_ids["started"] += queue.started_job_registry.get_job_ids(desc=True)
+        job_ids["finished"] += queue.finished_job_registry.get_job_ids(desc=True, cleanup=False)
+        job_ids["failed"] += queue.failed_job_registry.get_job_ids(desc=True, cleanup=False)
+
+    start = (page - 1) * per_page
+    page_ids = {status: ids[start:start + per_page] for status, ids in job_ids.items()}
+    all_page_ids = [job_id for ids in page_ids.values() for job_id in ids]
+    jobs = Job.fetch_many(all_page_ids, connection=queues[0].connection) if all_page_ids else []
+    jobs_by_id = dict(zip(all_page_ids, jobs))
+
     result = {
-        "queued": [
-            {
-                "id": job.id,
-                "status": job.get_status(),
-                "enqueued_at": job.enqueued_at.strftime('%Y-%m-%d %H:%M:%S') if job.enqueued_at else None,
-                "description": job.description,
-            }
-            for job in queue.jobs
-        ],
-        "started": [fetch_job_details(job_id) for job_id in started_registry.get_job_ids()],
-        "finished": [fetch_job_details(job_id) for job_id in finished_registry.get_job_ids()],
-        "failed": [fetch_job_details(job_id) for job_id in failed_registry.get_job_ids()],
+        status: [get_job_details(jobs_by_id[job_id]) if jobs_by_id[job_id] else {"id": job_id, "status": "unknown"} 
+                 for job_id in ids]
+        for status, ids in page_ids.items()
     }
+    result["total"] = {status: len(ids) for status, ids in job_ids.items()}
+    result["page"] = page
+    result["per_page"] = per_page
+    _status_cache[(page, per_page)] = (now + Const.TASK_STATUS_CACHE_TTL, result)
     return result
 
 def clear_all():
-    queue = rq.get_queue() 
-    queue.empty()
+    _status_cache.clear()
+    for queue in get_queues():
+        queue.empty()
     return {"status": "success", "message": "Cleared all tasks"}
 
 def clear_finished():
-    queue = rq.get_queue() 
-    finished_registry = queue.finished_job_registry
+    _status_cache.clear()
+    finished_job_ids = []
+    for queue in get_queues():
+        finished_registry = queue.finished_job_registry
+        queue_job_ids = finished_registry.get_job_ids()
 
-    finished_job_ids = finished_registry.get_job_ids()
-
-    for job_id in finished_job_ids:
-        job = Job.fetch(job_id, connection=queue.connection)
-        job.delete()
-        finished_registry.remove(job_id)
+        for job_id in queue_job_ids:
+            job = Job.fetch(job_id, connection=queue.connection)
+            job.delete()
+            finished_registry.remove(job_id)
+        finished_job_ids += queue_job_ids
 
     return {"status": "success", "message": f"Cleared {len(finished_job_ids)} finished tasks"}
 
 def clear_failed():
-    queue = rq.get_queue() 
-    failed_registry = queue.failed_job_registry
-
-    failed_job_ids = failed_registry.get_job_ids()
+    _status_cache.clear()
+    failed_job_ids = []
+    for queue in get_queues():
+        failed_registry = queue.failed_job_registry
+        queue_job_ids = failed_registry.get_job_ids()
 
-    for job_id in failed_job_ids:
-        job = Job.fetch(job_id, connection=queue.connection)
-        job.delete()
-        failed_registry.remove(job_id)
+        for job_id in queue_job_ids:
+            job = Job.fetch(job_id, connection=queue.connection)
+            job.delete()
+            failed_registry.remove(job_id)
+        failed_job_ids += queue_job_ids
 
     return {"status": "success", "message": f"Cleared {len(failed_job_ids)} failed tasks"}
\ No newline at end of file
@@ -1,4 +1,9 @@
 from .utils import Utils
+from .progress import Progress
+from .memory import enable_memory_profiling, is_memory_profiling_enabled, summarize_memory
+from .timing import timed, enable_timing, is_timing_enabled, read_spans, summarize_spans
+from .blob_store import (BlobStore, LocalBlobStore, BucketBlobStore, create_blob_store, configure_blob_store,
+                         register_blob_store, get_blob_store_type)
 from .parser import Parser, create_parser
 from .formatter import Formatter, create_formatter
 from .processor import Processor, create_processor
@@ -0,0 +1,324 @@
+import os
+import shutil
+import hashlib
+import tempfile
+from abc import ABC, abstractmethod
+from typing import BinaryIO, Callable, Iterable
+from urllib.parse import quote
+from batteryabn import logger, Constants as Const
+
+# The blob store types by scheme, see register_blob_store
+BLOB_STORES = {}
+# The blob stores in use, by scheme
+_blob_stores = {}
+# The scheme of the store new blobs are written to
+_default_scheme = Const.BLOB_STORE
+
+
+def register_blob_store(store_type: type) -> type:
+    """
+    Register a blob store type by its scheme, so blob URIs of that scheme are read with it.
+    Used as a class decorator.
+    """
+    BLOB_STORES[store_type.scheme] = store_type
+    return store_type
+
+def get_blob_store_type(scheme: str) -> type:
+    """
+    Get the registered blob store type of a scheme.
+
+    Raises
+    ------
+    ValueError
+        If no blob store is registered for the scheme
+    """
+    if scheme not in BLOB_STORES:
+        raise ValueError(f'Unsupported blob store: {scheme}')
+    return BLOB_STORES[scheme]
+
+def configure_blob_store(blob_store: 'BlobStore') -> 'BlobStore':
+    """
+    Set the blob store of its scheme, e.g. a local blob store in another root directory, 
+    so the services and the repositories read and write the blobs of that scheme in the same store.
+    The configured store is also the default store, which new blobs are written to.
+    """
+    global _default_scheme
+    _blob_stores[blob_store.scheme] = blob_store
+    _default_scheme = blob_store.scheme
+    return blob_store
+
+def create_blob_store(uri: str = None):
+    """
+    Get the blob store of a blob URI, by default the store new blobs are written to, Const.BLOB_STORE unless configured.
+    A store is created with its default configuration, e.g. Const.BLOB_DIRECTORY, unless it was configured first.
+    """
+    scheme = uri.split('://', 1)[0] if uri else _default_scheme
+    store_type = get_blob_store_type(scheme)
+    if scheme not in _blob_stores:
+        _blob_stores[scheme] = store_type()
+    return _blob_stores[scheme]
+
+
+class BlobStore(ABC):
+    """
+    Interface of a store for large binary objects outside the database.
+    Blobs are addressed by the SHA-256 hash of their content, so writing the same content twice 
+    stores it once, and a blob never changes once written.
+    The URI of a blob is '<scheme>://sha256/<hash>'.
+    """
+    scheme = None
+
+    @abstractmethod
+    def write(self, write_func: Callable[[BinaryIO], None]) -> str:
+        """
+        Stream a blob into the store.
+
+        Parameters
+        ----------
+        write_func : Callable[[BinaryIO], None]
+            Function writing the content of the blob to the given binary file
+
+        Returns
+        -------
+        str
+            The URI of the blob
+        """
+
+    @abstractmethod
+    def open(self, uri: str) -> BinaryIO:
+        """
+        Open a blob for streaming reads.
+
+        Parameters
+        ----------
+        uri : str
+            The URI of the blob
+
+        Returns
+        -------
+        BinaryIO
+            Readable binary file of the blob
+        """
+
+    @abstractmethod
+    def exists(self, uri: str) -> bool:
+        """
+        Check if a blob exists in the store.
+        """
+
+    @abstractmethod
+    def delete(self, uri: str) -> None:
+        """
+        Delete a blob from the store. 
+        Other records with the same content share the blob, so only delete unreferenced blobs.
+        """
+
+    def delete_many(self, uris: list[str]) -> None:
+        """
+        Delete blobs that are no longer referenced. A blob that fails to delete is logged and left behind,
+        so cleaning up never fails the change that superseded the blob.
+        """
+        for uri in uris:
+            try:
+                self.delete(uri)
+            except Exception as e:
+                logger.warning(f'Failed to delete blob: {uri}. Error: {e}')
+
+    def write_bytes(self, data: bytes) -> str:
+        """
+        Write a blob from bytes and return its URI.
+        """
+        return self.write(lambda file: file.write(data))
+
+    def read_bytes(self, uri: str) -> bytes:
+        """
+        Read a whole blob into bytes.
+        """
+        with self.open(uri) as file:
+            return file.read()
+
+    def iter_chunks(self, uri: str, chunk_size: int = Const.BLOB_CHUNK_SIZE) -> Iterable[bytes]:
+        """
+        Read a blob in chunks, i.e. to stream it in a response.
+        """
+        with self.open(uri) as file:
+            while chunk := file.read(chunk_size):
+                yield chunk
+
+    def get_hash(self, uri: str) -> str:
+        """
+        Get the content hash of a blob URI.
+        """
+        prefix = f'{self.scheme}://sha256/'
+        if not uri or not uri.startswith(prefix):
+            raise ValueError(f'Invalid {self.scheme} blob URI: {uri}')
+        return uri[len(prefix):]
+
+
+@register_blob_store
+class LocalBlobStore(BlobStore):
+    """
+    Blob store in a local directory.
+    Blobs are saved as <root>/<hash[:2]>/<hash[2:4]>/<hash>, and are written to a temporary file first,
+    so a reader never sees a partially written blob.
+    """
+    scheme = 'local'
+
+    def __init__(self, root_directory: str = None):
+        self.root_directory = root_directory or Const.BLOB_DIRECTORY
+
+    def write(self, write_func: Callable[[BinaryIO], None]) -> str:
+        tmp_directory = os.path.join(self.root_directory, 'tmp')
+        os.makedirs(tmp_directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_directory)
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                hashing_file = _HashingWriter(file)
+                write_func(hashing_file)
+            digest = hashing_file.hexdigest()
+            uri = f'{self.scheme}://sha256/{digest}'
+            path = self.get_path(uri)
+            if os.path.exists(path):
+                os.remove(tmp_path)
+                logger.info(f'Blob already exists: {uri}')
+            else:
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                os.replace(tmp_path, path)
+                logger.info(f'Saved blob: {uri}')
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return uri
+
+    def open(self, uri: str) -> BinaryIO:
+        return open(self.get_path(uri), 'rb')
+
+    def exists(self, uri: str) -> bool:
+        return os.path.exists(self.get_path(uri))
+
+    def delete(self, uri: str) -> None:
+        path = self.get_path(uri)
+        if os.path.exists(path):
+            os.remove(path)
+            logger.info(f'Deleted blob: {uri}')
+
+    def get_path(self, uri: str) -> str:
+        """
+        Get the local path of a blob.
+        """
+        digest = self.get_hash(uri)
+        return os.path.join(self.root_directory, digest[:2], digest[2:4], digest)
+
+
+@register_blob_store
+class BucketBlobStore(BlobStore):
+    """
+    Blob store standing in for an object storage bucket, e.g. S3, in a local directory.
+    As in an object storage, objects have flat keys 'sha256/<hash>', they are only put and got whole,
+    and putting an object replaces the object with the same key at once. So code running against this store 
+    does not rely on directories, renames or partial reads and writes of the bucket.
+    """
+    scheme = 'bucket'
+
+    def __init__(self, root_directory: str = None):
+        self.root_directory = root_directory or Const.BLOB_DIRECTORY
+
+    def write(self, write_func: Callable[[BinaryIO], None]) -> str:
+        # The key is the hash of the content, so the object is buffered until it is complete, on disk if it is large
+        with tempfile.SpooledTemporaryFile(max_size=Const.BLOB_CHUNK_SIZE) as file:
+            hashing_file = _HashingWriter(file)
+            write_func(hashing_file)
+            uri = f'{self.scheme}://sha256/{hashing_file.hexdigest()}'
+            key = self.get_key(uri)
+            if self.head_object(key):
+                logger.info(f'Blob already exists: {uri}')
+            else:
+                file.seek(0)
+                self.put_object(key, file)
+                logger.info(f'Saved blob: {uri}')
+        return uri
+
+    def open(self, uri: str) -> BinaryIO:
+        return self.get_object(self.get_key(uri))
+
+    def exists(self, uri: str) -> bool:
+        return self.head_object(self.get_key(uri))
+
+    def delete(self, uri: str) -> None:
+        self.delete_object(self.get_key(uri))
+        logger.info(f'Deleted blob: {uri}')
+
+    def get_key(self, uri: str) -> str:
+        """
+        Get the object key of a blob.
+        """
+        return f'sha256/{self.get_hash(uri)}'
+
+    def put_object(self, key: str, file: BinaryIO) -> None:
+        """
+        Upload a whole object from a binary file.
+        """
+        os.makedirs(self.root_directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.root_directory, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp_file:
+                shutil.copyfileobj(file, tmp_file)
+            os.replace(tmp_path, self.get_object_path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def get_object(self, key: str) -> BinaryIO:
+        """
+        Get the body of an object as a readable binary stream.
+
+        Raises
+        ------
+        FileNotFoundError
+            If the bucket has no object with the key
+        """
+        return open(self.get_object_path(key), 'rb')
+
+    def head_object(self, key: str) -> bool:
+        """
+        Check if the bucket has an object with the key.
+        """
+        return os.path.exists(self.get_object_path(key))
+
+    def delete_object(self, key: str) -> None:
+        """
+        Delete an object. As in an object storage, deleting a missing object is not an error.
+        """
+        try:
+            os.remove(self.get_object_path(key))
+        except FileNotFoundError:
+            pass
+
+    def get_object_path(self, key: str) -> str:
+        """
+        Get the local path of an object, its key is quoted into a single file name, as keys are flat.
+        """
+        return os.path.join(self.root_directory, quote(key, safe=''))
+
+
+class _HashingWriter:
+    """
+    Binary file wrapper hashing everything written to it.
+    """
+    def __init__(self, file: BinaryIO):
+        self.file = file
+        self.sha256 = hashlib.sha256()
+
+    def write(self, data) -> int:
+        self.sha256.update(data)
+        return self.file.write(data)
+
+    def flush(self):
+        self.file.flush()
+
+    def hexdigest(self) -> str:
+        return self.sha256.hexdigest()
+
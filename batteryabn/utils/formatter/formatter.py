@@ -1,6 +1,5 @@
 import pandas as pd
 import numpy as np
-from scipy import integrate
 from datetime import datetime
 
 from batteryabn import logger, Constants as Const
@@ -29,7 +28,7 @@ class Formatter:
         self.last_update_time = None # Last update timestamp for the test data
         self.calibration_parameters = {}
 
-    def format_data(self, data: pd.DataFrame, metadata: pd.DataFrame, test_type: str) -> pd.DataFrame:
+    def format_data(self, data: pd.DataFrame, metadata: pd.DataFrame, test_type: str, after: dict = None) -> pd.DataFrame:
         """
         Format battery test data and metadata.
 
@@ -44,6 +43,9 @@ class Formatter:
         test_type : str
             Type of battery test data. Supported types: 'Arbin', 'BioLogic', 'Neware', 'Vdf'
 
+        after : dict, optional
+            The tail of the stored test data (see get_tail), only rows after it are formatted
+
         Returns
         -------
         pd.DataFrame
@@ -51,13 +53,14 @@ class Formatter:
         """
         self.clear()
         self.format_metadata(metadata)
-        self.format_test_data(data, test_type)
+        self.format_test_data(data, test_type, after)
 
         return self.test_data
 
-    def format_test_data(self, data: pd.DataFrame, test_type: str) -> None:
+    def format_test_data(self, data: pd.DataFrame, test_type: str, after: dict = None) -> None:
         """
         Format battery test data.
+        The data is formatted in place to avoid copying it, so the raw data should not be used afterwards.
 
         Parameters
         ----------
@@ -67,45 +70,51 @@ class Formatter:
         test_type : str
             Type of battery test data. Supported types: 'Arbin', 'BioLogic', 'Neware', 'Vdf'
 
-        is_cycle : bool, optional
-            Whether the data is cycle data
+        after : dict, optional
+            The tail of the stored test data (see get_tail). Only rows after its timestamp are formatted,
+            and the AhT integral continues from it
         """
         logger.info('Format battery test data')
 
         if data is None or data.empty:
             return
         
-        df = data.copy()
-
-        df = Utils.drop_unnamed_columns(df)
-        df = Utils.drop_empty_rows(df)
-        df = Utils.formate_columns(df)
-
-        # Rename columns based on test type
-        rename_dict = getattr(Const, f'{test_type.upper()}_RENAME_DICT')
-        df = Utils.rename_columns(df, rename_dict)
+        df = data
+
+        # Drop unnamed columns, then format and rename the column names in one pass
+        unnamed_columns = df.filter(like='Unnamed', axis=1).columns
+        if len(unnamed_columns) > 0:
+            logger.info('Drop unnamed columns')
+            df.drop(columns=unnamed_columns, inplace=True)
+        rename_dict = {k.lower().strip(): v for k, v in getattr(Const, f'{test_type.upper()}_RENAME_DICT').items()}
+        columns = df.columns.str.lower().str.strip()
+        df.columns = [rename_dict.get(column, column) for column in columns]
+
+        # Drop empty rows, and only keep the rows after the stored test data
+        keep = df.notna().any(axis=1).to_numpy()
+        if not keep.all():
+            logger.info(f'Drop {(~keep).sum()} empty rows')
+        if after is not None:
+            last_timestamp = self.load_tail_timestamp(after)
+            keep &= (df[Const.TIMESTAMP] > last_timestamp).to_numpy()
+        if not keep.all():
+            df.drop(index=df.index[~keep], inplace=True)
+        if after is not None and df.empty:
+            logger.info('No new rows after the stored test data')
+            self.test_data = df
+            return
 
         # Format the data based on test type
         if test_type != Const.VDF:
             Utils.add_column(df, Const.TEMPERATURE)
             Utils.add_column(df, Const.STEP_IDX)
-            Utils.add_column(df, Const.AHT)
         else:
             # Get the Calibration Parameters X1, X2 and C from the cell and start & removal time
             # TODO: Better way to get calibration parameters instead of using sanity check csv file 
             df = self.add_calibration_parameters(df)
 
         # Calculate AHT from integrating current
-        time_reset = df[Const.TIMESTAMP].reset_index(drop=True)
-        if not isinstance(time_reset[0], pd.Timestamp):
-            time_reset = pd.to_datetime(time_reset, unit='ms')
-        current_reset = df[Const.CURRENT].reset_index(drop=True)
-        aht_calculated = integrate.cumtrapz(
-            abs(current_reset), 
-            (time_reset - time_reset[0]).dt.total_seconds(),
-        ) / 3600
-        aht_calculated = np.append(aht_calculated, aht_calculated[-1] if len(aht_calculated) > 0 else 0)
-        df[Const.AHT] = aht_calculated
+        df[Const.AHT] = self.calculate_aht(df[Const.TIMESTAMP], df[Const.CURRENT], after)
         logger.info(f'AHT calculated: {df[Const.AHT].iloc[-1]}')
 
         if test_type == Const.BIOLOGIC:
@@ -115,15 +124,15 @@ class Formatter:
                 df[Const.AHT] = df[Const.AHT]/1000 
 
         elif test_type == Const.NEWARE:
-            if df[Const.TEMPERATURE] is not None:
-                df[Const.TEMPERATURE] = np.where((df[Const.TEMPERATURE] >= 200) & (df[Const.TEMPERATURE] <250), np.nan, df[Const.TEMPERATURE]) 
+            temperature = df[Const.TEMPERATURE]
+            df.loc[(temperature >= 200) & (temperature < 250), Const.TEMPERATURE] = np.nan
             
             # Formate the time column from HH:MM:SS.fff to seconds
             df[Const.TIME] = Utils.time_str_series_to_seconds(df[Const.TIME])
 
-        # Check the data lengths for cycle data
+        # Check the data columns for cycle data
         if test_type != Const.VDF:
-            lengths = [len(df[column].reset_index(drop=True)) for column in [Const.TIME, Const.CURRENT, Const.VOLTAGE]]
+            lengths = [len(df[column]) for column in [Const.TIME, Const.CURRENT, Const.VOLTAGE]]
             if len(set(lengths)) > 1:
                 raise ValueError(f"Inconsistent data lengths in the dataframe")
 
@@ -138,6 +147,100 @@ class Formatter:
 
         self.test_data = df
 
+    def calculate_aht(self, timestamps: pd.Series, current: pd.Series, after: dict = None) -> np.ndarray:
+        """
+        Calculate the AhT by integrating the absolute current over time with the trapezoidal rule.
+
+        Parameters
+        ----------
+        timestamps : pd.Series
+            Timestamps of the rows, as datetimes or epoch milliseconds
+        current : pd.Series
+            Current of the rows in A
+        after : dict, optional
+            The tail of the stored test data (see get_tail), the integral starts from its last row
+
+        Returns
+        -------
+        np.ndarray
+            The AhT of the rows
+        """
+        time_ns = self.timestamps_to_ns(timestamps)
+        current = np.abs(current.to_numpy(dtype=np.float64))
+        if after is not None:
+            # Start the integral from the last stored row
+            last_time_ns = self.timestamps_to_ns(pd.Series([self.load_tail_timestamp(after)]))
+            time_ns = np.concatenate([last_time_ns, time_ns])
+            current = np.concatenate([[abs(after['last_current'])], current])
+
+        # Same as scipy.integrate.cumtrapz, without the intermediate series
+        areas = np.diff(time_ns) / 1e9
+        areas *= current[1:] + current[:-1]
+        areas /= 2 * 3600
+        aht = np.cumsum(areas)
+        if after is not None:
+            return after['last_aht'] + aht
+        return np.append(aht, aht[-1] if len(aht) > 0 else 0)
+
+    def timestamps_to_ns(self, timestamps: pd.Series) -> np.ndarray:
+        """
+        Convert timestamps to nanoseconds since the epoch.
+
+        Parameters
+        ----------
+        timestamps : pd.Series
+            Timestamps as datetimes or epoch milliseconds
+
+        Returns
+        -------
+        np.ndarray
+            Nanoseconds since the epoch as int64
+        """
+        if pd.api.types.is_numeric_dtype(timestamps):
+            timestamps = pd.to_datetime(timestamps, unit='ms')
+        elif not pd.api.types.is_datetime64_any_dtype(timestamps):
+            timestamps = pd.to_datetime(timestamps)
+        if isinstance(timestamps.dtype, pd.DatetimeTZDtype):
+            timestamps = timestamps.dt.tz_convert(None)
+        return timestamps.to_numpy(dtype='datetime64[ns]').view(np.int64)
+
+    def get_tail(self) -> dict:
+        """
+        Get the tail of the formatted test data: the timestamp, current and AhT of the last row.
+        It is saved with the test data, so rows added to the file later can be formatted and appended on their own.
+
+        Returns
+        -------
+        dict
+            The tail of the test data, None if there is no test data
+        """
+        if self.test_data.empty:
+            return None
+        last_row = self.test_data.iloc[-1]
+        last_timestamp = last_row[Const.TIMESTAMP]
+        return {
+            'last_timestamp': last_timestamp.isoformat() if isinstance(last_timestamp, pd.Timestamp) else float(last_timestamp),
+            'last_current': float(last_row[Const.CURRENT]),
+            'last_aht': float(last_row[Const.AHT]),
+        }
+
+    def load_tail_timestamp(self, tail: dict):
+        """
+        Load the last timestamp of a tail saved by get_tail.
+
+        Parameters
+        ----------
+        tail : dict
+            The tail of the stored test data
+
+        Returns
+        -------
+        pd.Timestamp or float
+            The last timestamp, as a Timestamp for cycler data and epoch milliseconds for Vdf data
+        """
+        last_timestamp = tail['last_timestamp']
+        return pd.Timestamp(last_timestamp) if isinstance(last_timestamp, str) else last_timestamp
+
     def format_metadata(self, metadata: dict) -> None:
         """
         Format battery test metadata.
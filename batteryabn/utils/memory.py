@@ -0,0 +1,133 @@
+import os
+import sys
+import tracemalloc
+from collections import defaultdict
+import psutil
+from batteryabn import Constants as Const
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Keys of span records that are not attributes of the span
+SPAN_KEYS = {'path', 'name', 'depth', 'started_at', 'duration_ms', 'failed',
+             'peak_mb', 'retained_mb', 'rss_mb', 'max_rss_mb', 'max_rss_growth_mb'}
+# Memory profiling is enabled with MEMORY_PROFILE=true in the environment, or enable_memory_profiling()
+_enabled = os.getenv('MEMORY_PROFILE', 'false').lower() == 'true'
+
+
+def enable_memory_profiling(enabled: bool = True):
+    """
+    Enable or disable memory profiling of the timed stages in this process.
+    """
+    global _enabled
+    _enabled = enabled
+
+def is_memory_profiling_enabled() -> bool:
+    """
+    Check if memory profiling of the timed stages is enabled.
+    """
+    return _enabled
+
+def get_max_rss():
+    """
+    Get the peak resident set size of this process in bytes, None if the platform does not report it.
+    """
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
+
+
+class StageMemory:
+    """
+    Memory of a timed stage: the peak of the memory allocated by Python objects (e.g. the arrays of dataframes)
+    above the memory allocated at the start of the stage, traced with tracemalloc, the memory still allocated
+    at the end of the stage, and the resident set size of the process.
+
+    tracemalloc has a single peak, which each stage resets when it starts, so a stage passes the peak
+    it saw so far to its parent when a nested stage starts, and its own peak when it ends.
+    The outermost stage starts tracing if it is not traced yet, and stops it when it ends.
+
+    Parameters
+    ----------
+    parent : StageMemory, optional
+        The memory of the enclosing stage
+    """
+    def __init__(self, parent: 'StageMemory' = None):
+        self.parent = parent
+        self.started_tracing = not tracemalloc.is_tracing()
+        if self.started_tracing:
+            tracemalloc.start()
+        current, peak = tracemalloc.get_traced_memory()
+        if parent:
+            parent.peak = max(parent.peak, peak)
+        tracemalloc.reset_peak()
+        self.start = current
+        self.peak = current
+        self.max_rss_start = get_max_rss()
+
+    def stop(self) -> dict:
+        """
+        Stop measuring the stage, and get its memory in MB.
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        self.peak = max(self.peak, peak)
+        if self.parent:
+            self.parent.peak = max(self.parent.peak, self.peak)
+        if self.started_tracing:
+            tracemalloc.stop()
+        max_rss = get_max_rss()
+        return {
+            'peak_mb': to_mb(self.peak - self.start),
+            'retained_mb': to_mb(current - self.start),
+            'rss_mb': to_mb(psutil.Process().memory_info().rss),
+            'max_rss_mb': to_mb(max_rss),
+            'max_rss_growth_mb': to_mb(max_rss - self.max_rss_start) if max_rss is not None else None,
+        }
+
+
+def to_mb(size):
+    """
+    Convert bytes to MB, rounded to 0.1 MB.
+    """
+    return round(size / 1e6, 1) if size is not None else None
+
+def summarize_memory(records: list[dict]) -> list[dict]:
+    """
+    Summarize the memory of span records by the path of the stage: the number of spans, the largest peak
+    and retained memory, and the largest growth of the peak RSS, sorted by the peak, largest first.
+    A stage shares the peak of its nested stage that allocated it, so on equal peaks the nested stage comes first.
+    Records without memory are skipped.
+    """
+    stages = defaultdict(list)
+    for record in records:
+        if record.get('peak_mb') is not None:
+            stages[record['path']].append(record)
+    summary = [
+        {
+            'path': path,
+            'count': len(stage_records),
+            'peak_mb': max(record['peak_mb'] for record in stage_records),
+            'retained_mb': max(record['retained_mb'] for record in stage_records),
+            'max_rss_growth_mb': max((record['max_rss_growth_mb'] or 0) for record in stage_records),
+        }
+        for path, stage_records in stages.items()
+    ]
+    return sorted(summary, key=lambda stage: (stage['peak_mb'], stage['path'].count('/')), reverse=True)
+
+def format_memory_report(records: list[dict], limit: int = Const.MEMORY_REPORT_STAGES) -> str:
+    """
+    Format a report of the stages of span records, ranked by their peak memory.
+    """
+    summary = summarize_memory(records)
+    root = next((record for record in records if record['depth'] == 0), records[-1])
+    attributes = ', '.join(f'{key}={value}' for key, value in root.items() if key not in SPAN_KEYS)
+    lines = [f'Memory of {root["path"]} ({attributes}), peak RSS {root.get("max_rss_mb")} MB, stages by peak memory:',
+             f'{"peak MB":>10} {"retained MB":>12} {"RSS growth MB":>14} {"count":>6}  stage']
+    for stage in summary[:limit]:
+        lines.append(f'{stage["peak_mb"]:>10.1f} {stage["retained_mb"]:>12.1f} {stage["max_rss_growth_mb"]:>14.1f} '
+                     f'{stage["count"]:>6}  {stage["path"]}')
+    return '\n'.join(lines)
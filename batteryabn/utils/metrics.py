@@ -0,0 +1,160 @@
+import re
+import time
+import threading
+from collections import defaultdict
+from contextlib import contextmanager
+from batteryabn import Constants as Const
+
+
+class MetricsRegistry:
+    """
+    In-process registry of counters and histograms, rendered in the Prometheus text format.
+
+    Every sample is additive, e.g. a histogram is its bucket counts, sum and count, so the samples of
+    several processes are merged by adding them. RQ workers run each job in a forked process,
+    which adds its samples to a Redis hash with flush() before it exits, and the API process
+    renders its own samples merged with the hash.
+    """
+    def __init__(self):
+        self.metrics = {}
+        self.samples = defaultdict(float)
+        self.flushed = {}
+        self.lock = threading.Lock()
+
+    def counter(self, name: str, documentation: str):
+        """
+        Register a counter and get a function that adds to it: inc(amount=1, **labels).
+        """
+        self.metrics[name] = ('counter', documentation, None)
+        def inc(amount: float = 1, **labels):
+            with self.lock:
+                self.samples[(name, f'{name}_total', format_labels(labels))] += amount
+        return inc
+
+    def histogram(self, name: str, documentation: str, buckets: list = Const.METRICS_BUCKETS):
+        """
+        Register a histogram and get a function that observes a value: observe(value, **labels).
+        """
+        self.metrics[name] = ('histogram', documentation, buckets)
+        def observe(value: float, **labels):
+            with self.lock:
+                for bucket in buckets:
+                    if value <= bucket:
+                        self.samples[(name, f'{name}_bucket', format_labels({**labels, 'le': bucket}))] += 1
+                self.samples[(name, f'{name}_bucket', format_labels({**labels, 'le': '+Inf'}))] += 1
+                self.samples[(name, f'{name}_sum', format_labels(labels))] += value
+                self.samples[(name, f'{name}_count', format_labels(labels))] += 1
+        return observe
+
+    @contextmanager
+    def timer(self, observe, **labels):
+        """
+        Observe the seconds spent in the block with a histogram, with status 'ok' or 'failed'.
+        """
+        start = time.perf_counter()
+        status = 'failed'
+        try:
+            yield
+            status = 'ok'
+        finally:
+            observe(time.perf_counter() - start, **labels, status=status)
+
+    def flush(self, connection):
+        """
+        Add the samples since the last flush to the Redis hash Const.METRICS_KEY.
+        """
+        with self.lock:
+            deltas = {key: value - self.flushed.get(key, 0) for key, value in self.samples.items()}
+            self.flushed = dict(self.samples)
+        deltas = {key: value for key, value in deltas.items() if value}
+        if not deltas:
+            return
+        with connection.pipeline() as pipeline:
+            for (name, sample, labels), value in deltas.items():
+                pipeline.hincrbyfloat(Const.METRICS_KEY, f'{name} {sample}{labels}', value)
+            pipeline.execute()
+
+    def read(self, connection) -> dict:
+        """
+        Read the samples flushed to Redis by all processes.
+        """
+        samples = {}
+        for field, value in connection.hgetall(Const.METRICS_KEY).items():
+            field = field.decode() if isinstance(field, bytes) else field
+            name, sample = field.split(' ', 1)
+            series, _, labels = sample.partition('{')
+            samples[(name, series, '{' + labels if labels else '')] = float(value)
+        return samples
+
+    def render(self, connection=None, gauges: list = None) -> str:
+        """
+        Render the samples of this process, merged with the samples flushed to Redis if a connection is given,
+        and gauges measured at the time of the scrape, in the Prometheus text format.
+
+        Parameters
+        ----------
+        connection : redis.Redis, optional
+            Connection to read the samples of other processes from
+        gauges : list, optional
+            Gauges as (name, documentation, {labels string: value})
+
+        Returns
+        -------
+        str
+            The metrics
+        """
+        with self.lock:
+            samples = dict(self.samples)
+        if connection is not None:
+            for key, value in self.read(connection).items():
+                samples[key] = samples.get(key, 0) + value
+
+        by_metric = defaultdict(list)
+        for (name, sample, labels), value in samples.items():
+            by_metric[name].append((sample, labels, value))
+
+        lines = []
+        for name, (kind, documentation, _) in sorted(self.metrics.items()):
+            lines += [f'# HELP {name} {documentation}', f'# TYPE {name} {kind}']
+            lines += [f'{sample}{labels} {format_value(value)}' for sample, labels, value in sorted(by_metric[name], key=sample_order)]
+        for name, documentation, values in gauges or []:
+            lines += [f'# HELP {name} {documentation}', f'# TYPE {name} gauge']
+            lines += [f'{name}{labels} {format_value(value)}' for labels, value in sorted(values.items())]
+        return '\n'.join(lines) + '\n'
+
+
+def format_labels(labels: dict) -> str:
+    """
+    Format labels as {key="value",...}, sorted by key, or '' without labels.
+    """
+    if not labels:
+        return ''
+    escaped = {key: str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for key, value in labels.items()}
+    return '{' + ','.join(f'{key}="{value}"' for key, value in sorted(escaped.items())) + '}'
+
+def sample_order(sample: tuple):
+    """
+    Sort key of the samples of a metric, keeping the buckets of a histogram in increasing order.
+    """
+    series, labels, _ = sample
+    match = re.search(r'le="([^"]+)"', labels)
+    return series, re.sub(r',?le="[^"]+"', '', labels), float(match.group(1)) if match else 0
+
+def format_value(value: float) -> str:
+    """
+    Format a sample value, integers without a decimal point.
+    """
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+# The registry of this process
+metrics = MetricsRegistry()
+
+observe_request_duration = metrics.histogram(
+    'batteryabn_http_request_duration_seconds', 'Latency of API requests by route, method and status code')
+observe_task_duration = metrics.histogram(
+    'batteryabn_task_duration_seconds', 'Duration of tasks by task and status', buckets=Const.METRICS_TASK_BUCKETS)
+count_parsed_rows = metrics.counter('batteryabn_parser_rows', 'Rows parsed by test type')
+count_parsed_bytes = metrics.counter('batteryabn_parser_bytes', 'Bytes of the files parsed by test type')
+count_parser_seconds = metrics.counter('batteryabn_parser_seconds', 'Seconds spent parsing files by test type')
+observe_esoh_fit_duration = metrics.histogram('batteryabn_esoh_fit_duration_seconds', 'Duration of eSOH fits by status')
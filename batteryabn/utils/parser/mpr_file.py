@@ -0,0 +1,126 @@
+import numpy as np
+import pandas as pd
+from datetime import datetime, timedelta
+from galvani.BioLogic import MPR_MAGIC, read_VMP_modules, parse_BioLogic_date, VMPdata_dtype_from_colIDs
+
+
+class MprFile:
+    """
+    Memory-mapped reader of BioLogic .mpr files.
+
+    The module headers are read with galvani, but the data module is memory-mapped instead of read into memory,
+    so the columns are views of the file and only the pages that are used are loaded.
+    The map is copy-on-write, changing the data never changes the file.
+
+    Attributes
+    ----------
+    data : numpy.memmap
+        Record array of the data module
+    start_date : datetime.date
+        The date the experiment started
+    timestamp : datetime.datetime
+        The time the experiment started, None if the file has no log module
+    """
+    def __init__(self, file_path: str):
+        self.timestamp = None
+        with open(file_path, 'rb') as file:
+            if file.read(len(MPR_MAGIC)) != MPR_MAGIC:
+                raise ValueError(f"Invalid magic for mpr file: {file_path}")
+            modules = {module['shortname'].strip(): module for module in read_VMP_modules(file, read_module_data=False)}
+
+            # Only the header of the data module and the log module are read
+            data_module = modules[b'VMP data']
+            dtype, data_offset, n_data_points = self.__read_data_header(file, data_module)
+            log_module = modules.get(b'VMP LOG')
+            log_data = self.__read_module(file, log_module) if log_module else None
+
+        if n_data_points * dtype.itemsize > data_module['length'] - data_offset:
+            raise ValueError(f"Unexpected end of data module in mpr file: {file_path}")
+        self.data = np.memmap(file_path, dtype=dtype, mode='c', offset=data_module['offset'] + data_offset, shape=(n_data_points,))
+        self.start_date = parse_BioLogic_date(modules[b'VMP Set']['date'])
+        if log_data is not None:
+            self.timestamp = self.__read_log_timestamp(log_data)
+
+    def to_dataframe(self) -> pd.DataFrame:
+        """
+        Get the data as a dataframe whose columns are views of the memory-mapped file.
+
+        Returns
+        -------
+        pandas.DataFrame
+            The data of the mpr file
+        """
+        return pd.DataFrame({name: self.data[name].view(np.ndarray) for name in self.data.dtype.names}, copy=False)
+
+    def get_timestamps(self, start_time: datetime, time_column: str = 'time/s') -> np.ndarray:
+        """
+        Get the timestamps of the data points from the start time and the time column in seconds.
+
+        Parameters
+        ----------
+        start_time : datetime.datetime
+            The time the experiment started
+        time_column : str, optional
+            The column of the time since the start in seconds, by default 'time/s'
+
+        Returns
+        -------
+        numpy.ndarray
+            The timestamps as datetime64[ns], rounded to microseconds
+        """
+        # Rounded to microseconds, the resolution of the start time
+        time_us = np.rint(self.data[time_column] * 1e6).astype('timedelta64[us]')
+        return (np.datetime64(start_time, 'us') + time_us).astype('datetime64[ns]')
+
+    def __read_module(self, file, module: dict) -> bytes:
+        """
+        Read the data of a module.
+        """
+        file.seek(module['offset'])
+        return file.read(module['length'])
+
+    def __read_data_header(self, file, module: dict):
+        """
+        Read the header of the data module, in the same layouts as galvani.BioLogic.MPRfile.
+
+        Returns
+        -------
+        numpy.dtype
+            The record type of the data points
+        int
+            Offset of the data points from the start of the module data
+        int
+            Number of data points
+        """
+        file.seek(module['offset'])
+        header = file.read(min(module['length'], 1007))
+        n_data_points = int(np.frombuffer(header[:4], dtype='<u4')[0])
+        n_columns = int(header[4])
+
+        if module['version'] == 0:
+            # If EC-Lab version >= 11.50, column types are [0 1 0 3 0 174...] instead of [1 3 174...]
+            if header[5]:
+                column_types = np.frombuffer(header[5:], dtype='u1', count=n_columns)
+                data_offset = 100
+            else:
+                column_types = np.frombuffer(header[5:], dtype='u1', count=n_columns * 2)[1::2]
+                data_offset = 1007
+        elif module['version'] in [2, 3]:
+            column_types = np.frombuffer(header[5:], dtype='<u2', count=n_columns)
+            # Version 3 added a byte before the data points
+            data_offset = 406 if module['version'] == 3 else 405
+        else:
+            raise ValueError(f"Unrecognised version for data module: {module['version']}")
+
+        dtype, _ = VMPdata_dtype_from_colIDs(column_types)
+        return dtype, data_offset, n_data_points
+
+    def __read_log_timestamp(self, log_data: bytes) -> datetime:
+        """
+        Read the start time from the log module, stored as an OLE date at one of several offsets.
+        """
+        for offset in [465, 469, 473, 585]:
+            ole_timestamp = np.frombuffer(log_data, dtype='<f8', count=1, offset=offset)[0]
+            if 40000 < ole_timestamp < 50000:
+                return datetime(1899, 12, 30) + timedelta(days=float(ole_timestamp))
+        raise ValueError("Could not find timestamp in the log module")
@@ -1,13 +1,19 @@
 import os
+import io
+import time
 import re
 import csv
 import cellpy
 import shutil
+import tempfile
 import pandas as pd
-from galvani import BioLogic
+import pyarrow as pa
+from pyarrow import csv as pa_csv
 
 from batteryabn import logger, Constants as Const
 from batteryabn.utils import Utils
+from batteryabn.utils.parser.mpr_file import MprFile
+from batteryabn.utils.metrics import count_parsed_rows, count_parsed_bytes, count_parser_seconds
 
 def create_parser():
     return Parser()
@@ -20,6 +26,7 @@ class Parser:
         self.test_name = None
         self.test_type = None
         self.test_size = None
+        self.data_end_offset = None # Byte offset after the last complete row, only for Vdf csv files
         self.raw_test_data = pd.DataFrame(dtype=object)
         self.raw_metadata = {}
         self.calibration_parameters = {}
@@ -31,7 +38,7 @@ class Parser:
             Const.VDF: self.parse_vdf,
         }
 
-    def parse(self, file_path: str) -> None:
+    def parse(self, file_path: str, offset: int = None) -> None:
         """
         Parse data from battery test data files.
         Supported test types: 'BioLogic', 'Neware', 'Vdf'
@@ -41,6 +48,9 @@ class Parser:
         ----------
         file_path : str
             Path to battery test data file
+        offset : int, optional
+            Byte offset to start reading rows from, only for Vdf csv files (see data_end_offset).
+            By default all rows are read
         """
         logger.debug(f'Load file path: {file_path}')
         if not os.path.exists(file_path):
@@ -49,20 +59,39 @@ class Parser:
         # Clear previous data before parsing new data
         self.clear()
         
-        # Get measurement name
-        self.test_name = self.__get_test_name(file_path)
-
-        # Determine test type
-        self.test_type = self.__determine_test_type(file_path)
-
-        # Get the size of the test data
-        self.test_size = self.__get_test_size(file_path)
+        # Get measurement name, test type and the size of the test data
+        self.test_name, self.test_type, self.test_size = self.identify(file_path)
         
         # Parse metadata from test name
         self.parse_metadata(self.test_name, self.test_type)
 
         # Parse data based on test type
-        self.parse_functions[self.test_type](file_path)
+        start = time.perf_counter()
+        if self.test_type == Const.VDF:
+            self.parse_vdf(file_path, offset)
+        else:
+            self.parse_functions[self.test_type](file_path)
+
+        # Throughput per test type is rows or bytes over seconds
+        count_parser_seconds(time.perf_counter() - start, test_type=self.test_type)
+        count_parsed_rows(len(self.raw_test_data) if self.raw_test_data is not None else 0, test_type=self.test_type)
+        count_parsed_bytes(max((self.test_size or 0) - (offset or 0), 0), test_type=self.test_type)
+
+    def identify(self, file_path: str) -> tuple:
+        """
+        Identify a battery test data file from its path, without loading the data.
+
+        Parameters
+        ----------
+        file_path : str
+            Path to battery test data file
+
+        Returns
+        -------
+        tuple
+            The test name, test type and size of the test data
+        """
+        return self.__get_test_name(file_path), self.__determine_test_type(file_path), self.__get_test_size(file_path)
 
     def parse_arbin(self, file_path: str) -> None:
         """
@@ -73,13 +102,10 @@ class Parser:
         file_path : str
             Path to Arbin test data file
         """
-        # Create a backup of the file before reading it, the modified cellpy read function will change the file
-        # backup_file_path = Utils.backup_file(file_path)
-        arbin_raw_df, arbin_summary_df, arbin_steps_df = self.__read_cellpy(file_path)
+        arbin_raw_df = self.__read_cellpy(file_path)
 
         # Store raw test data
         self.raw_test_data = arbin_raw_df
-        # Utils.restore_file(backup_file_path)
 
     def parse_biologic(self, file_path: str) -> None:
         """
@@ -91,12 +117,9 @@ class Parser:
             Path to BioLogic test data file
         """
  
-        biologic_raw_df, start_time = self.__load_mpr(file_path)
+        biologic_raw_df = self.__load_mpr(file_path)
         if biologic_raw_df is None:
             return
-        # Add the timestamp column
-        total_time = pd.to_timedelta(biologic_raw_df['time/s'])
-        biologic_raw_df[Const.TIMESTAMP] = start_time + total_time
 
         self.raw_test_data = biologic_raw_df
         
@@ -114,17 +137,16 @@ class Parser:
 
         # Add the timestamp for the neware data
         start_time = pd.to_datetime(neware_raw_df['Date'][0])
-        total_time = pd.to_timedelta(neware_raw_df['Total Time'])
+        total_time = Utils.time_str_series_to_timedelta(neware_raw_df['Total Time'])
         # Adjust Total Time
-        first_total_time = total_time[0]
-        total_time = total_time - first_total_time
-        neware_raw_df[Const.TIMESTAMP] = start_time + total_time
+        total_time = total_time - total_time[0]
+        neware_raw_df[Const.TIMESTAMP] = start_time + pd.to_timedelta(total_time)
         neware_raw_df.drop(columns=['t1(℃)'], inplace=True)
         
         # Store raw test data
         self.raw_test_data = neware_raw_df
 
-    def parse_vdf(self, file_path: str) -> None:
+    def parse_vdf(self, file_path: str, offset: int = None) -> None:
         """
         Parse Neware Vdf test data.
 
@@ -132,8 +154,10 @@ class Parser:
         ----------
         file_path : str
             Path to Neware Vdf test data file
+        offset : int, optional
+            Byte offset to start reading rows from, by default all rows are read
         """
-        vdf_df, vdf_meta = self.__load_vdf_csv(file_path)
+        vdf_df, vdf_meta = self.__load_vdf_csv(file_path, offset)
 
         if vdf_df is None or vdf_meta is None:
             return
@@ -327,14 +351,18 @@ class Parser:
         except:
             raise ValueError(f"Failed to load xlsx file from {file_path}")
         
-    def __load_vdf_csv(self, file_path: str) -> pd.DataFrame:
+    def __load_vdf_csv(self, file_path: str, offset: int = None) -> pd.DataFrame:
         """
-        Read the vdf csv file and return the raw data
+        Read the vdf csv file and return the raw data.
+        The byte offset after the last complete row is stored in data_end_offset, 
+        so the rows appended to the file later can be read from it.
 
         Parameters
         ----------
         file_path : str
             The path to the vdf csv file
+        offset : int, optional
+            Byte offset to start reading rows from, by default all rows are read
             
         Returns
         -------
@@ -345,14 +373,18 @@ class Parser:
             The metadata inside the vdf csv file
         """
         vdf_meta = {}
-        start_line = None
+        header, units, data_offset = None, None, None
 
         try:
-            # Open the file once and parse it line by line
-            with open(file_path, 'r') as file:
-                for i, line in enumerate(file):
+            # Open the file once and parse the metadata and headers line by line
+            with open(file_path, 'rb') as file:
+                for line in iter(file.readline, b''):
+                    line = line.decode()
                     if "[DATA START]" in line:
-                        start_line = i + 1  # Adjust for 0-based index
+                        # The first row of data contains the header and the second row contains units
+                        header = file.readline().decode().rstrip('\r\n').split('\t')
+                        units = file.readline().decode().rstrip('\r\n').split('\t')
+                        data_offset = file.tell()
                         break  # Exit loop once the data start marker is found
                     elif ':' in line:
                         key, value = line.split(':', 1)  # Split on the first colon only
@@ -361,21 +393,17 @@ class Parser:
             raise ValueError(f"Failed to read vdf meta data from {file_path}")
 
         # Check if the data start marker was not found
-        if start_line is None:
+        if data_offset is None:
             logger.error(f"Data start marker not found in {file_path}")
             return None, None
 
-        try:
-        # Read the DataFrame, assuming the first row of data contains units
-            df_units = pd.read_csv(file_path, delimiter='\t', skiprows=start_line, nrows=1)
-            header = df_units.columns
-            units = df_units.iloc[0].values
-
-            # New header with units if available
-            new_header = [f"{header[i]} ({units[i]})" if units[i] != 'none' else header[i] for i in range(len(header))]
+        # New header with units if available
+        new_header = [f"{header[i]} ({units[i]})" if i < len(units) and units[i] != 'none' else header[i] for i in range(len(header))]
 
-            # Read the actual data, skipping the units row
-            vdf_df = pd.read_csv(file_path, delimiter='\t', skiprows=start_line + 2, header=None, names=new_header)
+        try:
+            # Read only the rows appended after the offset if it is given
+            start = data_offset if offset is None else max(offset, data_offset)
+            vdf_df = self.__read_vdf_rows(file_path, start, new_header, self.__get_vdf_column_types(new_header, units))
 
             logger.info(f"Loaded vdf csv file from {file_path} successfully")
         except Exception as e:
@@ -384,9 +412,102 @@ class Parser:
         
         return vdf_df, vdf_meta
 
+    def __get_vdf_column_types(self, names: list[str], units: list[str]) -> dict:
+        """
+        Get the column types of a vdf csv file from its units row.
+        Columns without a known unit are left to type inference.
+
+        Parameters
+        ----------
+        names : list[str]
+            The column names
+        units : list[str]
+            The units of the columns
+
+        Returns
+        -------
+        dict
+            Column names to pyarrow types
+        """
+        return {name: pa.type_for_alias(Const.VDF_UNIT_DTYPES[unit]) 
+                for name, unit in zip(names, units) if unit in Const.VDF_UNIT_DTYPES}
+
+    def __read_vdf_rows(self, file_path: str, start: int, names: list[str], column_types: dict = None) -> pd.DataFrame:
+        """
+        Read the complete rows of a vdf csv file from a byte offset, and store the offset after them in data_end_offset.
+        A partially written last row is left for the next read.
+        The rows are parsed by the multithreaded pyarrow csv reader with the declared column types.
+
+        Parameters
+        ----------
+        file_path : str
+            The path to the vdf csv file
+        start : int
+            Byte offset of the first row to read
+        names : list[str]
+            The column names
+        column_types : dict, optional
+            Column names to pyarrow types, the other columns are inferred
+
+        Returns
+        -------
+        pandas.DataFrame
+            The rows of the vdf csv file
+        """
+        with open(file_path, 'rb') as file:
+            # Find the end of the last complete row
+            end = file.seek(0, os.SEEK_END)
+            while end > start:
+                file.seek(max(start, end - Const.VDF_TAIL_BLOCK_SIZE))
+                block = file.read(end - file.tell())
+                newline = block.rfind(b'\n')
+                if newline >= 0:
+                    end = end - len(block) + newline + 1
+                    break
+                end -= len(block)
+            self.data_end_offset = max(start, end)
+
+            if end <= start:
+                logger.info(f"No new rows in vdf csv file {file_path}")
+                return pd.DataFrame(columns=names)
+            column_types = column_types or {}
+            try:
+                return self.__read_vdf_table(file, start, end, names, column_types).to_pandas()
+            except pa.ArrowInvalid as e:
+                # Types are inferred from the first block, read the other columns as float64 if a later block differs
+                logger.warning(f"Failed to infer vdf column types of {file_path}, reading them as float64: {e}")
+            try:
+                float_types = {name: column_types.get(name, pa.float64()) for name in names}
+                return self.__read_vdf_table(file, start, end, names, float_types).to_pandas()
+            except pa.ArrowInvalid as e:
+                # A column without units has text, read the columns without units as strings and convert the numeric ones
+                logger.warning(f"Failed to read vdf columns of {file_path} as float64, reading them as strings: {e}")
+            string_types = {name: column_types.get(name, pa.string()) for name in names}
+            df = self.__read_vdf_table(file, start, end, names, string_types).to_pandas()
+            for name in names:
+                if name not in column_types:
+                    try:
+                        df[name] = pd.to_numeric(df[name])
+                    except (ValueError, TypeError):
+                        pass
+            return df
+
+    def __read_vdf_table(self, file, start: int, end: int, names: list[str], column_types: dict) -> pa.Table:
+        """
+        Parse the rows between two byte offsets of an open vdf csv file with the multithreaded pyarrow csv reader.
+        """
+        file.seek(start)
+        return pa_csv.read_csv(
+            io.BufferedReader(_FileSlice(file, end - start)),
+            read_options=pa_csv.ReadOptions(column_names=names, use_threads=True),
+            parse_options=pa_csv.ParseOptions(delimiter='\t'),
+            convert_options=pa_csv.ConvertOptions(column_types=column_types),
+        )
+
     def __load_mpr(self, file_path: str) -> pd.DataFrame:
         """
-        Read the mpr file of Biologic, get the data and return the dataframe
+        Read the mpr file of Biologic, get the data with the timestamp column and return the dataframe.
+        The file is memory-mapped, so the data columns are views of the file instead of copies.
 
         Parameters
         ----------
@@ -397,72 +518,65 @@ class Parser:
         -------
         df : pandas.DataFrame
             The dataframe
-        start_timestamp : datetime.datetime
-            The start timestamp
         """
         try:
             # Read the mpr file
-            mpr_file = BioLogic.MPRfile(file_path)
+            mpr_file = MprFile(file_path)
             # Get the start time
-            # If the mpr_file.timestamp is not available, use the startdate
-            if hasattr(mpr_file, 'timestamp') and mpr_file.timestamp:
-                start_time = mpr_file.timestamp
-            else:
-                start_date = mpr_file.startdate
-                # Start date is datetime.date type, convert it to datetime.datetime
-                start_time = pd.to_datetime(start_date)
-
-            df = pd.DataFrame(mpr_file.data)
+            # If the mpr_file.timestamp is not available, use the start date
+            start_time = mpr_file.timestamp or pd.to_datetime(mpr_file.start_date)
+
+            df = mpr_file.to_dataframe()
+            df[Const.TIMESTAMP] = mpr_file.get_timestamps(start_time)
             logger.info(f"Loaded mpr file from {file_path} successfully")
 
-            return df, start_time
+            return df
         
         except Exception as e:
             logger.error(f"Failed to load mpr file from {file_path}: {e}")
-            return None, None
+            return None
         
     def __read_cellpy(self, file_path: str):
         """
-        Read the cellpy file and return the iterator of rows
+        Read the Arbin res file with cellpy and return the raw data.
+        The file is read in place, unless Const.CELLPY_SCRATCH_DIRECTORY is set to stage it on a local disk first.
+        Only the raw table is kept, the step table and summary are not created.
 
         Parameters
         ----------
         file_path : str
-            The path to the cellpy file
+            The path to the Arbin res file
 
         Returns
         -------
         raw_data : pandas.DataFrame
             The raw data
-        summary_data : pandas.DataFrame
-            The summary data
-        steps_data : pandas.DataFrame
-            The steps data
         """
+        staged_file_path = None
         try:
-            # Use cellpy to read the file and convert it to a list of rows
-            temp_dir = "/home/me-bcl/BatteryABN/tmp/cellpy_temp"
-            # Create a temporary directory if it does not exist
-            if not os.path.exists(temp_dir):
-                os.makedirs(temp_dir)
-            temp_file_path = os.path.join(temp_dir, os.path.basename(file_path))
             cellpy.prms.Instruments.Arbin['max_res_filesize'] = 1000000000
-            # Copy the file to the temp directory
-            shutil.copy(file_path, temp_file_path)
-            cell = cellpy.cellreader.get(temp_file_path, instrument="arbin_res")
-            data = cell.data
-            raw_data = data.raw
-            summary_data = data.summary
-            steps_data = data.steps
+            if Const.CELLPY_SCRATCH_DIRECTORY:
+                os.makedirs(Const.CELLPY_SCRATCH_DIRECTORY, exist_ok=True)
+                # A unique name, so workers reading files with the same name do not overwrite each other's copies
+                with tempfile.NamedTemporaryFile(dir=Const.CELLPY_SCRATCH_DIRECTORY, suffix='.res', delete=False) as staged_file:
+                    staged_file_path = staged_file.name
+                    with open(file_path, 'rb') as file:
+                        shutil.copyfileobj(file, staged_file)
+            # mdbtools only reads the file, so it is not copied by cellpy either
+            cell = cellpy.cellreader.get(staged_file_path or file_path, instrument="arbin_res", 
+                                         refuse_copying=True, auto_summary=False)
+            raw_data = cell.data.raw
             logger.info(f"Loaded cellpy file from {file_path} successfully")
-            # Delete the temp file
-            os.remove(temp_file_path)
 
-            return raw_data, summary_data, steps_data
+            return raw_data
             
         except Exception as e:
             logger.error(f"Failed to load cellpy file from {file_path}: {e}")
-            return None, None, None
+            return None
+
+        finally:
+            if staged_file_path and os.path.exists(staged_file_path):
+                os.remove(staged_file_path)
 
     def clear(self) -> None:
         """
@@ -470,5 +584,27 @@ class Parser:
         """
         self.test_name = None
         self.test_type = None
+        self.data_end_offset = None
         self.raw_test_data = pd.DataFrame(dtype=object)
-        self.raw_metadata = {}
\ No newline at end of file
+        self.raw_metadata = {}
+
+
+class _FileSlice(io.RawIOBase):
+    """
+    Read-only view of the next size bytes of a binary file.
+    """
+    def __init__(self, file, size: int):
+        self.file = file
+        self.remaining = size
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        size = min(len(buffer), self.remaining)
+        if size <= 0:
+            return 0
+        data = self.file.read(size)
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
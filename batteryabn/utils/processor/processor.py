@@ -1,11 +1,13 @@
 import pandas as pd 
 import numpy as np
+from typing import Callable
 import rfcnt
 from scipy import integrate, interpolate
 from scipy.signal import find_peaks, savgol_filter
 from scipy.optimize import Bounds, NonlinearConstraint, minimize
 
-from batteryabn.utils import Utils
+from batteryabn.utils import Utils, Progress, timed
+from batteryabn.utils.metrics import metrics, observe_esoh_fit_duration
 from batteryabn import logger, Constants as Const
 from batteryabn.models import TestRecord, Project
 
@@ -18,11 +20,20 @@ class Processor:
         """
         A class to process battery test data.
         """
+        self.update = False
+        self.load_test_data = None
+        self.reset()
+
+    def reset(self) -> None:
+        """
+        Clear the processed data, so nothing of a cell processed before is left when processing another cell.
+        """
         self.cell_data = pd.DataFrame(dtype=object)
         self.cell_cycle_metrics = pd.DataFrame(dtype=object)
         self.cell_data_vdf = pd.DataFrame(dtype=object)
         self.cell_data_rpt = pd.DataFrame(dtype=object)
-        self.update = False
+        self.cell_data_pyramid = {}
+        self.cell_data_vdf_pyramid = {}
 
     def set_processed_data(self, data: pd.DataFrame = None, 
                            cycle_metrics: pd.DataFrame = None, data_vdf: pd.DataFrame =None) -> None:
@@ -44,7 +55,8 @@ class Processor:
         self.cell_cycle_metrics = cycle_metrics
         self.cell_data_vdf = data_vdf
 
-    def process(self, cycler_trs: dict, vdf_trs: dict = None, project: Project = None) -> None:
+    def process(self, cycler_trs: dict, vdf_trs: dict = None, project: Project = None, 
+                load_test_data: Callable[[TestRecord], pd.DataFrame] = None) -> bool:
         """
         Process battery test data.
 
@@ -58,14 +70,30 @@ class Processor:
 
         project : Project, optional
             Project object
+
+        load_test_data : Callable[[TestRecord], pd.DataFrame]
+            Function loading the test data of a test record, e.g. TestDataRepository.load.
+            Test data is loaded one test record at a time while it is processed.
+
+        Returns
+        -------
+        bool
+            True if the data was processed, False if there is no cycler data to process
         """
+        if load_test_data is None:
+            raise ValueError('A function loading the test data of the test records is required')
+        self.load_test_data = load_test_data
+        # The processor is shared by the cells a worker processes, so the data of the previous cell is cleared first
+        self.reset()
 
         # Process cycler data
-        cell_data, cell_cycle_metrics = self.process_cycler_data(cycler_trs, project)
+        with timed('process_cycler_data'):
+            cell_data, cell_cycle_metrics = self.process_cycler_data(cycler_trs, project)
         if cell_data is None or cell_cycle_metrics is None:
-            return
+            return False
 
-        cell_data_vdf, cell_cycle_metrics = self.process_cycler_expansion(vdf_trs, cell_cycle_metrics)
+        with timed('process_cycler_expansion'):
+            cell_data_vdf, cell_cycle_metrics = self.process_cycler_expansion(vdf_trs, cell_cycle_metrics)
 
         # Rearrange columns of cell_cycle_metrics for easy reading with data on left and others on right
         cols = cell_cycle_metrics.columns.to_list()
@@ -74,7 +102,17 @@ class Processor:
 
         self.set_processed_data(cell_data, cell_cycle_metrics, cell_data_vdf)
 
-        self.summarize_rpt_data(project)
+        with timed('summarize_rpt_data'):
+            self.summarize_rpt_data(project)
+
+        # Build multi-resolution summaries for time-range queries
+        progress = Progress('process pyramid', total=2, unit='summaries')
+        with timed('build_data_pyramid'):
+            self.cell_data_pyramid = self.build_data_pyramid(self.cell_data, Const.PYRAMID_COLUMNS)
+            progress.advance()
+            self.cell_data_vdf_pyramid = self.build_data_pyramid(self.cell_data_vdf, Const.PYRAMID_COLUMNS_VDF)
+            progress.advance()
+        return True
 
 #-----------------Cycler Expansion Processing-----------------#
 
@@ -162,8 +200,10 @@ class Processor:
         """
         dfs = []
         trs = self.sort_trs(trs)
+        progress = Progress('process expansion', total=len(trs), unit='test records')
         for name, tr in trs.items():
             dfs.append(self.process_cycler_expansion_tr(tr))
+            progress.advance()
         logger.info(f"Combining {len(dfs)} dataframes")
 
         if len(dfs) == 0:
@@ -175,7 +215,8 @@ class Processor:
         if len(selected_dfs) == 0:
             logger.error("No valid cycler expansion data found")
             return pd.DataFrame(columns = Const.VDF_COLUMNS)
-        cell_data_vdf = pd.concat(selected_dfs, ignore_index=True).sort_values(by=Const.TIMESTAMP)
+        with timed('concat'):
+            cell_data_vdf = pd.concat(selected_dfs, ignore_index=True).sort_values(by=Const.TIMESTAMP)
 
         return cell_data_vdf
     
@@ -194,7 +235,8 @@ class Processor:
             Processed cycler expansion data
         """
         logger.debug(f"Processing cycler expansion data for {tr.test_name}")
-        df = tr.get_test_data()
+        with timed('get_test_data'):
+            df = self.load_test_data(tr)
         if df.empty:
             logger.warning(f"No data found for {tr.test_name}")
             return df
@@ -338,21 +380,27 @@ class Processor:
         trs = self.sort_trs(trs)
         # Calculate the AHT based on the previous test record
         pre_aht = 0
+        cycles = 0
+        progress = Progress('process cycler', total=len(trs), unit='test records')
         for name, tr in trs.items():
             logger.info(f"Processing cycler data for {name}")
             df = self.process_cycle_tr(tr, pre_aht)
             if df.empty:
                 logger.warning(f"No data found for {name}")
+                progress.advance(cycles=cycles)
                 continue
             pre_aht = df[Const.AHT].iloc[-1]
             dfs.append(df)
+            cycles += int((df[Const.CHARGE_CYCLE_IDC] | df[Const.DISCHARGE_CYCLE_IDC]).sum())
+            progress.advance(cycles=cycles)
 
         if len(dfs) == 0:
             logger.debug("No cycler data found")
             return None, None
         
         logger.info(f"Combining {len(dfs)} dataframes")
-        cell_data = pd.concat(dfs, ignore_index=True)
+        with timed('concat'):
+            cell_data = pd.concat(dfs, ignore_index=True)
 
 
         # TODO: This delete some discharge cycles that should be kept.
@@ -400,7 +448,8 @@ class Processor:
             Formatted cycle data
         """
         logger.debug(f"Processing cycle data for {tr.test_name}")
-        df = tr.get_test_data()
+        with timed('get_test_data'):
+            df = self.load_test_data(tr)
         df = df.reset_index(drop=True)
 
         if df.empty:
@@ -433,7 +482,8 @@ class Processor:
             )
         )
 
-        charge_start_idxs, discharge_start_idxs = self.find_cycle_idxs(t, i)
+        with timed('find_cycle_idxs'):
+            charge_start_idxs, discharge_start_idxs = self.find_cycle_idxs(t, i)
         # try: # won't work for half cycles (files with only charge or only discharge)
         charge_start_idxs, discharge_start_idxs = self.match_charge_discharge(charge_start_idxs, discharge_start_idxs)
         # except Exception as e:
@@ -789,6 +839,7 @@ class Processor:
         cell_rpt_data_list = []  # Use a list to collect dataframes to concatenate later
 
         logger.info(f"Found {len(rpt_filename_to_idxs)} RPT files")
+        progress = Progress('process rpt', total=sum(len(idxs) for idxs in rpt_filename_to_idxs.values()), unit='cycles')
 
         for rpt_file, rpt_idxs in rpt_filename_to_idxs.items():
             # Mark as the previous rpt cycle
@@ -824,6 +875,7 @@ class Processor:
                     rpt_subcycle[Const.DATA_VDF] = self.cell_data_vdf.loc[(t_vdf > t_start) & (t_vdf < t_end)]
 
                 cell_rpt_data_list.append(pd.DataFrame([rpt_subcycle]))
+                progress.advance()
 
         if not cell_rpt_data_list:
             logger.warning("No RPT data found")
@@ -863,7 +915,8 @@ class Processor:
             voltage = rpt_subcycle[Const.DATA][Const.VOLTAGE]
             ah_throughput = rpt_subcycle[Const.DATA][Const.AHT]
             
-            hppc_data = self.get_rs_soc(time_ms, current, voltage, ah_throughput)
+            with timed('hppc'):
+                hppc_data = self.get_rs_soc(time_ms, current, voltage, ah_throughput)
 
             # Dynamically generate metrics_mapping based on PULSE_CURRENTS
             for col in Const.CCM_COLUMNS_ADDITIONAL_HPPC:
@@ -911,8 +964,9 @@ class Processor:
             ch_subcycle = rpt_subcycle
         try:
             logger.info(f"Processing eSOH for {rpt_subcycle[Const.TEST_NAME]}")
-            q_data, v_data, dvdq_data, q_full = self.load_v_data(ch_subcycle, dh_subcycle, i_slow)
-            theta, cap, err_v, err_dvdq, p1_err, p2_err, p12_err = self.esoh_est(q_data, v_data, dvdq_data, q_full)
+            with timed('esoh'), metrics.timer(observe_esoh_fit_duration):
+                q_data, v_data, dvdq_data, q_full = self.load_v_data(ch_subcycle, dh_subcycle, i_slow)
+                theta, cap, err_v, err_dvdq, p1_err, p2_err, p12_err = self.esoh_est(q_data, v_data, dvdq_data, q_full)
             if err_v > 20:
                 logger.warning(f"Error in V estimation is too high: {err_v}.")
                 theta[:] = np.NaN
@@ -1251,6 +1305,49 @@ class Processor:
         return dict(sorted(trs.items(), key=lambda item: item[1].last_update_time))
     
     
+#----------------- Data Pyramid -----------------#
+
+    def build_data_pyramid(self, data: pd.DataFrame, columns: list, buckets: list = Const.PYRAMID_BUCKETS) -> dict:
+        """
+        Build a multi-resolution pyramid of the data. Each level aggregates the columns
+        into fixed-width time buckets and keeps the min, max and mean of every bucket.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Data with a timestamp column, e.g. cell_data or cell_data_vdf
+        columns : list
+            Columns to summarize, missing columns are skipped
+        buckets : list, optional
+            Bucket width in seconds for each level, from the coarsest to the finest
+
+        Returns
+        -------
+        dict
+            Keys are levels and values are dataframes indexed by bucket start
+            (Unix timestamp in milliseconds) with a '<column> <stat>' column per statistic
+        """
+        pyramid = {}
+        if data is None or data.empty or Const.TIMESTAMP not in data.columns:
+            logger.warning("No data found to build the pyramid")
+            return pyramid
+
+        columns = [c for c in columns if c in data.columns]
+        t_ms = Utils.timestamp_series_to_unix_ms(data[Const.TIMESTAMP])
+        values = data[columns].apply(pd.to_numeric, errors='coerce').reset_index(drop=True)
+
+        for level, bucket in enumerate(buckets):
+            bucket_ms = bucket * 1000
+            bucket_starts = np.floor(t_ms / bucket_ms) * bucket_ms
+            tile = values.groupby(bucket_starts).agg(Const.PYRAMID_STATS)
+            tile.columns = [f'{column} {stat}' for column, stat in tile.columns]
+            tile.index = tile.index.astype(np.int64)
+            tile.index.name = Const.TIMESTAMP
+            pyramid[level] = tile
+            logger.debug(f"Pyramid level {level}: {len(tile)} buckets of {bucket} s")
+
+        return pyramid
+
     # ---------------------------------#
 
     def combine_data(self, cell_data: pd.DataFrame, cell_data_vdf: pd.DataFrame) -> pd.DataFrame:
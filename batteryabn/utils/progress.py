@@ -0,0 +1,85 @@
+import time
+from datetime import datetime, timezone
+from rq import get_current_job
+from batteryabn import Constants as Const
+
+
+class Progress:
+    """
+    Progress of a stage of a task, saved in the meta of the current RQ job as job.meta['progress'],
+    so the task status can show it while the job runs.
+    Outside of an RQ worker there is no current job, and reporting does nothing.
+
+    The progress holds the stage, the number of items done of the total, the unit of the items,
+    the estimated seconds left and any extra counts such as the cycles processed.
+    Saves are throttled to one every Const.PROGRESS_INTERVAL seconds, except the start and the end of a stage.
+
+    Parameters
+    ----------
+    stage : str
+        The name of the stage, e.g. 'ingest'
+    total : int, optional
+        The number of items of the stage, None if unknown
+    unit : str, optional
+        The unit of the items, by default 'files'
+    """
+    def __init__(self, stage: str, total: int = None, unit: str = 'files'):
+        self.job = get_current_job()
+        self.stage = stage
+        self.total = total
+        self.unit = unit
+        self.done = 0
+        self.extra = {}
+        self.start_time = time.monotonic()
+        self.saved_time = None
+        self.save()
+
+    def advance(self, count: int = 1, **extra):
+        """
+        Add items done, and update extra counts, e.g. cycles=120.
+        """
+        self.update(self.done + count, **extra)
+
+    def update(self, done: int, **extra):
+        """
+        Set the number of items done, and update extra counts.
+        """
+        self.done = done
+        self.extra.update(extra)
+        if self.total is not None and done >= self.total:
+            self.save()
+        elif self.saved_time is None or time.monotonic() - self.saved_time >= Const.PROGRESS_INTERVAL:
+            self.save()
+
+    def get_eta(self):
+        """
+        Get the estimated seconds left from the average time per item so far, None if it cannot be estimated.
+        """
+        if not self.total or not self.done:
+            return None
+        elapsed = time.monotonic() - self.start_time
+        return round(elapsed / self.done * max(self.total - self.done, 0), 1)
+
+    def to_dict(self) -> dict:
+        """
+        Get the progress as a dictionary.
+        """
+        return {
+            "stage": self.stage,
+            "done": self.done,
+            "total": self.total,
+            "unit": self.unit,
+            "eta": self.get_eta(),
+            "updated_at": datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S'),
+            **self.extra,
+        }
+
+    def save(self):
+        """
+        Save the progress in the meta of the current job.
+        """
+        if self.job is None:
+            return
+        self.saved_time = time.monotonic()
+        self.job.meta['progress'] = self.to_dict()
+        self.job.save_meta()
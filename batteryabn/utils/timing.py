@@ -0,0 +1,163 @@
+import os
+import json
+import time
+import threading
+from collections import defaultdict
+from contextlib import nullcontext
+from contextvars import ContextVar
+from rq import get_current_job
+from batteryabn import logger, Constants as Const
+from .memory import StageMemory, is_memory_profiling_enabled, format_memory_report
+
+# Timing is enabled with TIMING=true in the environment, or enable_timing()
+_enabled = os.getenv('TIMING', 'false').lower() == 'true'
+# The innermost open span of the current thread
+_current_span = ContextVar('timing_span', default=None)
+# Shared by all spans while timing is disabled, so a disabled span costs one check
+_disabled_span = nullcontext()
+_write_lock = threading.Lock()
+
+
+def enable_timing(enabled: bool = True):
+    """
+    Enable or disable timing of the stages in this process.
+    """
+    global _enabled
+    _enabled = enabled
+
+def is_timing_enabled() -> bool:
+    """
+    Check if timing of the stages is enabled.
+    """
+    return _enabled
+
+def timed(name: str, **attributes):
+    """
+    Time a stage in a span, as a context manager. Spans opened inside it are its nested stages.
+    When the outermost span ends, all spans of it are appended to Const.TIMING_FILE as JSON lines,
+    with the path of the stage, e.g. 'process_cell_task/process/summarize_rpt_data', its duration,
+    the id of the current RQ job and the attributes, e.g. the cell name, which nested spans inherit.
+    With memory profiling enabled, each span also records the memory of its stage (see StageMemory),
+    and the outermost span logs a report of its stages ranked by their peak memory.
+    Does nothing when timing and memory profiling are disabled.
+
+    Parameters
+    ----------
+    name : str
+        The name of the stage
+    **attributes
+        Attributes of the span, e.g. cell_name
+
+    Returns
+    -------
+    contextmanager
+        The span
+    """
+    if not _enabled and not is_memory_profiling_enabled():
+        return _disabled_span
+    return Span(name, attributes)
+
+
+class Span:
+    """
+    A timed stage, created by timed().
+    """
+    def __init__(self, name: str, attributes: dict):
+        self.name = name
+        self.attributes = attributes
+        self.records = []
+
+    def __enter__(self):
+        parent = _current_span.get()
+        if parent:
+            self.root = parent.root
+            self.path = f'{parent.path}/{self.name}'
+            self.attributes = {**parent.attributes, **self.attributes}
+        else:
+            self.root = self
+            self.path = self.name
+            job = get_current_job()
+            self.attributes = {'job_id': job.id if job else None, **self.attributes}
+        self.depth = self.path.count('/')
+        self.memory = StageMemory(parent.memory if parent else None) if is_memory_profiling_enabled() else None
+        self.token = _current_span.set(self)
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        duration = time.perf_counter() - self.start
+        memory = self.memory.stop() if self.memory else {}
+        _current_span.reset(self.token)
+        self.root.records.append({
+            'path': self.path,
+            'name': self.name,
+            'depth': self.depth,
+            'started_at': round(self.started_at, 3),
+            'duration_ms': round(duration * 1000, 3),
+            'failed': exc_type is not None,
+            **memory,
+            **self.attributes,
+        })
+        if self.root is self:
+            write_spans(self.records)
+            if memory:
+                logger.info(format_memory_report(self.records))
+        return False
+
+
+def write_spans(records: list[dict], file_path: str = None, max_bytes: int = Const.TIMING_FILE_MAX_BYTES):
+    """
+    Append span records to the timing file as JSON lines.
+    Once the file reaches max_bytes, it is moved to '<file_path>.1', replacing the previous one, and a new file is started,
+    so the timing file never grows past about max_bytes and reading it stays cheap.
+    """
+    file_path = file_path or Const.TIMING_FILE
+    os.makedirs(os.path.dirname(file_path) or '.', exist_ok=True)
+    lines = ''.join(json.dumps(record, default=str) + '\n' for record in records)
+    with _write_lock:
+        if os.path.exists(file_path) and os.path.getsize(file_path) >= max_bytes:
+            os.replace(file_path, f'{file_path}.1')
+        with open(file_path, 'a') as file:
+            file.write(lines)
+
+def read_spans(file_path: str = None, **filters) -> list[dict]:
+    """
+    Read the span records of the timing file, keeping the records whose attributes match the filters,
+    e.g. cell_name='GMJuly2022_CELL002'. Filters that are None are ignored.
+    Only the current timing file is read, the records of a rotated file are dropped, see write_spans.
+    """
+    file_path = file_path or Const.TIMING_FILE
+    filters = {key: value for key, value in filters.items() if value is not None}
+    if not os.path.exists(file_path):
+        return []
+    records = []
+    with open(file_path, 'r') as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if all(record.get(key) == value for key, value in filters.items()):
+                records.append(record)
+    return records
+
+def summarize_spans(records: list[dict]) -> list[dict]:
+    """
+    Summarize span records by the path of the stage: the number of spans, total, mean and max duration,
+    sorted by the total duration, longest first.
+    """
+    durations = defaultdict(list)
+    for record in records:
+        durations[record['path']].append(record['duration_ms'])
+    summary = [
+        {
+            'path': path,
+            'count': len(values),
+            'total_ms': round(sum(values), 3),
+            'mean_ms': round(sum(values) / len(values), 3),
+            'max_ms': max(values),
+        }
+        for path, values in durations.items()
+    ]
+    return sorted(summary, key=lambda stage: stage['total_ms'], reverse=True)
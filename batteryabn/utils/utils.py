@@ -122,6 +122,44 @@ class Utils:
         data = pickle.loads(pickled_data)
         
         return data
+
+    @staticmethod
+    def gzip_pickle_dump_to(data: pd.DataFrame, file, protocol=pickle.HIGHEST_PROTOCOL):
+        """
+        Stream data as gzip compressed pickle into a writable binary file.
+        The gzip header has no timestamp, so the same data always gives the same bytes.
+
+        Parameters
+        ----------
+        data : pd.DataFrame
+            Data to dump
+        file : BinaryIO
+            Writable binary file
+        protocol : int, optional
+            Pickle protocol, by default pickle.HIGHEST_PROTOCOL
+        """
+        logger.info(f'Stream data to gzip compressed pickle file')
+        with gzip.GzipFile(fileobj=file, mode='wb', mtime=0) as gz:
+            pickle.dump(data, gz, protocol=protocol)
+
+    @staticmethod
+    def gzip_pickle_load_from(file):
+        """
+        Stream data from a readable binary file of gzip compressed pickle.
+
+        Parameters
+        ----------
+        file : BinaryIO
+            Readable binary file
+
+        Returns
+        -------
+        pd.DataFrame
+            Data loaded from the file
+        """
+        logger.info(f'Stream data from gzip compressed pickle file')
+        with gzip.GzipFile(fileobj=file, mode='rb') as gz:
+            return pickle.load(gz)
     
     @staticmethod
     def formate_columns(df: pd.DataFrame) -> pd.DataFrame:
@@ -345,6 +383,38 @@ class Utils:
         plt.imshow(image)
         return fig
     
+    @staticmethod
+    def iter_df_chunks(df: pd.DataFrame, fmt: str = Const.NDJSON, chunk_size: int = Const.STREAM_CHUNK_ROWS):
+        """
+        Serialize a DataFrame chunk by chunk, so the whole frame is never held as one string.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            DataFrame to serialize
+        fmt : str, optional
+            Output format, 'ndjson' (one JSON object per row) or 'csv', by default 'ndjson'
+        chunk_size : int, optional
+            Number of rows per chunk, by default Const.STREAM_CHUNK_ROWS
+
+        Yields
+        ------
+        str
+            Serialized chunk of rows
+        """
+        if fmt not in Const.STREAM_MIMETYPES:
+            raise ValueError(f'Unsupported stream format: {fmt}')
+
+        if fmt == Const.CSV:
+            yield df.iloc[:0].to_csv(index=False)
+        for i in range(0, len(df), chunk_size):
+            chunk = df.iloc[i:i + chunk_size]
+            if fmt == Const.CSV:
+                yield chunk.to_csv(index=False, header=False)
+            else:
+                lines = chunk.to_json(orient='records', lines=True, date_format='iso')
+                yield lines if lines.endswith('\n') else lines + '\n'
+
     @staticmethod
     def timestamp_to_int(timestamp: pd.Timestamp, tz_info = Const.DEFAULT_TIME_ZONE) -> int:
         """
@@ -379,16 +449,65 @@ class Utils:
         - t_series (pd.Series): A pandas Series containing time strings.
 
         Returns:
-        - np.ndarray: An array of integers representing the time in milliseconds.
-        """
-        # Convert the time strings to Timedelta
-        t_timedelta = pd.to_timedelta(t_series)
-        # Convert the Timedelta to total seconds and cast to int64
-        t_milliseconds = (t_timedelta.dt.total_seconds()).astype('int64')
-        # Convert to numpy array
-        t_array = t_milliseconds.to_numpy()
-        
-        return t_array
+        - np.ndarray: An array of integers representing the time in seconds.
+        """
+        t_timedelta = Utils.time_str_series_to_timedelta(t_series)
+        # Convert the Timedelta to whole seconds
+        return t_timedelta.astype('int64') // 10**9
+    
+    @staticmethod
+    def time_str_series_to_timedelta(t_series: pd.Series) -> np.ndarray:
+        """
+        Convert a pandas Series of time strings in "HH:MM:SS.fff" format to an array of timedeltas.
+        The hours can have any number of digits, the rest of the string has a fixed width, 
+        so the fields are sliced from the end of the strings and converted with NumPy.
+        Strings in other formats are converted with pd.to_timedelta.
+
+        Parameters:
+        - t_series (pd.Series): A pandas Series containing time strings.
+
+        Returns:
+        - np.ndarray: An array of timedelta64[ns].
+        """
+        try:
+            t_bytes = t_series.to_numpy().astype('S')
+        except (UnicodeEncodeError, ValueError, TypeError):
+            t_bytes = None
+        if t_bytes is None or len(t_bytes) == 0:
+            return pd.to_timedelta(t_series).to_numpy(dtype='timedelta64[ns]')
+
+        # The strings as rows of characters, padded with zeros at the end
+        chars = t_bytes.view(np.uint8).reshape(len(t_bytes), -1)
+        lengths = np.count_nonzero(chars, axis=1)
+        t_milliseconds = np.empty(len(chars), dtype=np.int64)
+
+        # Rows with the same number of hour digits have all fields in the same columns
+        for length in np.flatnonzero(np.bincount(lengths)):
+            if length < 11:
+                return pd.to_timedelta(t_series).to_numpy(dtype='timedelta64[ns]')
+            rows = lengths == length
+            group = chars if rows.all() else chars[rows]
+            # Digits of the hours, minutes, seconds and milliseconds, the rest are separators
+            digits = group[:, :length] - np.uint8(ord('0'))
+            is_separator = np.zeros(length, dtype=bool)
+            is_separator[[length - 10, length - 7, length - 4]] = True
+            is_valid = (
+                (group[:, length - 10] == ord(':')).all() and
+                (group[:, length - 7] == ord(':')).all() and
+                (group[:, length - 4] == ord('.')).all() and
+                (digits[:, ~is_separator] <= 9).all()
+            )
+            if not is_valid:
+                return pd.to_timedelta(t_series).to_numpy(dtype='timedelta64[ns]')
+
+            field = lambda start, stop: sum(digits[:, i].astype(np.int64) * 10 ** (stop - 1 - i) for i in range(start, stop))
+            hours = field(0, length - 10)
+            minutes = field(length - 9, length - 7)
+            seconds = field(length - 6, length - 4)
+            milliseconds = field(length - 3, length)
+            t_milliseconds[rows] = ((hours * 60 + minutes) * 60 + seconds) * 1000 + milliseconds
+
+        return (t_milliseconds * 10**6).astype('timedelta64[ns]')
     
     @staticmethod
     def datetime_series_to_unix_timestamps(dt_series: pd.Series) -> np.ndarray:
@@ -404,7 +523,24 @@ class Utils:
         # Convert the datetime objects to Unix timestamps
         unix_timestamps = dt_series.apply(lambda x: Utils.datetime_to_unix_timestamp(x) * 1000)
         return unix_timestamps.to_numpy(dtype=np.float64)
-    
+
+    @staticmethod
+    def timestamp_series_to_unix_ms(t_series: pd.Series) -> np.ndarray:
+        """
+        Convert a pandas Series of timestamps to an array of Unix timestamps in milliseconds.
+        Cycler data stores datetimes while VDF data already stores epoch milliseconds.
+
+        Parameters:
+        - t_series (pd.Series): A pandas Series containing datetimes or epoch milliseconds.
+
+        Returns:
+        - np.ndarray: An array of floats representing the time in milliseconds, NaN for missing values.
+        """
+        if pd.api.types.is_datetime64_any_dtype(t_series):
+            t_ns = t_series.astype('int64').to_numpy(dtype=np.float64)
+            return np.where(t_series.isna().to_numpy(), np.nan, t_ns / 1e6)
+        return pd.to_numeric(t_series, errors='coerce').to_numpy(dtype=np.float64)
+
 
     @staticmethod
     def time_string_to_seconds(time_string: str) -> int:
@@ -5,7 +5,7 @@ import pandas as pd
 import mpld3
 
 from batteryabn import logger, Constants as Const
-from batteryabn.utils import Processor, Utils
+from batteryabn.utils import Processor, Utils, Progress, timed
 
 def create_viewer():
     return Viewer()
@@ -33,14 +33,21 @@ class Viewer:
         cell_name : str
             The name of the cell
         """
-        
-        fig1 = self.plot_process_cell(cell_data, cell_data_vdf, cell_cycle_metrics, cell_name)
-        fig2 = self.plot_cycle_metrics_time(cell_data, cell_data_vdf, cell_cycle_metrics, cell_name)
-        fig3 = self.plot_cycle_metrics_aht(cell_data, cell_data_vdf, cell_cycle_metrics, cell_name)
+        progress = Progress('plot', total=3, unit='figures')
+        with timed('plot_process_cell'):
+            fig1 = self.plot_process_cell(cell_data, cell_data_vdf, cell_cycle_metrics, cell_name)
+        progress.advance()
+        with timed('plot_cycle_metrics_time'):
+            fig2 = self.plot_cycle_metrics_time(cell_data, cell_data_vdf, cell_cycle_metrics, cell_name)
+        progress.advance()
+        with timed('plot_cycle_metrics_aht'):
+            fig3 = self.plot_cycle_metrics_aht(cell_data, cell_data_vdf, cell_cycle_metrics, cell_name)
+        progress.advance()
         # Turn figs into html
-        fig1_html = mpld3.fig_to_html(fig1)
-        fig2_html = mpld3.fig_to_html(fig2)
-        fig3_html = mpld3.fig_to_html(fig3)
+        with timed('fig_to_html'):
+            fig1_html = mpld3.fig_to_html(fig1)
+            fig2_html = mpld3.fig_to_html(fig2)
+            fig3_html = mpld3.fig_to_html(fig3)
 
         return fig1, fig2, fig3, fig1_html, fig2_html, fig3_html
         
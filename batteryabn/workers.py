@@ -0,0 +1,47 @@
+import sys
+import signal
+import subprocess
+import click
+from . import logger, Constants as Const
+
+
+def parse_concurrency(values: tuple[str]) -> dict:
+    """
+    Parse the worker counts of queues given as 'queue=count', on top of Const.TASK_QUEUE_WORKERS.
+    """
+    concurrency = dict(Const.TASK_QUEUE_WORKERS)
+    for value in values:
+        queue_name, _, count = value.partition('=')
+        if queue_name not in Const.TASK_QUEUES or not count.isdigit():
+            raise click.BadParameter(f'{value} is not queue=count with a queue of {Const.TASK_QUEUES}')
+        concurrency[queue_name] = int(count)
+    return concurrency
+
+
+@click.command('workers')
+@click.option('--concurrency', '-c', multiple=True, help='Worker processes of a queue as queue=count, e.g. -c bulk=4')
+@click.option('--burst', '-b', is_flag=True, help='Stop the workers after all queued jobs are done')
+def workers_command(concurrency: tuple[str], burst: bool):
+    """
+    Start a pool of RQ workers with a number of worker processes per queue, by default Const.TASK_QUEUE_WORKERS.
+    Each worker is a `flask rq worker` for a single queue,
+    so bulk jobs can never take the workers of the interactive queue.
+    """
+    concurrency = parse_concurrency(concurrency)
+    processes = []
+    for queue_name, count in concurrency.items():
+        for _ in range(count):
+            command = [sys.executable, '-m', 'flask', 'rq', 'worker', queue_name] + (['--burst'] if burst else [])
+            processes.append(subprocess.Popen(command))
+        logger.info(f'Started {count} workers for queue {queue_name}')
+
+    # Stop the workers with the pool, each worker finishes its current job on SIGTERM.
+    # Ctrl+C already reaches the workers through the process group.
+    def stop(signum, frame):
+        for process in processes:
+            process.send_signal(signal.SIGTERM)
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    return_codes = [process.wait() for process in processes]
+    sys.exit(max(return_codes, default=0))
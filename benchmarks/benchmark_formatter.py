@@ -0,0 +1,79 @@
+"""
+Benchmark the wall time and peak memory of formatting parsed test data.
+
+Each file is parsed once, then formatted on a fresh copy of the parsed data per run.
+The peak memory is traced with tracemalloc and reported as a multiple of the size of the parsed data,
+--scale repeats the rows of the file to benchmark files larger than the test data.
+
+Usage:
+    python -m benchmarks.benchmark_formatter --path tests/data/neware --scale 20
+"""
+import os
+import time
+import logging
+import argparse
+import tracemalloc
+import pandas as pd
+from batteryabn import logger, Constants as Const
+from batteryabn.utils import Parser, Formatter
+
+
+def scale_data(data: pd.DataFrame, scale: int) -> pd.DataFrame:
+    """Repeat the rows of the data, shifting the timestamps of each repeat after the previous one."""
+    if scale <= 1:
+        return data
+    timestamp_column = next(column for column in data.columns if column.lower() == Const.TIMESTAMP)
+    timestamps = data[timestamp_column]
+    duration = timestamps.iloc[-1] - timestamps.iloc[0]
+    repeats = []
+    for i in range(scale):
+        repeat = data.copy()
+        repeat[timestamp_column] = timestamps + i * duration
+        repeats.append(repeat)
+    return pd.concat(repeats, ignore_index=True)
+
+
+def measure(data: pd.DataFrame, metadata: dict, test_type: str):
+    """Format a copy of the data and return the wall time in milliseconds and the traced peak memory in bytes."""
+    data = data.copy()
+    formatter = Formatter()
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    start = time.perf_counter()
+    formatter.format_data(data, metadata, test_type)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default=os.path.join('tests', 'data', 'neware'), help='Test data file or directory of test data files')
+    parser.add_argument('--scale', type=int, default=1, help='Number of times the rows of each file are repeated')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs per file, the best run is reported')
+    args = parser.parse_args()
+
+    # Keep the logs out of the timings
+    logger.setLevel(logging.WARNING)
+
+    if os.path.isdir(args.path):
+        file_paths = sorted(os.path.join(args.path, name) for name in os.listdir(args.path))
+    else:
+        file_paths = [args.path]
+
+    print(f'{"file":<60} {"rows":>10} {"data MB":>8} {"ms":>10} {"peak MB":>8} {"peak/data":>10}')
+    for file_path in file_paths:
+        test_parser = Parser()
+        test_parser.parse(file_path)
+        data = scale_data(test_parser.raw_test_data, args.scale)
+        size = data.memory_usage(deep=True).sum()
+        runs = [measure(data, test_parser.raw_metadata, test_parser.test_type) for _ in range(args.repeat)]
+        elapsed = min(run[0] for run in runs)
+        peak = min(run[1] for run in runs)
+        print(f'{os.path.basename(file_path)[:60]:<60} {len(data):>10} {size / 1e6:>8.1f} '
+              f'{elapsed:>10.2f} {peak / 1e6:>8.1f} {peak / size:>9.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,85 @@
+"""
+Benchmark the Vdf csv loader of the parser against the previous pandas loader.
+
+The previous loader read the rows with the default pd.read_csv type inference.
+The parser reads them with the multithreaded pyarrow csv reader and the column types declared by the units row.
+Both are run on every Vdf file found, and the values are checked to be equal.
+
+Usage:
+    python -m benchmarks.benchmark_parser --path tests/data/neware_vdf --repeat 5
+"""
+import os
+import time
+import logging
+import argparse
+import numpy as np
+import pandas as pd
+from batteryabn import logger
+from batteryabn.utils import Parser
+
+
+def read_vdf_pandas(file_path: str) -> pd.DataFrame:
+    """The previous loader: default pd.read_csv type inference on the rows after the units row."""
+    with open(file_path, 'r') as file:
+        for line in file:
+            if '[DATA START]' in line:
+                header = file.readline().rstrip('\n').split('\t')
+                units = file.readline().rstrip('\n').split('\t')
+                break
+        names = [f'{header[i]} ({units[i]})' if i < len(units) and units[i] != 'none' else header[i] for i in range(len(header))]
+        return pd.read_csv(file, delimiter='\t', header=None, names=names)
+
+
+def read_vdf_parser(file_path: str) -> pd.DataFrame:
+    """The current loader of the parser."""
+    parser = Parser()
+    parser.parse(file_path)
+    return parser.raw_test_data
+
+
+def timeit(func, repeat: int):
+    """Return the best wall time of a function in milliseconds and its last result."""
+    best, result = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000, result
+
+
+def assert_same_values(expected: pd.DataFrame, actual: pd.DataFrame):
+    """Check the loaders read the same values, within float32 precision for the downcast columns."""
+    assert list(expected.columns) == list(actual.columns), 'Columns differ'
+    assert len(expected) == len(actual), 'Row counts differ'
+    for column in expected.columns:
+        np.testing.assert_allclose(actual[column].to_numpy(np.float64), expected[column].to_numpy(np.float64),
+                                   rtol=1e-6, err_msg=column)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--path', default=os.path.join('tests', 'data', 'neware_vdf'), help='Vdf csv file or directory of Vdf csv files')
+    parser.add_argument('--repeat', type=int, default=5, help='Number of runs per loader, the best run is reported')
+    args = parser.parse_args()
+
+    # Keep the parser logs out of the timings
+    logger.setLevel(logging.WARNING)
+
+    if os.path.isdir(args.path):
+        file_paths = sorted(os.path.join(args.path, name) for name in os.listdir(args.path) if name.endswith('.csv'))
+    else:
+        file_paths = [args.path]
+
+    print(f'{"file":<60} {"rows":>10} {"MB":>8} {"pandas ms":>10} {"parser ms":>10} {"speedup":>8} {"memory":>8}')
+    for file_path in file_paths:
+        pandas_ms, expected = timeit(lambda: read_vdf_pandas(file_path), args.repeat)
+        parser_ms, actual = timeit(lambda: read_vdf_parser(file_path), args.repeat)
+        assert_same_values(expected, actual)
+        memory = actual.memory_usage(deep=True).sum() / expected.memory_usage(deep=True).sum()
+        size = os.path.getsize(file_path) / 1e6
+        print(f'{os.path.basename(file_path)[:60]:<60} {len(actual):>10} {size:>8.1f} '
+              f'{pandas_ms:>10.2f} {parser_ms:>10.2f} {pandas_ms / parser_ms:>7.1f}x {memory:>7.0%}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,179 @@
+"""
+Benchmark the stages of the processing pipeline on a synthetic cell, against tracked baselines.
+
+A synthetic cell of the given length (see benchmarks/synthetic.py) is parsed, formatted and processed,
+and each stage is timed with the timing spans of the pipeline, so the processor stages are the stages
+of Processor.process. The best of the runs of each stage is compared with the baseline of the same cell
+in benchmarks/baselines.json, and stages slower than the baseline by more than the tolerance fail the run.
+With --memory the peak memory of each stage is profiled in an extra run, and compared with its baseline as well.
+Baselines are machine specific, save them with --save-baseline on the machine the benchmark is compared on.
+
+Usage:
+    python -m benchmarks.benchmark_pipeline --cycles 20 --rpts 2 --hppc-pulses 10 --sample-rate 0.1
+    python -m benchmarks.benchmark_pipeline --cycles 200 --rpts 5 --neware --plot --memory --save-baseline
+"""
+import os
+import sys
+import json
+import logging
+import argparse
+import tempfile
+import warnings
+from collections import defaultdict
+from batteryabn import logger, Constants as Const
+from batteryabn.models import TestRecord, Project
+from batteryabn.repositories import create_test_data_repository
+from batteryabn.utils import (Parser, Formatter, Processor, Viewer, Utils, timed, enable_timing, enable_memory_profiling,
+                              read_spans)
+from benchmarks.synthetic import SyntheticCell
+
+BASELINE_FILE = os.path.join(os.path.dirname(__file__), 'baselines.json')
+# Stages are only worse than the baseline if they take this many milliseconds or MB more, to ignore the noise of small stages
+MIN_SLOWDOWN_MS = 10
+MIN_GROWTH_MB = 1
+
+
+def get_test_records(tests: list[dict]) -> dict:
+    """Format the tests of the synthetic cell into test records, with the test data in the database row."""
+    test_records = {}
+    for test in tests:
+        formatter = Formatter()
+        formatter.format_data(test['raw_test_data'].copy(), test['raw_metadata'], test['test_type'])
+        test_records[test['test_name']] = TestRecord(
+            test_name=test['test_name'], test_type=test['test_type'], test_data=Utils.gzip_pikle_dump(formatter.test_data),
+            start_time=formatter.start_time, last_update_time=formatter.last_update_time)
+    return test_records
+
+
+def run_pipeline(cell: SyntheticCell, neware_tests: list[dict], vdf_tests: list[dict], file_paths: list[str],
+                 cycler_trs: dict, vdf_trs: dict, plot: bool):
+    """Run the stages of the pipeline once, each in a timing span."""
+    for test_type, extension in [('neware', '.xlsx'), ('vdf', '.csv')]:
+        test_file_paths = [file_path for file_path in file_paths if file_path.endswith(extension)]
+        if test_file_paths:
+            with timed(f'parse {test_type}'):
+                for file_path in test_file_paths:
+                    Parser().parse(file_path)
+    for test_type, tests in [('neware', neware_tests), ('vdf', vdf_tests)]:
+        # The formatter formats in place, so it formats copies of the raw test data
+        raw_data = [test['raw_test_data'].copy() for test in tests]
+        with timed(f'format {test_type}'):
+            for test, data in zip(tests, raw_data):
+                Formatter().format_data(data, test['raw_metadata'], test['test_type'])
+    processor = Processor()
+    with timed('process'):
+        processor.process(cycler_trs, vdf_trs, Project(project_name=cell.project_name), create_test_data_repository().load)
+    if plot:
+        with timed('plot'):
+            Viewer().plot(processor.cell_data, processor.cell_cycle_metrics, processor.cell_data_vdf, cell.cell_name)
+
+
+def get_stages(file_path: str, depth: int, field: str, combine=sum) -> dict:
+    """
+    Get a field of the spans of each stage down to the depth, e.g. its duration, in the order the stages run.
+    The spans of a stage in a run are combined, e.g. summed, and the best run, with the smallest value, is reported.
+    """
+    values = defaultdict(lambda: defaultdict(list))
+    started_at = {}
+    for record in read_spans(file_path):
+        if record['depth'] <= depth:
+            values[record['path']][record['run']].append(record[field])
+            started_at.setdefault(record['path'], record['started_at'])
+    # Records are written as the stages end, so parents follow their nested stages
+    paths = sorted(values, key=lambda path: (started_at[path], path.count('/')))
+    stages = {path.split('/', 1)[1]: min(combine(runs) for runs in values[path].values()) for path in paths if '/' in path}
+    stages['total'] = min(combine(runs) for runs in values['pipeline'].values())
+    return stages
+
+
+def compare(stages: dict, baseline: dict, unit: str, tolerance: float, min_change: float) -> list[str]:
+    """Print the stages against their baseline, and return the stages above the baseline by more than the tolerance."""
+    regressions = []
+    print(f'{"stage":<60} {unit:>10} {"baseline":>10} {"change":>8}')
+    for stage, value in stages.items():
+        expected = baseline.get(stage)
+        change = f'{value / expected - 1:>+8.0%}' if expected else f'{"":>8}'
+        worse = expected is not None and value > expected * (1 + tolerance) and value - expected >= min_change
+        if worse:
+            regressions.append(f'{stage} ({unit})')
+        print(f'{stage[:60]:<60} {value:>10.1f} {expected if expected is not None else "":>10} {change}{"  worse" if worse else ""}')
+    return regressions
+
+
+def load_baselines(file_path: str) -> dict:
+    """Load the baselines of all synthetic cells, by the key of the cell."""
+    if not os.path.exists(file_path):
+        return {}
+    with open(file_path, 'r') as file:
+        return json.load(file)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cycles', type=int, default=20, help='Number of C/2 cycles of the synthetic cell')
+    parser.add_argument('--rpts', type=int, default=2, help='Number of RPTs of the synthetic cell')
+    parser.add_argument('--hppc-pulses', type=int, default=10, help='Number of pulse pairs of each HPPC')
+    parser.add_argument('--sample-rate', type=float, default=0.1, help='Sample rate of the cycler in Hz')
+    parser.add_argument('--vdf-sample-rate', type=float, default=0.2, help='Sample rate of the Vdf in Hz')
+    parser.add_argument('--neware', action='store_true', help='Also parse Neware xlsx files, which are slow to write')
+    parser.add_argument('--plot', action='store_true', help='Also plot the processed data')
+    parser.add_argument('--memory', action='store_true', help='Also profile the peak memory of the stages in an extra run')
+    parser.add_argument('--depth', type=int, default=2, help='Depth of the nested stages reported, 1 for the stages of the pipeline only')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of runs of the pipeline, the best run of each stage is reported')
+    parser.add_argument('--baseline', default=BASELINE_FILE, help='JSON file of the baselines')
+    parser.add_argument('--save-baseline', action='store_true', help='Save the durations, and the peak memory with --memory, as the baseline of the synthetic cell')
+    parser.add_argument('--tolerance', type=float, default=0.3, help='Fraction a stage can be slower, or use more memory, than its baseline')
+    args = parser.parse_args()
+
+    # Keep the logs out of the timings
+    logger.setLevel(logging.WARNING)
+    warnings.filterwarnings('ignore')
+
+    cell = SyntheticCell(args.cycles, args.rpts, args.hppc_pulses, args.sample_rate, args.vdf_sample_rate)
+    key = f'cycles={args.cycles} rpts={args.rpts} hppc_pulses={args.hppc_pulses} sample_rate={args.sample_rate} ' \
+          f'vdf_sample_rate={args.vdf_sample_rate}'
+    neware_tests, vdf_tests = cell.get_tests()
+    rows = sum(len(test['raw_test_data']) for test in neware_tests), sum(len(test['raw_test_data']) for test in vdf_tests)
+    print(f'{cell.cell_name}: {key}, {len(neware_tests)} tests, {rows[0]} cycler rows, {rows[1]} Vdf rows')
+
+    with tempfile.TemporaryDirectory() as directory:
+        file_paths = cell.write_files(directory, neware=args.neware)
+        cycler_trs, vdf_trs = get_test_records(neware_tests), get_test_records(vdf_tests)
+
+        # Time the stages with the timing spans, written to a timing file of the benchmark
+        Const.TIMING_FILE = os.path.join(directory, 'timings.jsonl')
+        enable_timing()
+        for run in range(args.repeat):
+            with timed('pipeline', run=run):
+                run_pipeline(cell, neware_tests, vdf_tests, file_paths, cycler_trs, vdf_trs, args.plot)
+        results = {'ms': get_stages(Const.TIMING_FILE, args.depth, 'duration_ms')}
+
+        # Tracing the allocations slows the stages down, so the memory is profiled in a run of its own
+        if args.memory:
+            Const.TIMING_FILE = os.path.join(directory, 'memory.jsonl')
+            enable_memory_profiling()
+            with timed('pipeline', run=0):
+                run_pipeline(cell, neware_tests, vdf_tests, file_paths, cycler_trs, vdf_trs, args.plot)
+            enable_memory_profiling(False)
+            results['peak_mb'] = get_stages(Const.TIMING_FILE, args.depth, 'peak_mb', combine=max)
+
+    baselines = load_baselines(args.baseline)
+    baseline = baselines.get(key, {})
+    regressions = compare(results['ms'], baseline.get('ms', {}), 'ms', args.tolerance, MIN_SLOWDOWN_MS)
+    if args.memory:
+        print()
+        regressions += compare(results['peak_mb'], baseline.get('peak_mb', {}), 'peak MB', args.tolerance, MIN_GROWTH_MB)
+
+    if args.save_baseline:
+        baselines.setdefault(key, {}).update({field: {stage: round(value, 1) for stage, value in stages.items()}
+                                              for field, stages in results.items()})
+        with open(args.baseline, 'w') as file:
+            json.dump(baselines, file, indent=4)
+            file.write('\n')
+        print(f'Saved the baseline of {key} to {args.baseline}')
+    elif regressions:
+        print(f'{len(regressions)} stages above the baseline by more than {args.tolerance:.0%}: {", ".join(regressions)}')
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,349 @@
+"""
+Synthetic cycler and Vdf test data of a cell, for benchmarks of the processing pipeline.
+
+The cell is tested like the cells of the projects: RPTs with C/20 dis/charges and a discharge HPPC,
+and cycling tests of C/2 cycles between them, each test a Neware file with a matching Vdf file over the same time.
+The size of the data is set by the number of cycles, RPTs and HPPC pulses and the sample rates,
+so cells of any age can be generated. The data is the same for the same parameters and seed.
+
+Usage:
+    python -m benchmarks.synthetic --cycles 20 --rpts 2 --output /tmp/synthetic_cell
+"""
+import os
+import math
+import argparse
+import numpy as np
+import pandas as pd
+from batteryabn import Constants as Const
+from batteryabn.utils import Processor
+
+
+# Resistance of the cell in ohm
+RESISTANCE = 0.03
+# Sample rate of HPPC pulses in Hz, the cycler logs pulses faster than the rest of a test
+PULSE_SAMPLE_RATE = 1
+# Seconds of rest between steps, between tests and of a HPPC pulse
+REST = 1800
+TEST_GAP = 600
+PULSE = 10
+
+VDF_HEADER = ['Datapoint Number', 'Test Time', 'Current', 'Potential', 'Timestamp', 'LDC SENSOR', 'LDC REF',
+              'Ambient Temperature', 'Ambient RH', 'LDC N', 'LDC STD', 'REF N', 'REF STD', 'LDC scaled',
+              'LDC status', 'REF status', 'DriveCurrent', 'DriveCurrentRef', 'NAHwarn', 'NAHwarnRef']
+VDF_UNITS = ['none', 'second', 'amp', 'volt', 'epoch', 'none', 'none', 'celsius', 'percent', 'none',
+             'none', 'none', 'none', 'none', 'none', 'none', 'none', 'none', 'none', 'none']
+
+
+class SyntheticCell:
+    """
+    Generator of the test data of a synthetic cell.
+
+    The tests are RPT_1, CYC_1, RPT_2, CYC_2, ..., with the cycles split evenly between the cycling tests.
+    The data of each test is returned as the parser returns it, so it can be formatted and processed,
+    or written to Neware xlsx and Vdf csv files to benchmark the parser.
+
+    Parameters
+    ----------
+    cycles : int, optional
+        Number of C/2 cycles of the cycling tests
+    rpts : int, optional
+        Number of RPTs
+    hppc_pulses : int, optional
+        Number of discharge and charge pulse pairs of the HPPC of each RPT
+    sample_rate : float, optional
+        Sample rate of the cycler in Hz, by default a sample every 10 seconds
+    vdf_sample_rate : float, optional
+        Sample rate of the Vdf in Hz, by default a sample every 5 seconds
+    project_name : str, optional
+        Project of the cell
+    cell_id : str, optional
+        Id of the cell in the project
+    seed : int, optional
+        Seed of the measurement noise
+    """
+    def __init__(self, cycles: int = 20, rpts: int = 2, hppc_pulses: int = 10, sample_rate: float = 0.1,
+                 vdf_sample_rate: float = 0.2, project_name: str = 'SYNTHETIC', cell_id: str = 'CELL001', seed: int = 0):
+        self.cycles = cycles
+        self.rpts = rpts
+        self.hppc_pulses = hppc_pulses
+        self.sample_rate = sample_rate
+        self.vdf_sample_rate = vdf_sample_rate
+        self.project_name = project_name
+        self.cell_id = cell_id
+        self.seed = seed
+        self.capacity = Const.PROJECTS_SETTING['DEFAULT']['nominal_capacity']
+        self.i_c20 = Const.I_C20
+
+    @property
+    def cell_name(self) -> str:
+        return f'{self.project_name}_{self.cell_id}'
+
+    def get_schedule(self) -> list[tuple]:
+        """
+        Get the tests of the cell in order, as (test type, procedure version, number of cycles).
+        """
+        if self.rpts == 0:
+            return [('CYC', 1, self.cycles)]
+        schedule = []
+        cycles = np.diff(np.linspace(0, self.cycles, self.rpts, endpoint=False).round().astype(int).tolist() + [self.cycles])
+        for k in range(self.rpts):
+            schedule.append(('RPT', k + 1, 0))
+            if cycles[k] > 0:
+                schedule.append(('CYC', k + 1, int(cycles[k])))
+        return schedule
+
+    def get_rpt_steps(self, soc: float) -> list[tuple]:
+        """
+        Get the steps of a RPT from a state of charge, as (seconds, current, sample rate).
+        A C/2 discharge to empty, a C/20 charge and discharge, a C/2 charge and a discharge HPPC down to 10 % SOC.
+        """
+        i_fast = self.capacity / 2
+        steps = [(REST, 0, self.sample_rate)]
+        steps.append((soc * self.capacity / i_fast * 3600, -i_fast, self.sample_rate))
+        steps.append((REST, 0, self.sample_rate))
+        steps.append((self.capacity / self.i_c20 * 3600, self.i_c20, self.sample_rate))
+        steps.append((REST, 0, self.sample_rate))
+        steps.append((self.capacity / self.i_c20 * 3600, -self.i_c20, self.sample_rate))
+        steps.append((REST, 0, self.sample_rate))
+        steps.append((self.capacity / i_fast * 3600, i_fast, self.sample_rate))
+        pulse_rate = max(self.sample_rate, PULSE_SAMPLE_RATE)
+        for _ in range(self.hppc_pulses):
+            steps.append((REST, 0, self.sample_rate))
+            steps.append((PULSE, -self.capacity, pulse_rate))
+            steps.append((4 * PULSE, 0, pulse_rate))
+            steps.append((PULSE, self.capacity / 2, pulse_rate))
+            steps.append((4 * PULSE, 0, pulse_rate))
+            steps.append((0.9 / max(self.hppc_pulses, 1) * self.capacity / i_fast * 3600, -i_fast, self.sample_rate))
+        steps.append((REST, 0, self.sample_rate))
+        return steps
+
+    def get_cycling_steps(self, soc: float, cycles: int) -> list[tuple]:
+        """
+        Get the steps of a cycling test from a state of charge, as (seconds, current, sample rate).
+        C/2 cycles between 10 % and 90 % SOC with rests.
+        """
+        i_fast = self.capacity / 2
+        steps = [(REST, 0, self.sample_rate)]
+        if soc > 0.1:
+            steps.append(((soc - 0.1) * self.capacity / i_fast * 3600, -i_fast, self.sample_rate))
+        for _ in range(cycles):
+            steps.append((0.8 * self.capacity / i_fast * 3600, i_fast, self.sample_rate))
+            steps.append((REST, 0, self.sample_rate))
+            steps.append((0.8 * self.capacity / i_fast * 3600, -i_fast, self.sample_rate))
+            steps.append((REST, 0, self.sample_rate))
+        return steps
+
+    def sample_steps(self, steps: list[tuple], soc: float, rng: np.random.Generator) -> pd.DataFrame:
+        """
+        Sample the steps of a test, with the voltage of the state of charge and noise.
+        Returns the seconds since the start of the test, the seconds since the start of the step,
+        the step index, current, voltage, state of charge and temperature of each sample.
+        """
+        times, step_times, step_idxs, currents = [], [], [], []
+        start = 0
+        for step_idx, (duration, current, rate) in enumerate(steps, start=1):
+            if duration <= 0:
+                continue
+            step_time = np.linspace(0, duration, max(2, math.ceil(duration * rate)), endpoint=False)
+            times.append(start + step_time)
+            step_times.append(step_time)
+            step_idxs.append(np.full(len(step_time), step_idx))
+            currents.append(np.full(len(step_time), current, dtype=float))
+            start += duration
+        t, step_time, step_idx, i = (np.concatenate(values) for values in (times, step_times, step_idxs, currents))
+
+        # Coulomb counting of the state of charge, clipped to the range of the OCV
+        dt = np.diff(t, prepend=t[0])
+        soc = np.clip(soc + np.cumsum(np.roll(i, 1) * dt) / 3600 / self.capacity, 0, 1)
+        v = self.get_ocv(soc) + RESISTANCE * i + rng.normal(0, 2e-4, len(t))
+        temperature = 25 + 0.5 * np.abs(i) + rng.normal(0, 0.05, len(t))
+        return pd.DataFrame({'time': t, 'step time': step_time, 'step index': step_idx, 'current': i,
+                             'voltage': v, 'soc': soc, 'temperature': temperature})
+
+    def get_ocv(self, soc: np.ndarray) -> np.ndarray:
+        """
+        Get the open circuit voltage of the state of charge, from the electrode model of the eSOH fit
+        with its initial electrode capacities and stoichiometries, so the fit converges on the synthetic RPTs.
+        """
+        return Processor().calc_opc(Const.X0, (1 - soc) * self.capacity)
+
+    def generate(self):
+        """
+        Generate the tests of the cell.
+
+        Yields
+        ------
+        tuple
+            The test type, test start as a timestamp in the default time zone and the samples of the test
+        """
+        rng = np.random.default_rng(self.seed)
+        start = pd.Timestamp('2024-01-01 08:00:00', tz=Const.DEFAULT_TIME_ZONE)
+        soc = 0.5
+        for test_type, version, cycles in self.get_schedule():
+            steps = self.get_rpt_steps(soc) if test_type == 'RPT' else self.get_cycling_steps(soc, cycles)
+            samples = self.sample_steps(steps, soc, rng)
+            yield test_type, version, start, samples
+            soc = samples['soc'].iloc[-1]
+            start = start + pd.Timedelta(seconds=samples['time'].iloc[-1] + TEST_GAP)
+
+    def get_test_name(self, test_type: str, version: int, start: pd.Timestamp, vdf: bool = False) -> str:
+        """
+        Get the name of a test following the name rules of Neware or Vdf test data.
+        """
+        name = f'{self.cell_name}_{test_type}_{version}_P25C_5P0PSI_{start:%Y%m%d}_R0_CH001'
+        return name if vdf else f'{name}_{start:%Y%m%d%H%M%S}_1_1_1_{start.value // 10**9}'
+
+    def get_tests(self) -> tuple[list[dict], list[dict]]:
+        """
+        Get the Neware and Vdf test data of the cell, each test as the parser returns it.
+
+        Returns
+        -------
+        list[dict]
+            The Neware tests, each with the test_name, test_type, raw_test_data and raw_metadata
+        list[dict]
+            The Vdf tests, each with the test_name, test_type, raw_test_data and raw_metadata
+        """
+        neware_tests, vdf_tests = [], []
+        rng = np.random.default_rng(self.seed + 1)
+        for test_type, version, start, samples in self.generate():
+            test_name = self.get_test_name(test_type, version, start)
+            neware_tests.append({
+                'test_name': test_name,
+                'test_type': Const.NEWARE,
+                'raw_test_data': to_neware(samples, start),
+                'raw_metadata': dict(zip(Const.NEWARE_NAME_KEYS, test_name.split('_'))),
+            })
+            test_name = self.get_test_name(test_type, version, start, vdf=True)
+            metadata = dict(zip(Const.VDF_NAME_KEYS, test_name.split('_')))
+            metadata.update({'Start Time': str(start.value // 10**6), 'Format Version': '3.0',
+                             'Timezone': Const.DEFAULT_TIME_ZONE, 'Channel Number': '1'})
+            vdf_tests.append({
+                'test_name': test_name,
+                'test_type': Const.VDF,
+                'raw_test_data': to_vdf(samples, start, self.vdf_sample_rate, rng),
+                'raw_metadata': metadata,
+            })
+        return neware_tests, vdf_tests
+
+    def write_files(self, directory: str, neware: bool = True) -> list[str]:
+        """
+        Write the tests of the cell to Neware xlsx and Vdf csv files.
+
+        Parameters
+        ----------
+        directory : str
+            Directory of the files, created if it does not exist
+        neware : bool, optional
+            Write the Neware xlsx files, which is slow for long tests, by default True
+
+        Returns
+        -------
+        list[str]
+            Paths of the files written
+        """
+        os.makedirs(directory, exist_ok=True)
+        neware_tests, vdf_tests = self.get_tests()
+        file_paths = []
+        for test in vdf_tests:
+            file_path = os.path.join(directory, f'{test["test_name"]}.csv')
+            write_vdf(test['raw_test_data'], test['raw_metadata'], file_path)
+            file_paths.append(file_path)
+        for test in neware_tests if neware else []:
+            file_path = os.path.join(directory, f'{test["test_name"]}.xlsx')
+            write_neware(test['raw_test_data'], file_path)
+            file_paths.append(file_path)
+        return file_paths
+
+
+def format_durations(seconds: np.ndarray) -> list[str]:
+    """Format seconds as HH:MM:SS.fff strings, as Neware logs the times."""
+    milliseconds = np.round(seconds * 1000).astype(np.int64)
+    return [f'{ms // 3600000:02d}:{ms // 60000 % 60:02d}:{ms // 1000 % 60:02d}.{ms % 1000:03d}' for ms in milliseconds.tolist()]
+
+def to_neware(samples: pd.DataFrame, start: pd.Timestamp) -> pd.DataFrame:
+    """Get the samples of a test as the parser returns Neware test data."""
+    i, v, step_time = samples['current'].to_numpy(), samples['voltage'].to_numpy(), samples['step time'].to_numpy()
+    step_capacity = np.abs(i) * step_time / 3600
+    timestamps = start.tz_localize(None) + pd.to_timedelta(samples['time'], unit='s')
+    # A cycle starts with each charge step
+    charge_starts = (i > 0) & (samples['step index'].diff().fillna(1).to_numpy() > 0)
+    return pd.DataFrame({
+        'DataPoint': np.arange(1, len(samples) + 1),
+        'Cycle Index': np.cumsum(charge_starts) + 1,
+        'Step Index': samples['step index'],
+        'Step Type': np.where(i > 0, 'CC Chg', np.where(i < 0, 'CC DChg', 'Rest')),
+        'Time': format_durations(step_time),
+        'Total Time': format_durations(samples['time'].to_numpy()),
+        'Current(A)': i,
+        'Voltage(V)': v.round(4),
+        'Capacity(Ah)': step_capacity,
+        'Chg. Cap.(Ah)': np.where(i > 0, step_capacity, 0),
+        'DChg. Cap.(Ah)': np.where(i < 0, step_capacity, 0),
+        'Energy(Wh)': step_capacity * v,
+        'Date': timestamps.dt.strftime('%Y-%m-%d %H:%M:%S'),
+        'Power(W)': i * v,
+        'T1(℃)': samples['temperature'].round(1),
+        Const.TIMESTAMP: timestamps,
+    })
+
+def to_vdf(samples: pd.DataFrame, start: pd.Timestamp, sample_rate: float, rng: np.random.Generator) -> pd.DataFrame:
+    """
+    Get the samples of a test as the parser returns Vdf test data, sampled at the Vdf sample rate.
+    The expansion grows with the state of charge.
+    """
+    duration = samples['time'].iloc[-1]
+    t = np.arange(0, duration, 1 / sample_rate) + 2.5
+    soc = np.interp(t, samples['time'], samples['soc'])
+    current = np.interp(t, samples['time'], samples['current'])
+    voltage = np.interp(t, samples['time'], samples['voltage'])
+    n = len(t)
+    names = [f'{name} ({unit})' if unit != 'none' else name for name, unit in zip(VDF_HEADER, VDF_UNITS)]
+    columns = [
+        np.arange(1, n + 1), t.round(3), current.astype(np.float32), voltage.astype(np.float32),
+        start.value // 10**6 + np.round(t * 1000).astype(np.int64),
+        (6.7e6 + 2e5 * soc + rng.normal(0, 20, n)).astype(np.int64), np.full(n, 7934310),
+        (25 + rng.normal(0, 0.05, n)).astype(np.float32), np.full(n, 48.64, dtype=np.float32),
+        np.full(n, 50), np.full(n, 6), np.full(n, 50), np.full(n, 4), np.zeros(n, dtype=np.int64),
+        np.ones(n, dtype=np.int64), np.zeros(n, dtype=np.int64), np.full(n, 12), np.zeros(n, dtype=np.int64),
+        np.zeros(n, dtype=np.int64), np.zeros(n, dtype=np.int64),
+    ]
+    return pd.DataFrame(dict(zip(names, columns)))
+
+def write_vdf(data: pd.DataFrame, metadata: dict, file_path: str):
+    """Write Vdf test data as a Vdf csv file, with the metadata, header and units rows."""
+    with open(file_path, 'w') as file:
+        for key in ['Start Time', 'Format Version', 'Timezone', 'Channel Number']:
+            file.write(f'{key}: {metadata[key]}\n')
+        file.write('[DATA START]\n')
+        file.write('\t'.join(VDF_HEADER) + '\n')
+        file.write('\t'.join(VDF_UNITS) + '\n')
+        data.to_csv(file, sep='\t', header=False, index=False, float_format='%.6g', lineterminator='\n')
+
+def write_neware(data: pd.DataFrame, file_path: str):
+    """Write Neware test data as a Neware xlsx file, with the samples in the 'record' sheet."""
+    record = data.drop(columns=[Const.TIMESTAMP])
+    # Neware files have the temperature column twice, the parser drops the second one
+    record.insert(record.columns.get_loc('T1(℃)') + 1, 't1(℃)', record['T1(℃)'])
+    with pd.ExcelWriter(file_path, engine='openpyxl') as writer:
+        record.to_excel(writer, sheet_name='record', index=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cycles', type=int, default=20, help='Number of C/2 cycles')
+    parser.add_argument('--rpts', type=int, default=2, help='Number of RPTs')
+    parser.add_argument('--hppc-pulses', type=int, default=10, help='Number of pulse pairs of each HPPC')
+    parser.add_argument('--sample-rate', type=float, default=0.1, help='Sample rate of the cycler in Hz')
+    parser.add_argument('--vdf-sample-rate', type=float, default=0.2, help='Sample rate of the Vdf in Hz')
+    parser.add_argument('--no-neware', action='store_true', help='Only write the Vdf csv files')
+    parser.add_argument('--output', required=True, help='Directory to write the test files to')
+    args = parser.parse_args()
+
+    cell = SyntheticCell(args.cycles, args.rpts, args.hppc_pulses, args.sample_rate, args.vdf_sample_rate)
+    for file_path in cell.write_files(args.output, neware=not args.no_neware):
+        print(file_path)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+import pytest
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+from flask import Flask
+from flask_injector import FlaskInjector
+from batteryabn.apis.cells import cells_bp
+from batteryabn.services import CellService
+
+@pytest.fixture
+def cell_service():
+    cell_service = MagicMock(spec=CellService)
+    cell_service.get_processed_version.return_value = ('v1', datetime(2024, 1, 1, tzinfo=timezone.utc))
+    return cell_service
+
+@pytest.fixture
+def client(cell_service):
+    app = Flask(__name__)
+    app.register_blueprint(cells_bp, url_prefix='/api/cells')
+    FlaskInjector(app=app, modules=[lambda binder: binder.bind(CellService, to=cell_service)])
+    return app.test_client()
+
+@pytest.mark.cell
+@pytest.mark.parametrize('url', ['/api/cells/MissingCell/info/latest', '/api/cells/MissingCell/data/cell_data'])
+def test_missing_cell_is_not_found_with_matching_etag(client, cell_service, url):
+    cell_service.find_cell_by_name.return_value = None
+
+    response = client.get(url, headers={'If-None-Match': '"v1"'})
+
+    assert response.status_code == 404
+
+@pytest.mark.cell
+def test_missing_image_is_not_found_with_matching_etag(client, cell_service):
+    cell_service.get_cell_imgs_paths.return_value = ['cell.png']
+
+    response = client.get('/api/cells/TestCell/images/1', headers={'If-None-Match': '"v1"'})
+
+    assert response.status_code == 404
+    cell_service.get_processed_version.assert_not_called()
+
+@pytest.mark.cell
+def test_existing_cell_is_not_modified(client, cell_service):
+    cell_service.find_cell_by_name.return_value = MagicMock()
+
+    response = client.get('/api/cells/TestCell/info/latest', headers={'If-None-Match': '"v1"'})
+
+    assert response.status_code == 304
+    cell_service.get_latest_cell_info.assert_not_called()
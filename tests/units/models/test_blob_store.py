@@ -0,0 +1,102 @@
+import os
+import pytest
+import pandas as pd
+from batteryabn.utils import (BlobStore, LocalBlobStore, BucketBlobStore, Utils, create_blob_store, configure_blob_store,
+                              register_blob_store, get_blob_store_type)
+from batteryabn.utils.blob_store import BLOB_STORES, _blob_stores
+
+
+@pytest.fixture
+def blob_store(tmp_path):
+    return LocalBlobStore(root_directory=str(tmp_path))
+
+@pytest.mark.utils
+def test_local_blob_store_write_and_read(blob_store):
+    uri = blob_store.write_bytes(b'battery data')
+
+    assert uri.startswith('local://sha256/')
+    assert blob_store.exists(uri)
+    assert blob_store.read_bytes(uri) == b'battery data'
+    assert b''.join(blob_store.iter_chunks(uri, chunk_size=4)) == b'battery data'
+    # Same content is stored once under the same URI
+    assert blob_store.write_bytes(b'battery data') == uri
+
+    blob_store.delete(uri)
+    assert not blob_store.exists(uri)
+
+@pytest.mark.utils
+def test_local_blob_store_streams_dataframe(blob_store):
+    df = pd.DataFrame({'Current(A)': [0.1, 0.2], 'Voltage(V)': [3.6, 3.7]})
+
+    uri = blob_store.write(lambda file: Utils.gzip_pickle_dump_to(df, file))
+    # Dumping the same data again gives the same content hash
+    assert blob_store.write(lambda file: Utils.gzip_pickle_dump_to(df, file)) == uri
+    with blob_store.open(uri) as file:
+        pd.testing.assert_frame_equal(Utils.gzip_pickle_load_from(file), df)
+
+@pytest.mark.utils
+def test_create_blob_store():
+    assert isinstance(create_blob_store('local://sha256/abc'), LocalBlobStore)
+    assert isinstance(create_blob_store('bucket://sha256/abc'), BucketBlobStore)
+    with pytest.raises(ValueError):
+        create_blob_store('s3://bucket/abc')
+
+@pytest.mark.utils
+def test_register_blob_store():
+    @register_blob_store
+    class MemoryBlobStore(LocalBlobStore):
+        scheme = 'memory'
+
+    try:
+        assert get_blob_store_type('memory') is MemoryBlobStore
+        assert isinstance(create_blob_store('memory://sha256/abc'), MemoryBlobStore)
+    finally:
+        del BLOB_STORES['memory'], _blob_stores['memory']
+    with pytest.raises(ValueError):
+        get_blob_store_type('memory')
+
+@pytest.mark.utils
+def test_bucket_blob_store(tmp_path):
+    blob_store = BucketBlobStore(root_directory=str(tmp_path))
+    df = pd.DataFrame({'Current(A)': [0.1, 0.2], 'Voltage(V)': [3.6, 3.7]})
+
+    uri = blob_store.write(lambda file: Utils.gzip_pickle_dump_to(df, file))
+    assert uri.startswith('bucket://sha256/')
+    assert blob_store.write(lambda file: Utils.gzip_pickle_dump_to(df, file)) == uri
+    with blob_store.open(uri) as file:
+        pd.testing.assert_frame_equal(Utils.gzip_pickle_load_from(file), df)
+    # Objects have flat keys, the bucket holds one file per object and no partial uploads
+    assert os.listdir(tmp_path) == [os.path.basename(blob_store.get_object_path(blob_store.get_key(uri)))]
+
+    blob_store.delete(uri)
+    assert not blob_store.exists(uri)
+    # Deleting a missing object is not an error
+    blob_store.delete(uri)
+    with pytest.raises(FileNotFoundError):
+        blob_store.open(uri)
+
+@pytest.mark.utils
+def test_local_blob_store_delete_many(blob_store):
+    uris = [blob_store.write_bytes(b'chunk 1'), blob_store.write_bytes(b'chunk 2')]
+
+    # A missing or invalid blob does not stop the others from being deleted
+    blob_store.delete_many(['local://invalid'] + uris)
+
+    assert not any(blob_store.exists(uri) for uri in uris)
+
+@pytest.mark.utils
+def test_configure_blob_store(tmp_path):
+    blob_store = configure_blob_store(LocalBlobStore(root_directory=str(tmp_path)))
+    try:
+        # Blobs written by the configured store are read from the same root directory
+        uri = blob_store.write_bytes(b'battery data')
+        assert create_blob_store(uri) is blob_store
+        assert create_blob_store() is blob_store
+        assert create_blob_store(uri).read_bytes(uri) == b'battery data'
+    finally:
+        configure_blob_store(LocalBlobStore())
+
+@pytest.mark.utils
+def test_blob_store_is_abstract():
+    with pytest.raises(TypeError):
+        BlobStore()
@@ -54,4 +54,29 @@ def test_parser_neware_vdf():
         assert 'ambient temperature (c)' in formatter.test_data.columns
         for key in Constants.VDF_NAME_KEYS:
             assert key in formatter.metadata
-        assert formatter.cell_name == 'GMJuly2022_CELL002'
\ No newline at end of file
+        assert formatter.cell_name == 'GMJuly2022_CELL002'
+
+@pytest.mark.formatter
+@pytest.mark.neware
+def test_formatter_append_after_tail():
+    path = os.path.join(NEWARE_PATH, 'GMJuly2022_CELL002_RPT_3_P0C_5P0PSI_20230110_R0_CH041_20230110143333_37_2_1_2818580185.xlsx')
+    parser = Parser()
+    formatter = Formatter()
+    parser.parse(path)
+    raw_test_data = parser.raw_test_data
+
+    # The formatter works in place, so each call gets its own copy of the raw data
+    full_data = formatter.format_data(raw_test_data.copy(), parser.raw_metadata, parser.test_type)
+
+    # Format the first half as if the file was stored before it grew
+    first_data = formatter.format_data(raw_test_data.iloc[:len(raw_test_data) // 2].copy(), parser.raw_metadata, parser.test_type)
+    tail = formatter.get_tail()
+
+    # Only the new rows are formatted, and the AhT integral continues from the tail
+    new_data = formatter.format_data(raw_test_data.copy(), parser.raw_metadata, parser.test_type, after=tail)
+    assert len(first_data) + len(new_data) == len(full_data)
+    assert new_data[Constants.AHT].iloc[0] >= tail['last_aht']
+    assert new_data[Constants.AHT].iloc[-1] == pytest.approx(full_data[Constants.AHT].iloc[-1])
+
+    # Nothing is left to append once the tail is at the end of the file
+    assert formatter.format_data(raw_test_data.copy(), parser.raw_metadata, parser.test_type, after=formatter.get_tail()).empty
@@ -0,0 +1,40 @@
+import tracemalloc
+import pytest
+from batteryabn.utils.memory import StageMemory, summarize_memory
+
+
+@pytest.mark.utils
+def test_stage_memory_propagates_peak_to_parent():
+    root = StageMemory()
+    parent = StageMemory(root)
+    child = StageMemory(parent)
+    data = bytearray(20_000_000)
+    del data
+    child_memory = child.stop()
+    # A sibling stage after the child allocates less, which does not lower the peak of the parent
+    sibling = StageMemory(parent)
+    data = bytearray(5_000_000)
+    del data
+    sibling_memory = sibling.stop()
+    parent_memory = parent.stop()
+    root_memory = root.stop()
+
+    assert child_memory['peak_mb'] >= 20
+    assert 5 <= sibling_memory['peak_mb'] < 20
+    assert parent_memory['peak_mb'] >= child_memory['peak_mb']
+    assert root_memory['peak_mb'] >= child_memory['peak_mb']
+    assert child_memory['retained_mb'] < 1
+    # The outermost stage stops the tracing it started
+    assert not tracemalloc.is_tracing()
+
+@pytest.mark.utils
+def test_summarize_memory():
+    records = [{'path': 'task/parse', 'peak_mb': 50.0, 'retained_mb': 1.0, 'max_rss_growth_mb': None},
+               {'path': 'task', 'peak_mb': 50.0, 'retained_mb': 2.0, 'max_rss_growth_mb': 10.0},
+               {'path': 'task/plot', 'peak_mb': 20.0, 'retained_mb': 0.0, 'max_rss_growth_mb': 0.0},
+               {'path': 'task/plot', 'peak_mb': 30.0, 'retained_mb': 0.5, 'max_rss_growth_mb': 0.0},
+               {'path': 'task/format', 'duration_ms': 1.0}]
+
+    # The nested stage that allocated a shared peak comes first, records without memory are skipped
+    assert [(stage['path'], stage['count'], stage['peak_mb']) for stage in summarize_memory(records)] == [
+        ('task/parse', 1, 50.0), ('task', 1, 50.0), ('task/plot', 2, 30.0)]
@@ -0,0 +1,81 @@
+import pytest
+from unittest.mock import MagicMock
+from batteryabn import Constants as Const
+from batteryabn.utils.metrics import MetricsRegistry, format_labels, sample_order
+
+
+@pytest.fixture
+def registry():
+    return MetricsRegistry()
+
+@pytest.fixture
+def connection():
+    # Redis connection whose pipeline adds to a hash, like HINCRBYFLOAT
+    connection = MagicMock()
+    connection.hash = {}
+    def hincrbyfloat(key, field, value):
+        assert key == Const.METRICS_KEY
+        connection.hash[field] = connection.hash.get(field, 0) + value
+    pipeline = connection.pipeline.return_value.__enter__.return_value
+    pipeline.hincrbyfloat.side_effect = hincrbyfloat
+    connection.hgetall.side_effect = lambda key: {field.encode(): str(value).encode() for field, value in connection.hash.items()}
+    return connection
+
+@pytest.mark.utils
+def test_histogram_buckets(registry):
+    observe = registry.histogram('duration', 'Duration', buckets=[1, 5])
+    for value in [0.5, 3, 10]:
+        observe(value, task='update')
+
+    samples = {(sample, labels): value for (_, sample, labels), value in registry.samples.items()}
+    assert samples[('duration_bucket', '{le="1",task="update"}')] == 1
+    assert samples[('duration_bucket', '{le="5",task="update"}')] == 2
+    assert samples[('duration_bucket', '{le="+Inf",task="update"}')] == 3
+    assert samples[('duration_sum', '{task="update"}')] == 13.5
+    assert samples[('duration_count', '{task="update"}')] == 3
+
+@pytest.mark.utils
+def test_format_labels():
+    assert format_labels({}) == ''
+    assert format_labels({'b': 1, 'a': 'x'}) == '{a="x",b="1"}'
+    assert format_labels({'path': 'C:\\data "new"\nfile'}) == '{path="C:\\\\data \\"new\\"\\nfile"}'
+
+@pytest.mark.utils
+def test_sample_order():
+    samples = [('duration_bucket', '{le="+Inf",task="a"}', 0), ('duration_bucket', '{le="10",task="a"}', 0),
+               ('duration_bucket', '{le="5",task="a"}', 0), ('duration_count', '{task="a"}', 0)]
+
+    # Buckets sort by their bound as a number, not as text
+    assert [labels for _, labels, _ in sorted(samples, key=sample_order)] == [
+        '{le="5",task="a"}', '{le="10",task="a"}', '{le="+Inf",task="a"}', '{task="a"}']
+
+@pytest.mark.utils
+def test_flush_adds_only_new_samples(registry, connection):
+    inc = registry.counter('rows', 'Rows')
+    inc(10, test_type='Arbin')
+    registry.flush(connection)
+    inc(5, test_type='Arbin')
+    registry.flush(connection)
+    # Nothing changed since the last flush
+    registry.flush(connection)
+
+    assert connection.hash == {'rows rows_total{test_type="Arbin"}': 15}
+    assert connection.pipeline.call_count == 2
+
+@pytest.mark.utils
+def test_render_merges_redis_samples(registry, connection):
+    inc = registry.counter('rows', 'Rows')
+    inc(10, test_type='Arbin')
+    connection.hash = {'rows rows_total{test_type="Arbin"}': 5, 'rows rows_total{test_type="Neware"}': 2.5}
+
+    text = registry.render(connection, gauges=[('queue_jobs', 'Jobs', {'{queue="bulk"}': 3})])
+
+    assert text.splitlines() == [
+        '# HELP rows Rows',
+        '# TYPE rows counter',
+        'rows_total{test_type="Arbin"} 15',
+        'rows_total{test_type="Neware"} 2.5',
+        '# HELP queue_jobs Jobs',
+        '# TYPE queue_jobs gauge',
+        'queue_jobs{queue="bulk"} 3',
+    ]
@@ -1,12 +1,17 @@
 import os
 import pytest
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+from unittest.mock import MagicMock, patch
 
+from batteryabn import Constants as Const
 from batteryabn.utils import Parser
 
 
 BASE_DATA_PATH = BASE_DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), 'data')
 NEWARE_PATH = os.path.join(BASE_DATA_PATH, 'neware')
 NEWARE_VDF_PATH = os.path.join(BASE_DATA_PATH, 'neware_vdf')
+BIOLOGIC_PATH = os.path.join(BASE_DATA_PATH, 'biologic')
 
 @pytest.mark.parser
 def test_bad_file_path():
@@ -46,3 +51,102 @@ def test_parser_neware_vdf():
         assert parser.test_type == 'Neware_Vdf'
         assert parser.raw_test_data.shape[0] > 0
         assert 'LDC SENSOR'.lower() in parser.raw_test_data.columns.str.lower()
+
+@pytest.mark.parser
+@pytest.mark.neware_vdf
+def test_parser_neware_vdf_offset(tmp_path):
+    path = os.path.join(NEWARE_VDF_PATH, 'GMJuly2022_CELL002_RPT_1_P0C_5P0PSI_20221011_R0_CH041.csv')
+    with open(path, 'rb') as f:
+        content = f.read()
+    parser = Parser()
+    parser.parse(path)
+    total_rows = parser.raw_test_data.shape[0]
+    assert parser.data_end_offset == len(content)
+
+    # A growing file with a partially written last row
+    growing_path = tmp_path / os.path.basename(path)
+    growing_path.write_bytes(content[:len(content) // 2])
+    parser.parse(str(growing_path))
+    head_rows = parser.raw_test_data.shape[0]
+    offset = parser.data_end_offset
+    assert 0 < head_rows < total_rows
+    assert content[offset - 1:offset] == b'\n'
+
+    # Only the appended rows are read from the offset
+    growing_path.write_bytes(content)
+    parser.parse(str(growing_path), offset=offset)
+    assert head_rows + parser.raw_test_data.shape[0] == total_rows
+    assert parser.data_end_offset == len(content)
+
+    parser.parse(str(growing_path), offset=len(content))
+    assert parser.raw_test_data.empty
+
+@pytest.mark.parser
+@pytest.mark.biologic
+def test_parser_biologic():
+    path = os.path.join(BIOLOGIC_PATH, 'GMJuly2022_CELL089_EIS_2_P25C_5P0PSI_20230118_R0_CH005_02_BCD_CA5.mpr')
+    parser = Parser()
+    parser.parse(path)
+
+    assert parser.test_type == 'BioLogic'
+    assert parser.raw_test_data.shape[0] > 0
+    assert 'I/mA' in parser.raw_test_data.columns
+    # Timestamps advance with the test time in seconds
+    timestamps = parser.raw_test_data['timestamp']
+    elapsed = (timestamps - timestamps.iloc[0]).dt.total_seconds()
+    test_time = parser.raw_test_data['time/s'] - parser.raw_test_data['time/s'].iloc[0]
+    assert abs(elapsed - test_time).max() < 1e-3
+
+@pytest.mark.parser
+@pytest.mark.neware_vdf
+def test_parser_neware_vdf_text_column(tmp_path):
+    path = os.path.join(NEWARE_VDF_PATH, 'GMJuly2022_CELL002_RPT_1_P0C_5P0PSI_20221011_R1_CH041.csv')
+    with open(path, 'r') as f:
+        lines = f.read().splitlines()
+    # Text in the last row of a column without units
+    text_row = lines[-1].split('\t')
+    text_row[14] = 'FAULT'
+    text_path = tmp_path / os.path.basename(path)
+    text_path.write_text('\n'.join(lines[:-1] + ['\t'.join(text_row)]) + '\n')
+
+    read_csv = pa_csv.read_csv
+    def read_csv_inferring_first_block(*args, convert_options=None, **kwargs):
+        # Like pyarrow versions that infer the type of a column from the first block only
+        if convert_options.column_types.get('LDC status', pa.float64()) != pa.string():
+            raise pa.ArrowInvalid("In CSV column #14: CSV conversion error to int64: invalid value 'FAULT'")
+        return read_csv(*args, convert_options=convert_options, **kwargs)
+
+    parser = Parser()
+    with patch('pyarrow.csv.read_csv', side_effect=read_csv_inferring_first_block):
+        parser.parse(str(text_path))
+
+    assert parser.raw_test_data.shape[0] == len(lines) - 7
+    assert parser.raw_test_data['LDC status'].iloc[-1] == 'FAULT'
+    # The other columns without units are converted back to numbers
+    assert parser.raw_test_data['LDC SENSOR'].dtype.kind == 'i'
+    assert parser.raw_test_data['Current (amp)'].dtype == 'float32'
+
+@pytest.mark.parser
+def test_read_cellpy_stages_files_with_the_same_name_apart(tmp_path):
+    scratch_directory = tmp_path / 'scratch'
+    file_paths = []
+    for directory in ['cell1', 'cell2']:
+        (tmp_path / directory).mkdir()
+        file_path = tmp_path / directory / 'test.res'
+        file_path.write_bytes(directory.encode())
+        file_paths.append(str(file_path))
+    staged = {}
+    def get(file_path, **kwargs):
+        with open(file_path, 'rb') as file:
+            staged[file_path] = file.read()
+        return MagicMock()
+
+    with patch.object(Const, 'CELLPY_SCRATCH_DIRECTORY', str(scratch_directory)), \
+         patch('batteryabn.utils.parser.parser.cellpy.cellreader.get', side_effect=get):
+        for file_path in file_paths:
+            Parser()._Parser__read_cellpy(file_path)
+
+    # Each file got its own scratch copy, which was removed after reading
+    assert sorted(staged.values()) == [b'cell1', b'cell2']
+    assert all(path.endswith('.res') for path in staged)
+    assert os.listdir(scratch_directory) == []
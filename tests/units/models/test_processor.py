@@ -0,0 +1,57 @@
+import pytest
+import numpy as np
+import pandas as pd
+from unittest.mock import patch
+
+from batteryabn import Constants
+from batteryabn.utils import Processor
+
+
+@pytest.mark.processor
+def test_build_data_pyramid():
+    timestamps = pd.date_range('2023-01-01', periods=7200, freq='s', tz=Constants.DEFAULT_TIME_ZONE)
+    cell_data = pd.DataFrame({
+        Constants.TIMESTAMP: timestamps,
+        Constants.VOLTAGE: np.linspace(3.0, 4.2, len(timestamps)),
+        Constants.CURRENT: np.ones(len(timestamps)),
+    })
+    processor = Processor()
+
+    pyramid = processor.build_data_pyramid(cell_data, Constants.PYRAMID_COLUMNS, buckets=[3600, 60])
+
+    assert list(pyramid.keys()) == [0, 1]
+    assert len(pyramid[0]) == 2
+    assert len(pyramid[1]) == 120
+    hourly = pyramid[0]
+    assert f'{Constants.VOLTAGE} min' in hourly.columns
+    assert f'{Constants.TEMPERATURE} mean' not in hourly.columns
+    assert hourly[f'{Constants.VOLTAGE} min'].iloc[0] == pytest.approx(3.0)
+    assert hourly[f'{Constants.VOLTAGE} max'].iloc[-1] == pytest.approx(4.2)
+    assert hourly.index[0] == timestamps[0].value // 10**6
+
+@pytest.mark.processor
+def test_build_data_pyramid_vdf_epoch_ms():
+    cell_data_vdf = pd.DataFrame({
+        Constants.TIMESTAMP: np.arange(0, 120_000, 1000, dtype=np.float64),
+        Constants.EXPANSION: np.arange(120, dtype=np.float64),
+    })
+    processor = Processor()
+
+    pyramid = processor.build_data_pyramid(cell_data_vdf, Constants.PYRAMID_COLUMNS_VDF, buckets=[60])
+
+    assert pyramid[0].index.tolist() == [0, 60_000]
+    assert pyramid[0][f'{Constants.EXPANSION} mean'].tolist() == [29.5, 89.5]
+
+@pytest.mark.processor
+def test_process_without_cycler_data_clears_processed_data():
+    processor = Processor()
+    processor.cell_data = pd.DataFrame({Constants.VOLTAGE: [3.7]})
+    processor.cell_data_pyramid = {0: pd.DataFrame()}
+    processor.cell_data_vdf_pyramid = {0: pd.DataFrame()}
+
+    with patch.object(processor, 'process_cycler_data', return_value=(None, None)):
+        assert not processor.process({}, {}, load_test_data=lambda tr: pd.DataFrame())
+
+    # Nothing of the cell processed before is left
+    assert processor.cell_data.empty
+    assert processor.cell_data_pyramid == {} and processor.cell_data_vdf_pyramid == {}
@@ -0,0 +1,79 @@
+import pytest
+from unittest.mock import patch
+from batteryabn import Constants as Const
+from batteryabn.utils import timed, enable_timing, read_spans, summarize_spans
+from batteryabn.utils.timing import write_spans
+
+
+@pytest.fixture
+def timing_file(tmp_path):
+    file_path = str(tmp_path / 'timings.jsonl')
+    with patch.object(Const, 'TIMING_FILE', file_path):
+        enable_timing()
+        try:
+            yield file_path
+        finally:
+            enable_timing(False)
+
+@pytest.mark.utils
+def test_timed_nested_spans(timing_file):
+    with timed('task', cell_name='CELL1'):
+        with timed('parse', test_type='Arbin'):
+            with timed('read'):
+                pass
+        with pytest.raises(ValueError), timed('process'):
+            raise ValueError('failed stage')
+
+    records = {record['path']: record for record in read_spans()}
+    # Records are written when the outermost span ends, nested stages first
+    assert list(records) == ['task/parse/read', 'task/parse', 'task/process', 'task']
+    assert [record['depth'] for record in records.values()] == [2, 1, 1, 0]
+    assert records['task/process']['failed'] and not records['task']['failed']
+    # Nested spans inherit the attributes of the spans they are in
+    assert records['task']['job_id'] is None
+    assert records['task/parse/read']['cell_name'] == 'CELL1'
+    assert records['task/parse/read']['test_type'] == 'Arbin'
+    assert 'test_type' not in records['task/process']
+
+@pytest.mark.utils
+def test_timed_disabled(tmp_path):
+    file_path = str(tmp_path / 'timings.jsonl')
+    with patch.object(Const, 'TIMING_FILE', file_path), timed('task'):
+        pass
+
+    assert read_spans(file_path) == []
+
+@pytest.mark.utils
+def test_read_spans_filters(timing_file):
+    for cell_name in ['CELL1', 'CELL2']:
+        with timed('task', cell_name=cell_name):
+            pass
+    with open(timing_file, 'a') as file:
+        file.write('{"path": "task", "truncated\n')
+
+    assert [record['cell_name'] for record in read_spans()] == ['CELL1', 'CELL2']
+    assert [record['cell_name'] for record in read_spans(cell_name='CELL2')] == ['CELL2']
+    # Filters that are None are ignored
+    assert len(read_spans(cell_name=None)) == 2
+    assert read_spans(cell_name='CELL3') == []
+
+@pytest.mark.utils
+def test_summarize_spans():
+    records = [{'path': 'task', 'duration_ms': 30.0}, {'path': 'task', 'duration_ms': 10.0},
+               {'path': 'task/parse', 'duration_ms': 35.0}]
+
+    assert summarize_spans(records) == [
+        {'path': 'task', 'count': 2, 'total_ms': 40.0, 'mean_ms': 20.0, 'max_ms': 30.0},
+        {'path': 'task/parse', 'count': 1, 'total_ms': 35.0, 'mean_ms': 35.0, 'max_ms': 35.0},
+    ]
+
+@pytest.mark.utils
+def test_write_spans_rotates_file(tmp_path):
+    file_path = str(tmp_path / 'timings.jsonl')
+    write_spans([{'path': 'task', 'run': 0}], file_path, max_bytes=50)
+    write_spans([{'path': 'task', 'run': 1}], file_path, max_bytes=50)
+    # The file reached the limit, so it is rotated before the next write
+    write_spans([{'path': 'task', 'run': 2}], file_path, max_bytes=50)
+
+    assert [record['run'] for record in read_spans(f'{file_path}.1')] == [0, 1]
+    assert [record['run'] for record in read_spans(file_path)] == [2]
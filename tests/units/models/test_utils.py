@@ -27,4 +27,32 @@ def test_utils_drop_empty_rows():
         'A': [1.0, 2.0],
         'B': [None, None],
         'C': ['a', 'b'],
-    })), 'New DataFrame should equal expected DataFrame'
\ No newline at end of file
+    })), 'New DataFrame should equal expected DataFrame'
+
+@pytest.mark.utils
+def test_utils_iter_df_chunks():
+    test_df = pd.DataFrame({
+        'A': [1, 2, 3],
+        'B': ['a', 'b', 'c'],
+    })
+    ndjson_chunks = list(Utils.iter_df_chunks(test_df, 'ndjson', chunk_size=2))
+    assert len(ndjson_chunks) == 2, 'Should yield one chunk per 2 rows'
+    assert ''.join(ndjson_chunks).splitlines() == ['{"A":1,"B":"a"}', '{"A":2,"B":"b"}', '{"A":3,"B":"c"}']
+
+    csv_chunks = list(Utils.iter_df_chunks(test_df, 'csv', chunk_size=2))
+    assert ''.join(csv_chunks) == 'A,B\n1,a\n2,b\n3,c\n', 'CSV header should only be written once'
+
+    with pytest.raises(ValueError):
+        list(Utils.iter_df_chunks(test_df, 'xml'))
+
+@pytest.mark.utils
+def test_utils_time_str_series_to_seconds():
+    t_series = pd.Series(['00:34:18.000', '288:21:32.500', '1:00:00.001', '10000:59:59.999'])
+    expected = pd.to_timedelta(t_series).to_numpy()
+    assert (Utils.time_str_series_to_timedelta(t_series) == expected).all()
+    assert Utils.time_str_series_to_seconds(t_series).tolist() == [2058, 1038092, 3600, 36003599]
+
+    # Other formats fall back to pd.to_timedelta
+    other_series = pd.Series(['00:34:18', '1 days 00:00:00.5', None])
+    assert pd.isna(Utils.time_str_series_to_timedelta(other_series)[-1])
+    assert Utils.time_str_series_to_timedelta(other_series)[:2].tolist() == pd.to_timedelta(other_series)[:2].to_numpy().tolist()
@@ -1,5 +1,9 @@
 import pytest
 from unittest.mock import MagicMock, patch
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from batteryabn.extensions import db
+from batteryabn.repositories import ProjectRepository, TestRecordRepository
 from batteryabn.repositories.cell_repository import CellRepository
 from batteryabn.models import Cell
 
@@ -30,3 +34,29 @@ def test_create_cell(mock_session):
 
     assert created_cell.cell_name == cell_name
     mock_session.add.assert_called_once_with(created_cell)
+
+@pytest.fixture
+def sqlite_session():
+    # In-memory database, for queries whose result is computed by the database
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+@pytest.mark.cell
+def test_summarize_by_project_start_time(sqlite_session):
+    ProjectRepository(sqlite_session).upsert(['PROJ'])
+    CellRepository(sqlite_session).upsert([{'cell_name': 'CELL', 'project_name': 'PROJ'}])
+    test_record_repository = TestRecordRepository(sqlite_session)
+    row = {'test_name': 'CELL_CYC', 'test_type': 'Neware', 'cell_name': 'CELL', 'size': 100, 'test_data_uri': None,
+           'test_data_chunks': None, 'test_data': None, 'test_metadata': None, 'start_time': 1000, 'last_update_time': 2000}
+    test_record_repository.upsert([row])
+    # Appending a chunk keeps the start time of the test record
+    test_record_repository.upsert([dict(row, size=200, start_time=None, last_update_time=3000)])
+    sqlite_session.commit()
+
+    summary, = CellRepository(sqlite_session).summarize_by_project('PROJ')
+
+    assert summary.start_time == 1000
+    assert summary.last_update_time == 3000
+    assert summary.test_count == 1
@@ -0,0 +1,20 @@
+import pytest
+from batteryabn.repositories.filesystem_repository import FileSystemRepository
+
+@pytest.fixture
+def filesystem_repository(tmp_path):
+    filesystem_repository = FileSystemRepository()
+    filesystem_repository.root_directory = str(tmp_path)
+    return filesystem_repository
+
+@pytest.mark.cell
+def test_get_processed_version(filesystem_repository):
+    # Cell has not been processed
+    assert filesystem_repository.get_processed_version('Project', 'Cell') == (None, None)
+
+    filesystem_repository.save_processed_version('Project', 'Cell')
+    version, last_modified = filesystem_repository.get_processed_version('Project', 'Cell')
+    assert version is not None
+    assert last_modified.tzinfo is not None
+    # Version is stable until the cell is processed again
+    assert filesystem_repository.get_processed_version('Project', 'Cell') == (version, last_modified)
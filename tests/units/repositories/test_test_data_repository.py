@@ -0,0 +1,66 @@
+import pytest
+import pandas as pd
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from batteryabn.extensions import db
+from batteryabn.models import TestRecord
+from batteryabn.repositories import TestDataRepository, TestRecordRepository
+from batteryabn.utils import LocalBlobStore, BucketBlobStore, Utils, configure_blob_store
+
+@pytest.fixture
+def blob_store(tmp_path):
+    return LocalBlobStore(root_directory=str(tmp_path))
+
+@pytest.fixture
+def test_data_repository(blob_store):
+    return TestDataRepository(blob_store)
+
+@pytest.fixture
+def session():
+    engine = create_engine('sqlite://')
+    db.metadata.create_all(engine)
+    with Session(engine) as session:
+        yield session
+
+def save_blob(blob_store, df):
+    return blob_store.write(lambda file: Utils.gzip_pickle_dump_to(df, file))
+
+@pytest.mark.testrecord
+def test_load_chunked_test_data(blob_store, test_data_repository):
+    chunks = [pd.DataFrame({'timestamp': [1.0, 2.0]}), pd.DataFrame({'timestamp': [3.0]})]
+    uris = [save_blob(blob_store, chunk) for chunk in chunks]
+    test_record = TestRecord(test_name='TR1', test_data_uri=uris[0], test_data_chunks=[{'uri': uri} for uri in uris])
+
+    pd.testing.assert_frame_equal(test_data_repository.load(test_record), pd.concat(chunks))
+
+@pytest.mark.testrecord
+def test_load_test_data_of_other_store_and_database_row(tmp_path, test_data_repository):
+    df = pd.DataFrame({'timestamp': [1.0, 2.0]})
+    bucket_store = configure_blob_store(BucketBlobStore(root_directory=str(tmp_path / 'bucket')))
+    try:
+        # A blob URI is read from the store of its scheme
+        test_record = TestRecord(test_name='TR1', test_data_uri=save_blob(bucket_store, df))
+        pd.testing.assert_frame_equal(test_data_repository.load(test_record), df)
+    finally:
+        configure_blob_store(LocalBlobStore())
+    # Test records saved before the blob store keep the test data in the database row
+    test_record = TestRecord(test_name='TR2', test_data=Utils.gzip_pikle_dump(df))
+    pd.testing.assert_frame_equal(test_data_repository.load(test_record), df)
+
+@pytest.mark.testrecord
+def test_load_test_data_in_bulk(session, blob_store, test_data_repository):
+    dfs = [pd.DataFrame({'timestamp': [1.0]}), pd.DataFrame({'timestamp': [2.0]})]
+    session.add_all([TestRecord(test_name='TR2', test_type='Arbin', cell_name='CELL1', start_time=2, test_data_uri=save_blob(blob_store, dfs[1])),
+                     TestRecord(test_name='TR1', test_type='Arbin', cell_name='CELL1', start_time=1, test_data_uri=save_blob(blob_store, dfs[0])),
+                     TestRecord(test_name='TR3', test_type='Arbin', cell_name='CELL2', start_time=1)])
+    session.commit()
+    session.expunge_all()
+
+    rows = TestRecordRepository(session).find_test_data_by_cell_name('cell1')
+
+    # Rows of the columns, not TestRecord objects, in the order the tests started
+    assert [row.test_name for row in rows] == ['TR1', 'TR2']
+    assert not any(isinstance(row, TestRecord) for row in rows)
+    assert len(session.identity_map) == 0
+    for row, df in zip(rows, dfs):
+        pd.testing.assert_frame_equal(test_data_repository.load(row), df)
@@ -38,3 +38,16 @@ def test_find_by_cell_name(mock_session, test_record_repository):
 
     assert result == mock_return_value
     mock_session.query(TestRecord).filter_by.assert_called_with(cell_name="Cell 1")
+
+@pytest.mark.testrecord
+def test_find_unreferenced_uris(mock_session, test_record_repository):
+    # Rows referencing any of the URIs, as their test data or a chunk
+    mock_session.query.return_value.filter.return_value.all.return_value = [
+        ("local://sha256/a", [{"uri": "local://sha256/a"}, {"uri": "local://sha256/b"}]),
+        ("local://sha256/c", None),
+    ]
+
+    result = test_record_repository.find_unreferenced_uris(["local://sha256/b", "local://sha256/c", "local://sha256/d"])
+
+    assert result == ["local://sha256/d"]
+    assert test_record_repository.find_unreferenced_uris([]) == []
@@ -0,0 +1,39 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from batteryabn.models import Cell
+from batteryabn.repositories import CellRepository, TestRecordRepository, ProjectRepository, FileSystemRepository
+from batteryabn.services.cell_service import CellService
+from batteryabn.utils import BlobStore, Processor, Viewer
+
+@pytest.fixture
+def cell_service():
+    return CellService(cell_repository=MagicMock(spec=CellRepository), test_record_repository=MagicMock(spec=TestRecordRepository),
+                       project_repository=MagicMock(spec=ProjectRepository), filesystem_repository=MagicMock(spec=FileSystemRepository),
+                       blob_store=MagicMock(spec=BlobStore))
+
+@pytest.mark.cell
+def test_get_processed_version_of_missing_cell(cell_service):
+    cell_service.cell_repository.find_by_name.return_value = None
+
+    assert cell_service.get_processed_version("MissingCell") == (None, None)
+    cell_service.filesystem_repository.get_processed_version.assert_not_called()
+
+@pytest.mark.cell
+def test_get_processed_version_of_cell_without_project(cell_service):
+    cell_service.cell_repository.find_by_name.return_value = Cell(cell_name="TESTCELL")
+
+    assert cell_service.get_processed_version("TestCell") == (None, None)
+    cell_service.filesystem_repository.get_processed_version.assert_not_called()
+
+@pytest.mark.cell
+def test_process_cell_without_cycler_data_saves_nothing(cell_service):
+    cell_service.cell_repository.find_by_name.return_value = Cell(cell_name="TESTCELL")
+    processor = MagicMock(spec=Processor)
+    processor.process.return_value = False
+    viewer = MagicMock(spec=Viewer)
+
+    with patch.object(cell_service, 'get_cycler_vdf_trs', return_value=({}, {})):
+        cell_service.process_cell("TestCell", processor, viewer)
+
+    viewer.plot.assert_not_called()
+    assert cell_service.filesystem_repository.method_calls == []
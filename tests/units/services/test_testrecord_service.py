@@ -1,9 +1,10 @@
 import pytest
+import pandas as pd
 from unittest.mock import MagicMock, patch
 from batteryabn.models import TestRecord, Cell
-from batteryabn.repositories import CellRepository, TestRecordRepository
+from batteryabn.repositories import CellRepository, TestRecordRepository, ProjectRepository
 from batteryabn.services.testrecord_service import TestRecordService
-from batteryabn.utils import Parser, Formatter
+from batteryabn.utils import Parser, Formatter, BlobStore
 
 # Mocking the dependencies of the TestRecordService
 @pytest.fixture
@@ -15,8 +16,19 @@ def test_record_repository_mock():
     return MagicMock(spec=TestRecordRepository)
 
 @pytest.fixture
-def test_record_service(cell_repository_mock, test_record_repository_mock):
-    return TestRecordService(cell_repository=cell_repository_mock, test_record_repository=test_record_repository_mock)
+def project_repository_mock():
+    return MagicMock(spec=ProjectRepository)
+
+@pytest.fixture
+def blob_store_mock():
+    blob_store = MagicMock(spec=BlobStore)
+    blob_store.write.return_value = "local://sha256/0"
+    return blob_store
+
+@pytest.fixture
+def test_record_service(cell_repository_mock, test_record_repository_mock, project_repository_mock, blob_store_mock):
+    return TestRecordService(cell_repository=cell_repository_mock, test_record_repository=test_record_repository_mock, 
+                             project_repository=project_repository_mock, blob_store=blob_store_mock)
 
 @pytest.fixture
 def parser_mock():
@@ -29,6 +41,7 @@ def parser_mock():
 def formatter_mock():
     formatter = MagicMock(spec=Formatter)
     formatter.cell_name = "TestCell"
+    formatter.start_time = 0
     return formatter
 
 @pytest.fixture
@@ -91,3 +104,101 @@ def test_find_test_records_by_cell_name(test_record_service, test_record_reposit
 
     test_record_repository_mock.find_by_cell_name.assert_called_once_with(cell_name)
     assert result == mock_test_records
+
+
+@pytest.mark.testrecord
+def test_save_trs_in_batches(test_record_service, test_record_repository_mock, parser_mock, formatter_mock):
+    files = ["Cell_Old.csv", "Cell_New1.csv", "Cell_New2.csv", "Cell_New3.csv"]
+    parser_mock.identify.side_effect = lambda file: (file[:-4], "Neware", 100)
+    def parse(file, offset=None):
+        parser_mock.test_name, parser_mock.test_type, parser_mock.test_size = parser_mock.identify(file)
+    parser_mock.parse.side_effect = parse
+    parser_mock.raw_test_data, parser_mock.raw_metadata, parser_mock.data_end_offset = None, None, None
+    formatter_mock.metadata = {"Project Name": "TestProject"}
+    formatter_mock.test_data = pd.DataFrame({"timestamp": [1.0], "current": [0.0], "aht": [0.0]})
+    formatter_mock.get_tail.return_value = {"last_timestamp": 1.0, "last_current": 0.0, "last_aht": 0.0}
+    formatter_mock.last_update_time = 1
+    # The old test record is up-to-date and should not be parsed
+    test_record_repository_mock.find_versions_by_names.return_value = [("Cell_Old", "Neware", 100, 1, None)]
+
+    saved = test_record_service.save_trs_in_batches(files, parser_mock, formatter_mock, batch_size=2)
+
+    assert saved == 3
+    test_record_repository_mock.find_versions_by_names.assert_called_once()
+    assert parser_mock.parse.call_count == 3
+    # One upsert and one commit per batch
+    assert test_record_repository_mock.upsert.call_count == 2
+    assert test_record_repository_mock.commit.call_count == 2
+    saved_names = [row["test_name"] for call in test_record_repository_mock.upsert.call_args_list for row in call.args[0]]
+    assert saved_names == ["Cell_New1", "Cell_New2", "Cell_New3"]
+
+
+@pytest.mark.testrecord
+def test_save_tr_batch_without_new_rows(test_record_service, test_record_repository_mock, blob_store_mock, parser_mock, formatter_mock):
+    parser_mock.identify.return_value = ("Cell_Vdf", "Vdf", 200)
+    parser_mock.raw_test_data, parser_mock.raw_metadata, parser_mock.test_size, parser_mock.data_end_offset = None, None, 200, None
+    formatter_mock.metadata = {}
+    formatter_mock.test_data = pd.DataFrame()
+    chunks = [{"uri": "local://sha256/1", "rows": 10, "offset": 100}]
+    versions = {("Cell_Vdf", "Vdf"): (100, 1, chunks)}
+
+    saved = test_record_service.save_tr_batch(["Cell_Vdf.csv"], parser_mock, formatter_mock, versions)
+
+    # The size of the test record is updated, but its test data did not change
+    assert saved == 0
+    blob_store_mock.write.assert_not_called()
+    row, = test_record_repository_mock.upsert.call_args.args[0]
+    assert row["size"] == 200
+    assert row["test_data_chunks"] == chunks
+    # The upsert keeps the stored start time
+    assert row["start_time"] is None
+
+
+@pytest.mark.testrecord
+def test_delete_test_record_deletes_unreferenced_blobs(test_record_service, test_record_repository_mock, blob_store_mock):
+    test_record = TestRecord(test_name="TestRecord1", test_type="Arbin", test_data_uri="local://sha256/a", 
+                             test_data_chunks=[{"uri": "local://sha256/a"}])
+    test_record_repository_mock.find_by_name.return_value = test_record
+    test_record_repository_mock.find_unreferenced_uris.return_value = ["local://sha256/a"]
+
+    test_record_service.delete_test_record("TestRecord1", "Arbin")
+
+    test_record_repository_mock.delete.assert_called_once_with(test_record)
+    test_record_repository_mock.find_unreferenced_uris.assert_called_once_with(["local://sha256/a"])
+    blob_store_mock.delete_many.assert_called_once_with(["local://sha256/a"])
+
+@pytest.mark.testrecord
+def test_save_tr_batch_deletes_replaced_blobs(test_record_service, test_record_repository_mock, blob_store_mock, parser_mock, formatter_mock):
+    parser_mock.identify.return_value = ("Cell_Arbin", "Arbin", 200)
+    parser_mock.raw_test_data, parser_mock.raw_metadata, parser_mock.test_size, parser_mock.data_end_offset = None, None, 200, None
+    formatter_mock.metadata = {}
+    formatter_mock.test_data = pd.DataFrame({"timestamp": [1.0, 2.0]})
+    formatter_mock.get_tail.return_value = None
+    formatter_mock.last_update_time = 2
+    versions = {("Cell_Arbin", "Arbin"): (100, 1, [{"uri": "local://sha256/old", "rows": 1}])}
+    test_record_repository_mock.find_unreferenced_uris.side_effect = lambda uris: uris
+
+    saved = test_record_service.save_tr_batch(["Cell_Arbin.res"], parser_mock, formatter_mock, versions)
+
+    assert saved == 1
+    row, = test_record_repository_mock.upsert.call_args.args[0]
+    assert row["start_time"] == 0
+    # The old blob is only deleted after the new test data is committed
+    test_record_repository_mock.commit.assert_called_once()
+    blob_store_mock.delete_many.assert_called_once_with(["local://sha256/old"])
+
+@pytest.mark.testrecord
+def test_iter_test_data_by_cell_name(test_record_service, test_record_repository_mock, blob_store_mock):
+    df = pd.DataFrame({"timestamp": [1.0, 2.0]})
+    rows = [MagicMock(test_name="TR1", test_type="Arbin", test_data_uri="local://sha256/a", test_data_chunks=None, test_data=None),
+            MagicMock(test_name="TR2", test_type="Arbin", test_data_uri=None, test_data_chunks=None, test_data=None)]
+    test_record_repository_mock.find_test_data_by_cell_name.return_value = rows
+    blob_store_mock.scheme = "local"
+
+    with patch("batteryabn.repositories.test_data_repository.Utils.gzip_pickle_load_from", return_value=df):
+        data = list(test_record_service.iter_test_data_by_cell_name("TestCell"))
+
+    # The test record without test data is skipped
+    assert [(test_name, test_type) for test_name, test_type, _ in data] == [("TR1", "Arbin")]
+    pd.testing.assert_frame_equal(data[0][2], df)
+    blob_store_mock.open.assert_called_once_with("local://sha256/a")
@@ -0,0 +1,249 @@
+import pytest
+from unittest.mock import MagicMock, patch
+from rq.job import Job, JobStatus
+from rq.exceptions import NoSuchJobError
+from batteryabn import tasks, Constants as Const
+
+
+def make_job(job_id, status=JobStatus.QUEUED, origin='interactive', meta=None):
+    job = MagicMock(spec=Job)
+    job.id = job_id
+    job.origin = origin
+    job.meta = meta or {}
+    job.get_status.return_value = status
+    job.enqueued_at = job.started_at = job.ended_at = None
+    job.description = f'Job {job_id}'
+    job.dependency_ids = []
+    return job
+
+@pytest.fixture
+def rq_mock():
+    with patch.object(tasks, 'rq') as rq:
+        yield rq
+
+@pytest.fixture
+def jobs():
+    """Jobs by id, as stored in Redis."""
+    jobs = {}
+    with patch.object(Job, 'fetch_many', side_effect=lambda job_ids, connection: [jobs.get(job_id) for job_id in job_ids]):
+        yield jobs
+
+@pytest.fixture
+def queues(rq_mock, jobs):
+    """Task queues by name, enqueue_call adds a job deferred if it depends on other jobs, queued otherwise."""
+    queues = {}
+    for name in Const.TASK_QUEUES:
+        queue = MagicMock()
+        queue.name = name
+        def enqueue_call(task, job_id, depends_on=None, queue=queue, **kwargs):
+            jobs[job_id] = make_job(job_id, status=JobStatus.DEFERRED if depends_on else JobStatus.QUEUED, origin=queue.name)
+            jobs[job_id].depends_on = depends_on
+            jobs[job_id].dependency_ids = depends_on.dependencies if depends_on else []
+            return jobs[job_id]
+        queue.enqueue_call.side_effect = enqueue_call
+        queues[name] = queue
+    rq_mock.get_queue.side_effect = lambda name: queues[name]
+    return queues
+
+@pytest.fixture
+def task_mock():
+    task = MagicMock()
+    task.helper.timeout = 60
+    return task
+
+def enqueue(task, priority='interactive'):
+    return tasks.enqueue_unique(task, 'update_trs', 'TestCell', 'TestCell', priority=priority)
+
+@pytest.mark.tasks
+def test_get_task_status_of_job_in_named_queue(rq_mock):
+    job = make_job('update_trs:TestCell', origin='bulk')
+    with patch.object(Job, 'fetch', return_value=job) as fetch:
+        details = tasks.get_task_status(job.id)
+
+    # The job is fetched by its id from any queue, not from the default queue
+    fetch.assert_called_once_with(job.id, connection=rq_mock.connection)
+    rq_mock.get_queue.assert_not_called()
+    assert details['id'] == job.id
+    assert details['queue'] == 'bulk'
+    assert details['status'] == JobStatus.QUEUED
+    assert 'children' not in details
+
+@pytest.mark.tasks
+def test_get_task_status_of_missing_job(rq_mock):
+    with patch.object(Job, 'fetch', side_effect=NoSuchJobError):
+        assert tasks.get_task_status('missing') is None
+
+@pytest.mark.tasks
+def test_get_task_status_of_children(rq_mock):
+    job = make_job('update_project', status=JobStatus.FINISHED, meta={'child_ids': ['a', 'b', 'c']})
+    children = [make_job('a', status=JobStatus.FINISHED), make_job('b', status=JobStatus.FAILED), None]
+    with patch.object(Job, 'fetch', return_value=job), patch.object(Job, 'fetch_many', return_value=children):
+        details = tasks.get_task_status(job.id)
+
+    assert details['children'] == {"total": 3, "counts": {'finished': 1, 'failed': 1, 'unknown': 1}, "status": 'failed'}
+
+@pytest.mark.tasks
+def test_request_processing_keeps_highest_priority():
+    job = make_job('update_trs:TestCell')
+    tasks.request_processing(job, 'bulk')
+    tasks.request_processing(job, 'interactive')
+    tasks.request_processing(job, 'bulk')
+
+    assert job.meta == {'process': 'interactive'}
+    assert job.save_meta.call_count == 2
+
+@pytest.mark.tasks
+@pytest.mark.parametrize('meta, saved, processed', [
+    ({'process': 'bulk'}, 2, True),
+    ({'process': 'bulk'}, 0, False),
+    ({}, 2, False),
+])
+def test_process_if_changed(meta, saved, processed):
+    job = make_job('update_trs:TestCell', status=JobStatus.STARTED, meta=meta)
+    job.get_meta.return_value = meta
+    with patch.object(tasks, 'get_current_job', return_value=job), \
+         patch.object(tasks, 'enqueue_unique', return_value=make_job('process_cell:TestCell')) as enqueue_unique:
+        tasks.process_if_changed('TestCell', saved)
+
+    if processed:
+        enqueue_unique.assert_called_once()
+        assert enqueue_unique.call_args.kwargs['priority'] == 'bulk'
+        assert enqueue_unique.call_args.kwargs['after_tasks'] == tasks.UPDATE_TASK_NAMES
+        assert job.meta['process_id'] == 'process_cell:TestCell'
+    else:
+        enqueue_unique.assert_not_called()
+        assert 'process_id' not in job.meta
+
+@pytest.mark.tasks
+def test_enqueue_unique_coalesces_into_queued_job(queues, task_mock):
+    job = enqueue(task_mock)
+
+    assert job.id == 'update_trs:TestCell'
+    assert enqueue(task_mock) is job
+    queues['interactive'].enqueue_call.assert_called_once()
+
+@pytest.mark.tasks
+def test_enqueue_unique_reruns_after_running_job(queues, task_mock):
+    job = enqueue(task_mock)
+    job.get_status.return_value = JobStatus.STARTED
+
+    rerun = enqueue(task_mock)
+
+    assert rerun.id == 'update_trs:TestCell:rerun'
+    assert rerun.depends_on.dependencies == [job.id]
+    # The rerun only runs if the running job finishes
+    assert not rerun.depends_on.allow_failure
+    # A third request is coalesced into the waiting rerun
+    assert enqueue(task_mock) is rerun
+    assert queues['interactive'].enqueue_call.call_count == 2
+
+@pytest.mark.tasks
+def test_enqueue_unique_replaces_job_blocked_by_failed_job(rq_mock, queues, task_mock):
+    job = enqueue(task_mock)
+    job.get_status.return_value = JobStatus.STARTED
+    rerun = enqueue(task_mock)
+    job.get_status.return_value = JobStatus.FAILED
+
+    # The rerun stays deferred, and its status shows the failed job it waits for
+    details = tasks.get_job_details(rerun)
+    assert details['status'] == JobStatus.DEFERRED
+    assert details['blocked_by'] == [job.id]
+
+    new_job = enqueue(task_mock)
+
+    rerun.delete.assert_called_once()
+    job.delete.assert_called_once()
+    assert new_job.id == job.id
+    assert new_job.depends_on is None
+
+@pytest.mark.tasks
+def test_enqueue_unique_reuses_id_of_ended_job(queues, task_mock):
+    job = enqueue(task_mock)
+    job.get_status.return_value = JobStatus.FINISHED
+
+    new_job = enqueue(task_mock)
+
+    job.delete.assert_called_once()
+    assert new_job is not job
+    assert new_job.id == job.id
+    assert new_job.depends_on is None
+
+@pytest.mark.tasks
+def test_enqueue_unique_moves_bulk_job_on_interactive_request(queues, task_mock):
+    job = enqueue(task_mock, priority='bulk')
+    queues['bulk'].remove.return_value = True
+
+    assert enqueue(task_mock) is job
+    queues['bulk'].remove.assert_called_once_with(job)
+    queues['interactive'].enqueue_job.assert_called_once_with(job, at_front=False)
+    # A bulk request leaves the job where it is
+    queues['bulk'].remove.reset_mock()
+    enqueue(task_mock, priority='bulk')
+    queues['bulk'].remove.assert_not_called()
+
+
+class FakeRegistry:
+    """Job registry of a queue, with its job ids sorted oldest first."""
+    def __init__(self, key, job_ids):
+        self.key = key
+        self.job_ids = list(job_ids)
+
+    @property
+    def count(self):
+        return len(self.job_ids)
+
+    def get_job_ids(self, start=0, end=-1, desc=False, cleanup=True):
+        job_ids = self.job_ids[::-1] if desc else self.job_ids
+        return job_ids[start:end + 1 if end != -1 else None]
+
+def make_queue(name, queued=(), started=(), finished=(), failed=()):
+    queue = MagicMock()
+    queue.name = name
+    queue.get_job_ids.return_value = list(queued)
+    queue.started_job_registry = FakeRegistry(f'{name}:started', started)
+    queue.finished_job_registry = FakeRegistry(f'{name}:finished', finished)
+    queue.failed_job_registry = FakeRegistry(f'{name}:failed', failed)
+    return queue
+
+@pytest.fixture
+def fetch_many():
+    # Any job id exists, except 'missing'
+    with patch.object(Job, 'fetch_many', side_effect=lambda job_ids, connection: 
+                      [make_job(job_id) if job_id != 'missing' else None for job_id in job_ids]) as fetch_many:
+        yield fetch_many
+
+@pytest.fixture(autouse=True)
+def clear_status_cache():
+    tasks._status_cache.clear()
+
+@pytest.mark.tasks
+def test_get_tasks_status_pages(fetch_many):
+    queues = [make_queue('interactive', queued=['q1', 'q2', 'q3'], finished=['f1', 'f2']),
+              make_queue('bulk', queued=['q4'], started=['s1', 'missing'], failed=['x1'])]
+    with patch.object(tasks, 'get_queues', return_value=queues):
+        first = tasks.get_tasks_status(page=1, per_page=2)
+        second = tasks.get_tasks_status(page=2, per_page=2)
+        # Polls within the TTL are served from the cache
+        assert tasks.get_tasks_status(page=1, per_page=2) is first
+
+    assert first['total'] == {'queued': 4, 'started': 2, 'finished': 2, 'failed': 1}
+    assert [job['id'] for job in first['queued']] == ['q1', 'q2']
+    # Ended and started jobs are newest first
+    assert [job['id'] for job in first['finished']] == ['f2', 'f1']
+    assert first['started'] == [{'id': 'missing', 'status': 'unknown'}, tasks.get_job_details(make_job('s1'))]
+    assert [job['id'] for job in second['queued']] == ['q3', 'q4']
+    assert second['finished'] == [] and second['page'] == 2 and second['per_page'] == 2
+    # One fetch of the jobs of each page
+    assert fetch_many.call_count == 2
+
+@pytest.mark.tasks
+def test_prune_jobs_keeps_newest_ended_jobs(fetch_many):
+    queue = make_queue('bulk', finished=['f1', 'f2', 'f3', 'f4'], failed=['x1'])
+    pipeline = queue.connection.pipeline.return_value.__enter__.return_value
+    with patch.object(Const, 'TASK_MAX_ENDED_JOBS', 2):
+        tasks.prune_jobs(queue)
+
+    # Only the two oldest finished jobs are deleted, there are not enough failed jobs to prune
+    pipeline.zrem.assert_called_once_with('bulk:finished', 'f1', 'f2')
+    assert [call.args[0] for call in fetch_many.call_args_list] == [['f1', 'f2']]
+    pipeline.execute.assert_called_once()